@@ -1,10 +1,11 @@
 # coding=utf-8
 
 from flask import Flask
-from flask_compress import Compress
 from flask_sqlalchemy import SQLAlchemy
-from flask_humanize import Humanize
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 import os.path
+import sqlite3
 import sys
 
 sys.path.append( os.path.dirname( os.path.abspath( __file__ ) ) )
@@ -12,11 +13,18 @@ sys.path.append( os.path.dirname( os.path.abspath( __file__ ) ) )
 app = Flask(__name__)
 app.config.from_object('config')
 
-Compress(app)
-
 db = SQLAlchemy(app)
 
-humanize = Humanize(app)
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragma(dbapi_connection, _):
+    # with write-ahead logging, readers do not block the executor's writes and commits need fewer fsyncs
+    if app.config.get('SQLITE_WAL') and isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
 
 # noinspection PyPep8
-from app import views, models
+from app import models
@@ -15,3 +15,75 @@ ITEMS_PER_PAGE = 20
 TEMPLATES_AUTO_RELOAD = True
 
 PARALLEL_WORKFLOW = True
+
+# number of patches evaluated in parallel; None uses the default of ThreadPoolExecutor (or the number of cores in
+# adaptive mode)
+PARALLEL_WORKERS = None
+# grow or shrink the number of patches evaluated in parallel depending on load average, free memory, and durations
+PARALLEL_ADAPTIVE = False
+# fraction of the memory that should stay available in adaptive mode
+PARALLEL_MEMORY_RESERVE = 0.1
+
+# number of patches an executor claims from the queue at once
+CLAIM_BATCH_SIZE = 16
+# seconds a claimed patch stays leased to an executor; leases are renewed while the patch is processed, and expired
+# leases (e.g., after a crash) are returned to the queue
+LEASE_DURATION = 900
+
+# directory in which the workspaces of the parallel workers are created; None uses the system's temporary directory
+WORKSPACE_ROOT = None
+
+# wait for locks held by concurrent writers instead of failing immediately
+SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+# use write-ahead logging for the SQLite database
+SQLITE_WAL = True
+
+# results of the executor are written in one transaction once this many results are buffered...
+RESULT_BATCH_SIZE = 32
+# ...or the oldest buffered result is this many seconds old
+RESULT_FLUSH_INTERVAL = 0.5
+# when the writer is closed, buffered results that still cannot be written after this many attempts are dropped, and
+# their patches are returned to the queue
+RESULT_CLOSE_RETRIES = 5
+
+# number of tests that killed the most patches of a file which are run before the whole test suite; requires a test
+# report and the placeholder {tests} in the test command
+PRIORITY_TESTS = 3
+
+# adaptive timeouts of a stage are TIMEOUT_FACTOR times the 95th percentile of its successful durations plus
+# TIMEOUT_CONSTANT seconds, using the calibration runs and at most TIMEOUT_SAMPLES of the latest successful runs
+TIMEOUT_FACTOR = 3.0
+TIMEOUT_CONSTANT = 5.0
+TIMEOUT_SAMPLES = 500
+
+# maximal number of bytes of the output of a command that is stored; of longer outputs, the beginning and the end are
+# kept
+OUTPUT_LIMIT = 1024 * 1024
+
+# compression of the stored outputs: 'zlib', 'zstd' (requires the package zstandard), or None
+OUTPUT_CODEC = 'zlib'
+# full outputs are kept for the runs of survived patches and for the first OUTPUT_KEEP_FIRST runs of each project,
+# command, and outcome; other outputs are truncated to their first and last OUTPUT_TRUNCATED_LIMIT / 2 bytes. If
+# OUTPUT_KEEP_FIRST is None, all outputs are kept in full
+OUTPUT_KEEP_SURVIVED = True
+OUTPUT_KEEP_FIRST = 10
+OUTPUT_TRUNCATED_LIMIT = 16 * 1024
+
+# directory of the content-addressed store of compressed outputs; None stores outputs in the database
+BLOB_STORE = os.path.join(basedir, 'blobs')
+# store the texts of new patches in the blob store as well
+BLOB_STORE_PATCHES = False
+
+# seconds the statistics of a project are cached at most; changes made by this process discard them immediately
+STATISTICS_CACHE_TTL = 60
+
+# seconds the patch counters are cached at most; changes made by this process discard them immediately
+COUNTER_CACHE_TTL = 2
+
+# where the executor runs: 'embedded' runs it in a thread of the web app, 'daemon' in the process of
+# cli/executor_daemon.py, so the web app can be served by several processes
+EXECUTOR_MODE = 'embedded'
+# seconds between two checks of the executor daemon for commands of the web app and cli/queue_control.py
+EXECUTOR_POLL_INTERVAL = 1.0
+# seconds after which an executor daemon that did not report its state is considered dead
+EXECUTOR_DAEMON_TIMEOUT = 10
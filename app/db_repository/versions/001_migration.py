@@ -0,0 +1,40 @@
+from sqlalchemy import *
+from migrate import *
+
+
+from migrate.changeset import schema
+pre_meta = MetaData()
+post_meta = MetaData()
+patch = Table('patch', post_meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('kind', Text),
+    Column('line', Integer),
+    Column('column_start', Integer),
+    Column('column_end', Integer),
+    Column('code_original', Integer),
+    Column('code_replacement', Integer),
+    Column('patch', Text),
+    Column('state', Text),
+    Column('confirmation', Text),
+    Column('lease_owner', Text),
+    Column('lease_expiry', DateTime),
+    Column('file_id', Integer),
+    Column('project_id', Integer),
+)
+
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind
+    # migrate_engine to your metadata
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['patch'].columns['lease_owner'].create()
+    post_meta.tables['patch'].columns['lease_expiry'].create()
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['patch'].columns['lease_owner'].drop()
+    post_meta.tables['patch'].columns['lease_expiry'].drop()
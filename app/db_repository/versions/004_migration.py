@@ -0,0 +1,62 @@
+from sqlalchemy import *
+from migrate import *
+
+
+from migrate.changeset import schema
+pre_meta = MetaData()
+post_meta = MetaData()
+patch = Table('patch', post_meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('kind', Text),
+    Column('line', Integer),
+    Column('column_start', Integer),
+    Column('column_end', Integer),
+    Column('code_original', Integer),
+    Column('code_replacement', Integer),
+    Column('patch', Text),
+    Column('state', Text),
+    Column('confirmation', Text),
+    Column('lease_owner', Text),
+    Column('lease_expiry', DateTime),
+    Column('artifact_hash', Text),
+    Column('equivalence', Text),
+    Column('duplicate_of', Integer),
+    Column('file_id', Integer),
+    Column('project_id', Integer),
+)
+
+project = Table('project', post_meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('name', Text),
+    Column('workdir', Text),
+    Column('build_command', Text),
+    Column('quickcheck_command', Text),
+    Column('quickcheck_timeout', Float),
+    Column('test_command', Text),
+    Column('test_timeout', Float),
+    Column('clean_command', Text),
+    Column('workspace_strategy', Text),
+    Column('schemata', Boolean),
+    Column('artifact_patterns', Text),
+)
+
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind
+    # migrate_engine to your metadata
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['patch'].columns['artifact_hash'].create()
+    post_meta.tables['patch'].columns['equivalence'].create()
+    post_meta.tables['patch'].columns['duplicate_of'].create()
+    post_meta.tables['project'].columns['artifact_patterns'].create()
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['patch'].columns['artifact_hash'].drop()
+    post_meta.tables['patch'].columns['equivalence'].drop()
+    post_meta.tables['patch'].columns['duplicate_of'].drop()
+    post_meta.tables['project'].columns['artifact_patterns'].drop()
@@ -0,0 +1,45 @@
+from sqlalchemy import *
+from migrate import *
+
+
+from migrate.changeset import schema
+pre_meta = MetaData()
+post_meta = MetaData()
+kill = Table('kill', post_meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('test', Text),
+    Column('patch_id', Integer, index=True),
+)
+
+project = Table('project', post_meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('name', Text),
+    Column('workdir', Text),
+    Column('build_command', Text),
+    Column('quickcheck_command', Text),
+    Column('quickcheck_timeout', Float),
+    Column('test_command', Text),
+    Column('test_timeout', Float),
+    Column('clean_command', Text),
+    Column('workspace_strategy', Text),
+    Column('schemata', Boolean),
+    Column('artifact_patterns', Text),
+    Column('test_report', Text),
+)
+
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind
+    # migrate_engine to your metadata
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['kill'].create()
+    post_meta.tables['project'].columns['test_report'].create()
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['kill'].drop()
+    post_meta.tables['project'].columns['test_report'].drop()
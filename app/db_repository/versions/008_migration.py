@@ -0,0 +1,68 @@
+from sqlalchemy import *
+from migrate import *
+import zlib
+
+
+from migrate.changeset import schema
+pre_meta = MetaData()
+post_meta = MetaData()
+run = Table('run', post_meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('timestamp_start', DateTime),
+    Column('timestamp_end', DateTime),
+    Column('duration', Float),
+    Column('command', Text),
+    Column('success', Boolean),
+    Column('log', Text),
+    Column('output', Text),
+    Column('output_blob', LargeBinary),
+    Column('output_codec', Text),
+    Column('patch_id', Integer, index=True),
+    Column('project_id', Integer, index=True),
+)
+
+# number of rows converted per statement
+BATCH_SIZE = 1000
+
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind
+    # migrate_engine to your metadata
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['run'].columns['output_blob'].create()
+    post_meta.tables['run'].columns['output_codec'].create()
+
+    # compress the outputs of the existing runs
+    table = post_meta.tables['run']
+    while True:
+        with migrate_engine.begin() as connection:
+            rows = connection.execute(select([table.c.id, table.c.output]).where(
+                table.c.output.isnot(None)).limit(BATCH_SIZE)).fetchall()
+            if not rows:
+                break
+            for row_id, output in rows:
+                connection.execute(table.update().where(table.c.id == row_id).values(
+                    output_blob=zlib.compress(output.encode('utf-8')), output_codec='zlib', output=None))
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+
+    # decompress the outputs; outputs compressed with other codecs are lost
+    table = post_meta.tables['run']
+    while True:
+        with migrate_engine.begin() as connection:
+            rows = connection.execute(select([table.c.id, table.c.output_blob]).where(and_(
+                table.c.output.is_(None), table.c.output_blob.isnot(None), table.c.output_codec == 'zlib'
+            )).limit(BATCH_SIZE)).fetchall()
+            if not rows:
+                break
+            for row_id, output_blob in rows:
+                connection.execute(table.update().where(table.c.id == row_id).values(
+                    output=str(zlib.decompress(output_blob), encoding='utf-8', errors='ignore')))
+
+    post_meta.tables['run'].columns['output_blob'].drop()
+    post_meta.tables['run'].columns['output_codec'].drop()
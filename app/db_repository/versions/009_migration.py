@@ -0,0 +1,61 @@
+from sqlalchemy import *
+from migrate import *
+
+
+from migrate.changeset import schema
+pre_meta = MetaData()
+post_meta = MetaData()
+patch = Table('patch', post_meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('kind', Text),
+    Column('line', Integer),
+    Column('column_start', Integer),
+    Column('column_end', Integer),
+    Column('code_original', Integer),
+    Column('code_replacement', Integer),
+    Column('patch', Text),
+    Column('patch_digest', Text),
+    Column('state', Text),
+    Column('confirmation', Text),
+    Column('lease_owner', Text),
+    Column('lease_expiry', DateTime),
+    Column('artifact_hash', Text),
+    Column('equivalence', Text),
+    Column('duplicate_of', Integer),
+    Column('file_id', Integer),
+    Column('project_id', Integer),
+)
+
+run = Table('run', post_meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('timestamp_start', DateTime),
+    Column('timestamp_end', DateTime),
+    Column('duration', Float),
+    Column('command', Text),
+    Column('success', Boolean),
+    Column('log', Text),
+    Column('output', Text),
+    Column('output_blob', LargeBinary),
+    Column('output_digest', Text),
+    Column('output_codec', Text),
+    Column('patch_id', Integer, index=True),
+    Column('project_id', Integer, index=True),
+)
+
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind
+    # migrate_engine to your metadata
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['patch'].columns['patch_digest'].create()
+    post_meta.tables['run'].columns['output_digest'].create(index_name='ix_run_output_digest')
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    Index('ix_run_output_digest', post_meta.tables['run'].c.output_digest).drop()
+    post_meta.tables['patch'].columns['patch_digest'].drop()
+    post_meta.tables['run'].columns['output_digest'].drop()
@@ -0,0 +1,61 @@
+from sqlalchemy import *
+from migrate import *
+
+
+from migrate.changeset import schema
+pre_meta = MetaData()
+post_meta = MetaData()
+counter = Table('counter', post_meta,
+    Column('project_id', Integer, primary_key=True, nullable=False),
+    Column('incomplete', Integer),
+    Column('running', Integer),
+    Column('killed', Integer),
+    Column('survived', Integer),
+    Column('window_start', DateTime),
+    Column('window_finished', Integer),
+    Column('throughput', Float),
+)
+
+patch = Table('patch', post_meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('kind', Text),
+    Column('line', Integer),
+    Column('column_start', Integer),
+    Column('column_end', Integer),
+    Column('code_original', Integer),
+    Column('code_replacement', Integer),
+    Column('patch', Text),
+    Column('patch_digest', Text),
+    Column('state', Text),
+    Column('confirmation', Text),
+    Column('lease_owner', Text),
+    Column('lease_expiry', DateTime),
+    Column('artifact_hash', Text),
+    Column('equivalence', Text),
+    Column('duplicate_of', Integer),
+    Column('file_id', Integer),
+    Column('project_id', Integer),
+)
+
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind
+    # migrate_engine to your metadata
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['counter'].create()
+    Index('ix_patch_state', post_meta.tables['patch'].c.state).create()
+
+    # count the existing patches
+    migrate_engine.execute(
+        "INSERT INTO counter (project_id, incomplete, running, killed, survived, window_finished, throughput) "
+        "SELECT project_id, SUM(state = 'incomplete'), SUM(state = 'running'), SUM(state = 'killed'), "
+        "SUM(state = 'survived'), 0, 0.0 FROM patch WHERE project_id IS NOT NULL GROUP BY project_id")
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['counter'].drop()
+    Index('ix_patch_state', post_meta.tables['patch'].c.state).drop()
@@ -0,0 +1,37 @@
+from sqlalchemy import *
+from migrate import *
+
+
+from migrate.changeset import schema
+pre_meta = MetaData()
+post_meta = MetaData()
+executor_control = Table('executor_control', post_meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('command', Text),
+    Column('owner', Text),
+    Column('heartbeat', DateTime),
+    Column('running', Boolean),
+    Column('parallel', Boolean),
+    Column('concurrency', Integer),
+    Column('max_workers', Integer),
+    Column('adaptive', Boolean),
+    Column('current_patch_id', Integer),
+)
+
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind
+    # migrate_engine to your metadata
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['executor_control'].create()
+
+    # the single control row
+    migrate_engine.execute("INSERT INTO executor_control (id, running) VALUES (1, 0)")
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['executor_control'].drop()
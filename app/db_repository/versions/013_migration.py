@@ -0,0 +1,49 @@
+from sqlalchemy import *
+from migrate import *
+
+
+from migrate.changeset import schema
+pre_meta = MetaData()
+post_meta = MetaData()
+patch = Table('patch', post_meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('kind', Text),
+    Column('line', Integer),
+    Column('column_start', Integer),
+    Column('column_end', Integer),
+    Column('code_original', Integer),
+    Column('code_replacement', Integer),
+    Column('patch', Text),
+    Column('patch_digest', Text),
+    Column('state', Text),
+    Column('confirmation', Text),
+    Column('lease_owner', Text),
+    Column('lease_expiry', DateTime),
+    Column('artifact_hash', Text),
+    Column('equivalence', Text),
+    Column('duplicate_of', Integer),
+    Column('file_id', Integer),
+    Column('project_id', Integer),
+)
+
+# the condition must match QUEUED_CONDITION of app/models.py
+indexes = [
+    Index('ix_patch_queue', patch.c.id, sqlite_where=text("+state IN ('incomplete', 'running')")),
+]
+
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind
+    # migrate_engine to your metadata
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    for index in indexes:
+        index.create()
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    for index in indexes:
+        index.drop()
@@ -14,6 +14,14 @@ class CreateProjectForm(FlaskForm):
     test_command = wtforms.StringField('test_command', validators=[DataRequired()])
     test_timeout = wtforms.FloatField('test_timeout', validators=[Optional()])
     clean_command = wtforms.StringField('clean_command', validators=[Optional()])
+    workspace_strategy = wtforms.SelectField('workspace_strategy', choices=[('copytree', 'copy'),
+                                                                            ('reflink', 'reflink copy'),
+                                                                            ('hardlink', 'hard links'),
+                                                                            ('sync', 'incremental sync')])
+    schemata = wtforms.BooleanField('schemata')
+    artifact_patterns = wtforms.StringField('artifact_patterns', validators=[Optional()])
+    test_report = wtforms.StringField('test_report', validators=[Optional()])
+    adaptive_timeouts = wtforms.BooleanField('adaptive_timeouts')
 
 
 class CreateFileForm(FlaskForm):
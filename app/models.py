@@ -1,7 +1,16 @@
 # coding=utf-8
 
-from app import db
-from sqlalchemy.sql import func
+from app import app, db
+from sqlalchemy.sql import func, text
+from app.utils.BlobStore import BlobStore
+from app.utils.OutputCodec import OutputCodec
+
+# store of run outputs and patch texts; None if they are stored in the database
+blob_store = BlobStore.configured(app)
+
+# the condition of the patches in the queue; SQLite only uses the partial index ix_patch_queue for queries with the
+# same condition, and the unary plus keeps it from using ix_patch_state instead and sorting the patches by id
+QUEUED_CONDITION = "+state IN ('incomplete', 'running')"
 
 
 class Project(db.Model):
@@ -14,8 +23,15 @@ class Project(db.Model):
     test_command = db.Column(db.Text)
     test_timeout = db.Column(db.Float, nullable=True)
     clean_command = db.Column(db.Text, nullable=True)
+    workspace_strategy = db.Column(db.Text, nullable=True)
+    schemata = db.Column(db.Boolean, nullable=True)
+    artifact_patterns = db.Column(db.Text, nullable=True)
+    test_report = db.Column(db.Text, nullable=True)
+    adaptive_timeouts = db.Column(db.Boolean, nullable=True)
     files = db.relationship('File', backref='project', lazy='dynamic', cascade='delete')
     patches = db.relationship('Patch', backref='project', lazy='dynamic', cascade='delete')
+    baselines = db.relationship('Baseline', backref='project', lazy='dynamic', cascade='delete')
+    counters = db.relationship('Counter', backref='project', lazy='dynamic', cascade='delete')
 
     def __repr__(self):
         return '<Project %r>' % self.name
@@ -33,6 +49,7 @@ class File(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.Text)
     content = db.Column(db.Text)
+    coverage = db.Column(db.Text, nullable=True)
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'), index=True)
     patches = db.relationship('Patch', backref='file', lazy='dynamic', cascade='delete')
 
@@ -41,28 +58,51 @@ class File(db.Model):
 
 
 class Patch(db.Model):
+    # the listings filter by these columns and are ordered by id, which SQLite appends to every index
+    __table_args__ = (
+        db.Index('ix_patch_project_id_state', 'project_id', 'state'),
+        db.Index('ix_patch_project_id_state_confirmation', 'project_id', 'state', 'confirmation'),
+        # the queue lists the unfinished patches by id
+        db.Index('ix_patch_queue', 'id', sqlite_where=text(QUEUED_CONDITION)),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    kind = db.Column(db.Text)
+    kind = db.Column(db.Text, index=True)
     line = db.Column(db.Integer)
     column_start = db.Column(db.Integer)
     column_end = db.Column(db.Integer)
     code_original = db.Column(db.Integer)
     code_replacement = db.Column(db.Integer)
     patch = db.Column(db.Text)
-    state = db.Column(db.Text)
+    patch_digest = db.Column(db.Text, nullable=True)
+    state = db.Column(db.Text, index=True)
     confirmation = db.Column(db.Text)
+    lease_owner = db.Column(db.Text, nullable=True)
+    lease_expiry = db.Column(db.DateTime, nullable=True)
+    artifact_hash = db.Column(db.Text, nullable=True)
+    equivalence = db.Column(db.Text, nullable=True)
+    duplicate_of = db.Column(db.Integer, nullable=True)
     file_id = db.Column(db.Integer, db.ForeignKey('file.id'), index=True)
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'), index=True)
     runs = db.relationship('Run', backref='patch', lazy='dynamic', cascade='delete')
+    kills = db.relationship('Kill', backref='patch', lazy='dynamic', cascade='delete')
 
     def __repr__(self):
         return '<Patch %r>' % self.id
 
+    @property
+    def patch_text(self):
+        if self.patch_digest is not None and blob_store is not None:
+            return blob_store.read_text(self.patch_digest)
+        return self.patch
+
     @property
     def killed_stage(self):
         """return the first unsuccessful run's command"""
         # noinspection PyPep8
-        return self.runs.filter(Run.success == False).first().command
+        run = self.runs.filter(Run.success == False).first()
+        # duplicates of killed patches are not run at all
+        return run.command if run is not None else None
 
     @property
     def runtime(self):
@@ -70,6 +110,10 @@ class Patch(db.Model):
 
 
 class Run(db.Model):
+    __table_args__ = (
+        db.Index('ix_run_patch_id_log', 'patch_id', 'log'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     timestamp_start = db.Column(db.DateTime)
     timestamp_end = db.Column(db.DateTime)
@@ -77,9 +121,77 @@ class Run(db.Model):
     command = db.Column(db.Text)
     success = db.Column(db.Boolean)
     log = db.Column(db.Text)
-    output = db.Column(db.Text)
+    # outputs are stored compressed in the blob store (output_digest) or in the database (output_blob); output is only
+    # set for runs that were not yet stored
+    output = db.deferred(db.Column(db.Text))
+    output_blob = db.deferred(db.Column(db.LargeBinary))
+    output_digest = db.Column(db.Text, nullable=True, index=True)
+    output_codec = db.Column(db.Text, nullable=True)
     patch_id = db.Column(db.Integer, db.ForeignKey('patch.id'), index=True)
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'), index=True)
 
+    @property
+    def output_text(self):
+        if self.output_digest is not None and blob_store is not None:
+            return blob_store.read_text(self.output_digest, self.output_codec)
+        if self.output_blob is not None:
+            return OutputCodec.decompress(self.output_blob, self.output_codec)
+        return self.output
+
     def __repr__(self):
         return '<Run %r>' % self.id
+
+
+class Kill(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    test = db.Column(db.Text)
+    patch_id = db.Column(db.Integer, db.ForeignKey('patch.id'), index=True)
+
+    def __repr__(self):
+        return '<Kill %r>' % self.id
+
+
+class Baseline(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    timestamp = db.Column(db.DateTime)
+    duration = db.Column(db.Float)
+    command = db.Column(db.Text)
+    success = db.Column(db.Boolean)
+    log = db.Column(db.Text)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), index=True)
+
+    def __repr__(self):
+        return '<Baseline %r>' % self.id
+
+
+class Counter(db.Model):
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), primary_key=True)
+    incomplete = db.Column(db.Integer, default=0)
+    running = db.Column(db.Integer, default=0)
+    killed = db.Column(db.Integer, default=0)
+    survived = db.Column(db.Integer, default=0)
+    # patches finished since window_start, and the throughput of the previous window in patches per minute
+    window_start = db.Column(db.DateTime, nullable=True)
+    window_finished = db.Column(db.Integer, default=0)
+    throughput = db.Column(db.Float, default=0.0)
+
+    def __repr__(self):
+        return '<Counter %r>' % self.project_id
+
+
+class ExecutorControl(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    # pending command for the executor daemon: 'start', 'stop', or None
+    command = db.Column(db.Text, nullable=True)
+    # state reported by the daemon that currently owns the executor
+    owner = db.Column(db.Text, nullable=True)
+    heartbeat = db.Column(db.DateTime, nullable=True)
+    running = db.Column(db.Boolean, default=False)
+    parallel = db.Column(db.Boolean, nullable=True)
+    concurrency = db.Column(db.Integer, nullable=True)
+    max_workers = db.Column(db.Integer, nullable=True)
+    adaptive = db.Column(db.Boolean, nullable=True)
+    current_patch_id = db.Column(db.Integer, nullable=True)
+
+    def __repr__(self):
+        return '<ExecutorControl %r>' % self.id
@@ -0,0 +1,113 @@
+# coding=utf-8
+
+import threading
+from collections import deque
+from typing import Hashable, Optional
+
+
+class _Shard:
+    def __init__(self, project_id: int, file_id: int):
+        self.project_id = project_id
+        self.file_id = file_id
+        self.patches = deque()
+        self.owner = None  # type: Optional[Hashable]
+
+
+class AffinityScheduler:
+    """Distributes claimed patches to the workers of the parallel executor.
+
+    Patches are partitioned into shards by project and file. A worker sticks to its shard, so consecutive patches
+    reuse its workspace and only recompile the same translation unit. When its shard runs dry, the worker takes an
+    unassigned shard, preferably of the same project. Only if no unassigned shard is left, it steals half of the
+    largest shard of another worker."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__shards = []  # type: list[_Shard]
+        self.__assignments = {}  # type: dict[Hashable, _Shard]
+        self.__last_project = {}  # type: dict[Hashable, int]
+        self.__in_flight = set()  # type: set[int]
+        self.__queued = 0
+        self.__reserved = 0
+
+    @property
+    def available(self) -> int:
+        """number of queued patches that are not yet promised to a worker"""
+        return self.__queued - self.__reserved
+
+    def extend(self, patches) -> int:
+        """add patches to their shards; return the number of added patches"""
+        count = 0
+        with self.__lock:
+            for patch in patches:
+                shard = next((shard for shard in self.__shards
+                              if shard.file_id == patch.file_id and shard.project_id == patch.project_id), None)
+                if shard is None:
+                    shard = _Shard(patch.project_id, patch.file_id)
+                    self.__shards.append(shard)
+                shard.patches.append(patch)
+                count += 1
+            self.__queued += count
+        return count
+
+    def reserve(self) -> bool:
+        """promise a queued patch to the next call of next()"""
+        with self.__lock:
+            if self.__queued - self.__reserved <= 0:
+                return False
+            self.__reserved += 1
+            return True
+
+    def next(self, worker: Hashable):
+        """return the next patch for the given worker; requires a previous reserve()"""
+        with self.__lock:
+            shard = self.__assignments.get(worker)
+            if shard is None or not shard.patches:
+                shard = self.__assign(worker)
+
+            patch = shard.patches.popleft()
+            self.__queued -= 1
+            self.__reserved -= 1
+            self.__in_flight.add(patch.id)
+            return patch
+
+    def finish(self, patch_id: int):
+        with self.__lock:
+            self.__in_flight.discard(patch_id)
+
+    def queued_ids(self) -> list[int]:
+        with self.__lock:
+            return [patch.id for shard in self.__shards for patch in shard.patches]
+
+    def patch_ids(self) -> list[int]:
+        """ids of all queued and in-flight patches"""
+        with self.__lock:
+            return [patch.id for shard in self.__shards for patch in shard.patches] + list(self.__in_flight)
+
+    def __assign(self, worker: Hashable) -> _Shard:
+        # release the worker's dry shard
+        old_shard = self.__assignments.pop(worker, None)
+        if old_shard is not None:
+            old_shard.owner = None
+            if not old_shard.patches:
+                self.__shards.remove(old_shard)
+
+        last_project = self.__last_project.get(worker)
+        candidates = [shard for shard in self.__shards if shard.patches]
+        unassigned = [shard for shard in candidates if shard.owner is None]
+
+        if unassigned:
+            # prefer a shard of the project the worker's workspace is provisioned for
+            shard = next((shard for shard in unassigned if shard.project_id == last_project), unassigned[0])
+        else:
+            # steal half of the largest shard, preferably of the same project
+            victim = max(candidates, key=lambda s: (s.project_id == last_project, len(s.patches)))
+            shard = _Shard(victim.project_id, victim.file_id)
+            for _ in range((len(victim.patches) + 1) // 2):
+                shard.patches.appendleft(victim.patches.pop())
+            self.__shards.append(shard)
+
+        shard.owner = worker
+        self.__assignments[worker] = shard
+        self.__last_project[worker] = shard.project_id
+        return shard
@@ -0,0 +1,52 @@
+# coding=utf-8
+
+import hashlib
+import re
+from pathlib import Path
+from typing import Optional
+from app import db
+from app.models import Patch
+
+
+class ArtifactHasher:
+    """Hashes the build artifacts of a project to detect trivially equivalent mutants ("trivial compiler equivalence").
+
+    The artifacts are given as glob patterns relative to the working directory, separated by commas or whitespace
+    (e.g., `build/**/*.o build/tests`). If the artifacts of a mutant are identical to those of the original
+    program, the mutant is equivalent and its tests need not be executed. If they are identical to those of a mutant
+    that was already evaluated, the mutant is a duplicate and gets the same verdict. To make hashes comparable, the
+    artifacts must not contain timestamps or (for duplicates across workspaces) absolute paths."""
+
+    def __init__(self, patterns: str):
+        self.patterns = [pattern for pattern in re.split(r'[,\s]+', patterns or '') if pattern]
+
+    def hash(self, root) -> Optional[str]:
+        """return a hash of the artifacts below root, or None if no artifact exists"""
+        root = Path(root)
+        paths = sorted({path for pattern in self.patterns for path in root.glob(pattern) if path.is_file()})
+        if not paths:
+            return None
+
+        digest = hashlib.sha256()
+        for path in paths:
+            digest.update(str(path.relative_to(root)).encode('utf-8') + b'\0')
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    @staticmethod
+    def verdicts(project_id: int) -> dict[str, tuple[int, str]]:
+        """return the verdicts of the evaluated (non-duplicate) mutants of a project by their artifact hash"""
+        return {artifact_hash: (patch_id, state) for artifact_hash, patch_id, state in db.session.query(
+            Patch.artifact_hash, Patch.id, Patch.state
+        ).filter(Patch.project_id == project_id, Patch.artifact_hash.isnot(None), Patch.equivalence.is_(None),
+                 Patch.state.in_(['killed', 'survived']))}
+
+    @staticmethod
+    def mark_equivalent(build_run):
+        """turn a successful build into a run that detected an unchanged binary (like exit code 77)"""
+        build_run.success = False
+        build_run.log = 'nochange'
+        build_run.output += '\nThe build artifacts are identical to those of the original program.'
@@ -0,0 +1,95 @@
+# coding=utf-8
+
+import contextlib
+import hashlib
+import mmap
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+from sqlalchemy import text
+from app import db
+from .OutputCodec import OutputCodec
+
+
+class BlobStore:
+    """Content-addressed store for run outputs and patch texts.
+
+    Each blob is a file named by the SHA-256 of its content (`root/ab/cdef...`), so identical outputs, e.g. the same
+    compiler error for many mutants, are stored once. The database only keeps the digests. Blobs are read through
+    memory-mapped files. Blobs that are no longer referenced are removed by `collect_garbage`, which is called when
+    projects, files, or patches are deleted; blobs younger than `grace` seconds are kept, as they may belong to results
+    that are not yet committed."""
+
+    def __init__(self, root, grace: float = 3600):
+        self.root = Path(root)
+        self.grace = grace
+
+    @staticmethod
+    def configured(app) -> Optional['BlobStore']:
+        """return the store configured as BLOB_STORE, or None if outputs are stored in the database"""
+        root = app.config.get('BLOB_STORE')
+        return BlobStore(root) if root else None
+
+    def put(self, data: bytes) -> str:
+        """store a blob and return its digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.__path(digest)
+
+        if path.exists():
+            # mark the blob as recently used so it survives a concurrent garbage collection
+            os.utime(path)
+            return digest
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return digest
+
+    @contextlib.contextmanager
+    def open(self, digest: str):
+        """map a blob into memory; raises FileNotFoundError if the blob does not exist"""
+        with open(self.__path(digest), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b''
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield data
+
+    def read_text(self, digest: str, codec: Optional[str] = None) -> str:
+        """return a blob as text, decompressing it with the codec it was stored with"""
+        try:
+            with self.open(digest) as data:
+                return OutputCodec.decompress(data, codec)
+        except FileNotFoundError:
+            return 'The blob {digest} is missing from the blob store.'.format(digest=digest)
+
+    def collect_garbage(self) -> int:
+        """remove the blobs that are neither referenced by runs nor by patches; return the number of removed blobs"""
+        if not self.root.exists():
+            return 0
+
+        # the tables are queried directly as the models refer to the store
+        referenced = {digest for digest, in db.session.execute(text(
+            'SELECT output_digest FROM run WHERE output_digest IS NOT NULL '
+            'UNION SELECT patch_digest FROM patch WHERE patch_digest IS NOT NULL'))}
+
+        removed = 0
+        threshold = time.time() - self.grace
+        for path in self.root.glob('??/*'):
+            digest = path.parent.name + path.name
+            # stale temporary files of interrupted writes are removed as well
+            if digest not in referenced and path.stat().st_mtime < threshold:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def __path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:]
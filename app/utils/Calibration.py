@@ -0,0 +1,122 @@
+# coding=utf-8
+
+import math
+import os
+from typing import Optional
+from app import app, db
+from app.models import Baseline, File, Project, Run
+from .Executor import Executor
+
+
+class Calibration:
+    """Measures the pipeline of the unmutated project and derives timeouts for its stages.
+
+    The timeout of a stage is `TIMEOUT_FACTOR` times the 95th percentile of its successful durations plus
+    `TIMEOUT_CONSTANT` seconds. The durations are those of the calibration runs and the latest successful runs of the
+    executor, so the timeouts adjust as patches are executed. As runs of a subset of the tests are shorter, the
+    timeout is never based on less than the longest calibration run. Stages whose calibration runs did not always
+    succeed are flaky. Before each calibration build, the files of the project are touched, so the build compiles them
+    like the build of a mutant instead of finding nothing to do."""
+
+    STAGES = ['build_command', 'quickcheck_command', 'test_command', 'clean_command']
+
+    def __init__(self, project: Project):
+        self.project = project
+
+    def run(self, repeat: int) -> list[Baseline]:
+        """execute the pipeline repeat times and replace the project's previous calibration"""
+        Baseline.query.filter(Baseline.project_id == self.project.id).delete()
+
+        filenames = [filename for filename, in db.session.query(File.filename).filter(
+            File.project_id == self.project.id)]
+        if not filenames:
+            print('no files to touch for project', self.project.name, '- the build durations are not recorded')
+
+        baselines = []
+        for _ in range(repeat):
+            for stage in Calibration.STAGES:
+                command, timeout = Executor._get_command_and_timeout(self.project, stage)
+                if not command:
+                    continue
+
+                if stage == 'build_command':
+                    Calibration.__touch(filenames)
+
+                print('calibrating', self.project.name, stage)
+                run = Executor._run_command(None, self.project.id, stage, command, self.project.workdir, timeout)
+
+                # a build without changed files takes no time and would yield a timeout too short for mutants
+                if stage != 'build_command' or filenames:
+                    baselines.append(Baseline(project_id=self.project.id, command=stage,
+                                              timestamp=run.timestamp_start, duration=run.duration,
+                                              success=run.success, log=run.log))
+
+                # the later stages need a successful build
+                if not run.success and stage == 'build_command':
+                    break
+
+        db.session.add_all(baselines)
+        db.session.commit()
+        return baselines
+
+    @staticmethod
+    def __touch(filenames: list[str]):
+        for filename in filenames:
+            if os.path.exists(filename):
+                os.utime(filename)
+
+    @staticmethod
+    def flaky(project_id: int) -> list[str]:
+        """return the stages whose calibration runs did not always succeed"""
+        stages = []
+        for stage in Calibration.STAGES:
+            results = {success for success, in db.session.query(Baseline.success).filter(
+                Baseline.project_id == project_id, Baseline.command == stage).distinct()}
+            if False in results:
+                stages.append(stage)
+        return stages
+
+    @staticmethod
+    def timeouts(project_id: int) -> dict[str, float]:
+        """return the timeouts of the stages for which durations are known"""
+        return {stage: timeout for stage, timeout in
+                ((stage, Calibration.__timeout(project_id, stage)) for stage in Calibration.STAGES)
+                if timeout is not None}
+
+    @staticmethod
+    def summary(project_id: int) -> dict[str, dict]:
+        """return the number of calibration runs, failed calibration runs, and the timeout of each stage"""
+        result = {}
+        for stage in Calibration.STAGES:
+            durations = Calibration.__calibration_durations(project_id, stage, successful=False)
+            if durations:
+                result[stage] = {
+                    'count': len(durations),
+                    'failures': len(durations) - len(Calibration.__calibration_durations(project_id, stage)),
+                    'timeout': Calibration.__timeout(project_id, stage)
+                }
+        return result
+
+    @staticmethod
+    def __timeout(project_id: int, stage: str) -> Optional[float]:
+        calibration = Calibration.__calibration_durations(project_id, stage)
+        # noinspection PyPep8
+        durations = calibration + [duration for duration, in db.session.query(Run.duration).filter(
+            Run.project_id == project_id, Run.command == stage, Run.success == True, Run.log == 'success'
+        ).order_by(Run.id.desc()).limit(app.config.get('TIMEOUT_SAMPLES', 500))]
+        if not durations:
+            return None
+
+        durations.sort()
+        p95 = durations[max(0, math.ceil(0.95 * len(durations)) - 1)]
+        return app.config.get('TIMEOUT_FACTOR', 3.0) * max([p95] + calibration) + \
+            app.config.get('TIMEOUT_CONSTANT', 5.0)
+
+    @staticmethod
+    def __calibration_durations(project_id: int, stage: str, successful: bool = True) -> list[float]:
+        query = db.session.query(Baseline.duration).filter(Baseline.project_id == project_id,
+                                                           Baseline.command == stage)
+        if successful:
+            # noinspection PyPep8
+            query = query.filter(Baseline.success == True)
+        return [duration for duration, in query]
@@ -0,0 +1,107 @@
+# coding=utf-8
+
+import asyncio
+import os
+import signal
+import threading
+from typing import Optional
+import psutil
+
+
+class CommandRunner:
+    """Runs commands as coroutines on a single event loop.
+
+    All processes of the executor are supervised by one event loop in a background thread, so waiting for a process,
+    reading its output, and enforcing its timeout do not need threads of their own. Each command is started in a new
+    process group which is killed as a whole when the timeout expires, so compilers or test runners started by a
+    build system do not outlive their parent. Output (stdout and stderr, interleaved) is read incrementally; of long
+    outputs only the first and the last `limit / 2` bytes are kept."""
+
+    __instance = None  # type: Optional[CommandRunner]
+    __instance_lock = threading.Lock()
+
+    def __init__(self, limit: int = 1024 * 1024):
+        self.limit = limit
+        self.__loop = asyncio.new_event_loop()
+        threading.Thread(target=self.__loop.run_forever, name='CommandRunner', daemon=True).start()
+
+    @staticmethod
+    def instance() -> 'CommandRunner':
+        """return the runner shared by all executors"""
+        with CommandRunner.__instance_lock:
+            if CommandRunner.__instance is None:
+                CommandRunner.__instance = CommandRunner()
+            return CommandRunner.__instance
+
+    def run(self, args: list[str], timeout=None, cwd=None, stdin=None, env=None) -> tuple[Optional[int], bytes, bool]:
+        """run a command and wait for it; return its exit code, its output, and whether it timed out"""
+        return asyncio.run_coroutine_threadsafe(self.execute(args, timeout, cwd, stdin, env), self.__loop).result()
+
+    async def execute(self, args: list[str], timeout=None, cwd=None, stdin=None,
+                      env=None) -> tuple[Optional[int], bytes, bool]:
+        """coroutine to run a command; return its exit code, its output, and whether it timed out"""
+        process = await asyncio.create_subprocess_exec(*args, stdin=stdin, stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.STDOUT, cwd=cwd, env=env,
+                                                       start_new_session=True)
+        buffer = CommandRunner._OutputBuffer(self.limit)
+
+        try:
+            # the output is complete once all processes holding the pipe are finished
+            await asyncio.wait_for(asyncio.gather(CommandRunner.__read(process.stdout, buffer), process.wait()),
+                                   timeout)
+            timed_out = False
+        except asyncio.TimeoutError:
+            CommandRunner.__kill(process)
+            await process.wait()
+            timed_out = True
+
+        return process.returncode, buffer.getvalue(), timed_out
+
+    @staticmethod
+    async def __read(stream: asyncio.StreamReader, buffer: '_OutputBuffer'):
+        while True:
+            chunk = await stream.read(64 * 1024)
+            if not chunk:
+                break
+            buffer.write(chunk)
+
+    @staticmethod
+    def __kill(process):
+        if hasattr(os, 'killpg'):
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        else:
+            try:
+                parent = psutil.Process(process.pid)
+                for child in parent.children(recursive=True):
+                    child.kill()
+                parent.kill()
+            except psutil.NoSuchProcess:
+                pass
+
+    class _OutputBuffer:
+        def __init__(self, limit: int):
+            self.limit = limit
+            self.head = bytearray()
+            self.tail = bytearray()
+            self.omitted = 0
+
+        def write(self, chunk: bytes):
+            if len(self.head) < self.limit // 2:
+                missing = self.limit // 2 - len(self.head)
+                self.head += chunk[:missing]
+                chunk = chunk[missing:]
+
+            self.tail += chunk
+            if len(self.tail) > self.limit - self.limit // 2:
+                excess = len(self.tail) - (self.limit - self.limit // 2)
+                del self.tail[:excess]
+                self.omitted += excess
+
+        def getvalue(self) -> bytes:
+            if not self.omitted:
+                return bytes(self.head + self.tail)
+            return bytes(self.head) + '\n[... {omitted} bytes omitted ...]\n'.format(
+                omitted=self.omitted).encode('utf-8') + bytes(self.tail)
@@ -0,0 +1,100 @@
+# coding=utf-8
+
+import os
+import threading
+import time
+from typing import Optional
+import psutil
+
+
+class ConcurrencyController:
+    """Decides how many patches the parallel executor evaluates at the same time.
+
+    With a fixed worker count, the concurrency is constant. In adaptive mode, the concurrency starts at one and is
+    grown or shrunk depending on the load average, the available memory, and the observed workflow durations."""
+
+    # load average per core above which the concurrency is reduced
+    LOAD_HIGH = 1.0
+    # load average per core below which the concurrency may be increased
+    LOAD_LOW = 0.75
+    # minimal number of seconds between two adjustments; the load average needs some time to react
+    MIN_INTERVAL = 10.0
+    # number of intervals to wait after an adjustment was reverted
+    COOLDOWN = 3
+
+    def __init__(self, max_workers: Optional[int] = None, adaptive: bool = False, memory_reserve: float = 0.1):
+        self.cpu_count = os.cpu_count() or 1
+        self.adaptive = adaptive
+        self.memory_reserve = memory_reserve
+
+        if max_workers:
+            self.max_workers = max_workers
+        elif adaptive:
+            self.max_workers = self.cpu_count
+        else:
+            # the default of ThreadPoolExecutor
+            self.max_workers = min(32, self.cpu_count + 4)
+
+        self.concurrency = 1 if adaptive else self.max_workers
+
+        self.__lock = threading.Lock()
+        self.__durations = []  # type: list[float]
+        self.__last_adjustment = time.monotonic()
+        self.__last_throughput = None  # type: Optional[tuple[int, float]]
+        self.__cooldown = 0
+
+    def record(self, stage_durations: dict[str, float]):
+        """record the stage durations of a finished workflow"""
+        with self.__lock:
+            self.__durations.append(sum(stage_durations.values()))
+
+    def update(self):
+        """re-evaluate the concurrency; to be called regularly by the coordinator"""
+        if not self.adaptive:
+            return
+
+        with self.__lock:
+            durations = self.__durations
+            elapsed = time.monotonic() - self.__last_adjustment
+
+            # wait until the current concurrency level had a chance to show its effect
+            mean_duration = sum(durations) / len(durations) if durations else None
+            if elapsed < max(self.MIN_INTERVAL, mean_duration or 0.0):
+                return
+            if len(durations) < self.concurrency and elapsed < 60 * self.MIN_INTERVAL:
+                return
+
+            self.__durations = []
+            self.__last_adjustment = time.monotonic()
+
+            load = psutil.getloadavg()[0] / self.cpu_count
+            memory = psutil.virtual_memory()
+            available_memory = memory.available / memory.total
+
+            throughput = self.concurrency / mean_duration if mean_duration else None
+
+            if available_memory < self.memory_reserve:
+                # memory pressure: back off quickly to avoid swapping or the OOM killer
+                self.__set_concurrency(self.concurrency // 2)
+                self.__cooldown = self.COOLDOWN
+            elif load > self.LOAD_HIGH:
+                self.__set_concurrency(self.concurrency - 1)
+            elif self.__last_throughput is not None and throughput is not None and \
+                    self.__last_throughput[0] < self.concurrency and throughput <= self.__last_throughput[1]:
+                # the last increase did not pay off (e.g., the builds are I/O bound): revert it
+                self.__set_concurrency(self.__last_throughput[0])
+                self.__cooldown = self.COOLDOWN
+            elif self.__cooldown > 0:
+                self.__cooldown -= 1
+            elif load < self.LOAD_LOW and available_memory > 2 * self.memory_reserve:
+                self.__last_throughput = (self.concurrency, throughput) if throughput is not None else None
+                self.__set_concurrency(self.concurrency + 1)
+                return
+
+            self.__last_throughput = None
+
+    def __set_concurrency(self, concurrency: int):
+        concurrency = max(1, min(self.max_workers, concurrency))
+        if concurrency != self.concurrency:
+            print('concurrency', self.concurrency, '->', concurrency)
+            self.concurrency = concurrency
@@ -0,0 +1,128 @@
+# coding=utf-8
+
+import datetime
+import threading
+import time
+from typing import Optional
+from sqlalchemy.sql import func
+from app import app, db
+from app.models import Counter, Patch
+
+
+class Counters:
+    """Number of patches per project and state, maintained as the states change.
+
+    The counters are stored in the table `counter` and updated in the same transaction as the patches, so reading them
+    costs a single small query instead of counting the patches. The rows are additionally cached for
+    `COUNTER_CACHE_TTL` seconds; changes made by this process discard the cache immediately. The throughput is the
+    number of patches finished per minute during the last complete window of `WINDOW` seconds."""
+
+    STATES = ['incomplete', 'running', 'killed', 'survived']
+    WINDOW = 60
+
+    __cache = None  # type: Optional[tuple[float, dict[int, dict]]]
+    __lock = threading.Lock()
+
+    @staticmethod
+    def add(project_id: int, deltas: dict[str, int], finished: int = 0):
+        """change the counters of a project by the given deltas; must be called before the changes are committed"""
+        Counters.invalidate()
+
+        values = {getattr(Counter, state): getattr(Counter, state) + delta for state, delta in deltas.items() if delta}
+        if values and not Counter.query.filter(Counter.project_id == project_id).update(
+                values, synchronize_session=False):
+            # the counters of the project were never computed; counting includes the changes
+            Counters.rebuild(project_id)
+
+        if finished:
+            row = db.session.query(Counter.window_start, Counter.window_finished).filter(
+                Counter.project_id == project_id).first()
+            if row is None:
+                return
+            now = datetime.datetime.now()
+            window_start, window_finished = row
+            if window_start is None or (now - window_start).total_seconds() >= 2 * Counters.WINDOW:
+                values = {Counter.window_start: now, Counter.window_finished: finished, Counter.throughput: 0.0}
+            elif (now - window_start).total_seconds() >= Counters.WINDOW:
+                minutes = (now - window_start).total_seconds() / 60
+                values = {Counter.window_start: now, Counter.window_finished: finished,
+                          Counter.throughput: (window_finished or 0) / minutes}
+            else:
+                values = {Counter.window_finished: Counter.window_finished + finished}
+            Counter.query.filter(Counter.project_id == project_id).update(values, synchronize_session=False)
+
+    @staticmethod
+    def transitions(changes: list[tuple[int, Optional[str], str]]):
+        """count state changes given as (project_id, old_state, new_state); old_state is None for new patches"""
+        deltas = {}  # type: dict[int, dict[str, int]]
+        finished = {}  # type: dict[int, int]
+        for project_id, old_state, new_state in changes:
+            if old_state == new_state:
+                continue
+            project_deltas = deltas.setdefault(project_id, {})
+            if old_state is not None:
+                project_deltas[old_state] = project_deltas.get(old_state, 0) - 1
+            project_deltas[new_state] = project_deltas.get(new_state, 0) + 1
+            if new_state in ('killed', 'survived'):
+                finished[project_id] = finished.get(project_id, 0) + 1
+
+        for project_id, project_deltas in deltas.items():
+            Counters.add(project_id, project_deltas, finished.get(project_id, 0))
+
+    @staticmethod
+    def rebuild(project_id: int):
+        """count the patches of a project and replace its counters"""
+        Counters.invalidate()
+        counts = dict(db.session.query(Patch.state, func.count(Patch.id)).filter(
+            Patch.project_id == project_id).group_by(Patch.state))
+        counter = Counter.query.get(project_id) or Counter(project_id=project_id)
+        for state in Counters.STATES:
+            setattr(counter, state, counts.get(state, 0))
+        db.session.add(counter)
+        db.session.flush()
+
+    @staticmethod
+    def invalidate():
+        with Counters.__lock:
+            Counters.__cache = None
+
+    @staticmethod
+    def projects() -> dict[int, dict]:
+        """return the counters and the throughput of all projects by project id"""
+        with Counters.__lock:
+            cache = Counters.__cache
+        if cache is not None and time.monotonic() - cache[0] <= app.config.get('COUNTER_CACHE_TTL', 2):
+            return cache[1]
+
+        timestamp = time.monotonic()
+        now = datetime.datetime.now()
+        result = {}
+        for counter in Counter.query.all():
+            result[counter.project_id] = {state: getattr(counter, state) or 0 for state in Counters.STATES}
+            # the throughput of an idle project decays to zero
+            idle = counter.window_start is None or (now - counter.window_start).total_seconds() >= 2 * Counters.WINDOW
+            result[counter.project_id]['throughput'] = 0.0 if idle else counter.throughput or 0.0
+        with Counters.__lock:
+            Counters.__cache = (timestamp, result)
+        return result
+
+    @staticmethod
+    def totals(project_id: Optional[int] = None) -> dict:
+        """return the counters of a project (or the sums over all projects) with the number of all patches and an
+        estimate when the queued patches are finished (None if no patches are finished at the moment)"""
+        projects = Counters.projects()
+        if project_id is not None:
+            projects = {project_id: projects[project_id]} if project_id in projects else {}
+
+        result = {key: sum(counters[key] for counters in projects.values())
+                  for key in Counters.STATES + ['throughput']}
+        result['_all_'] = sum(result[state] for state in Counters.STATES)
+        queued = result['incomplete'] + result['running']
+        result['eta'] = datetime.datetime.now() + datetime.timedelta(minutes=queued / result['throughput']) \
+            if result['throughput'] else None
+        return result
+
+    @staticmethod
+    def queued() -> int:
+        """return the number of incomplete and running patches of all projects"""
+        return sum(counters['incomplete'] + counters['running'] for counters in Counters.projects().values())
@@ -0,0 +1,107 @@
+# coding=utf-8
+
+import datetime
+import json
+import re
+from pathlib import Path
+from typing import Optional
+from .Executor import Executor
+
+
+class Coverage:
+    """Line coverage of the files of a project, optionally per test case.
+
+    The coverage is read from lcov tracefiles, as written by lcov/geninfo, `llvm-cov export -format=lcov`, or
+    `gcovr --lcov`. The test name of a record (`TN:`) is used as the name of the test case that covers its lines. The
+    coverage of a file is stored as JSON object that maps line numbers to the names of the covering tests; lines that
+    are reported as not executed map to an empty list, lines without a record in the tracefiles (e.g., lines without
+    code) are missing, and tests without a name are stored as empty string."""
+
+    __placeholder = re.compile(r'\{tests(?::([^}]*))?\}')
+
+    def __init__(self):
+        self.files = {}  # type: dict[str, dict[int, set[str]]]
+
+    def read_lcov(self, text: str, test_name: str = ''):
+        """add the coverage of a tracefile; records without test name are attributed to test_name"""
+        current_test = test_name
+        current_file = None  # type: Optional[dict[int, set[str]]]
+
+        for line in text.splitlines():
+            key, _, value = line.strip().partition(':')
+            if key == 'TN':
+                current_test = value or test_name
+            elif key == 'SF':
+                current_file = self.files.setdefault(value, {})
+            elif key == 'DA' and current_file is not None:
+                fields = value.split(',')
+                if len(fields) < 2 or fields[1].strip() == '-':
+                    continue
+                # lines with a count of 0 are stored without tests, so they are known not to be executed
+                tests = current_file.setdefault(int(fields[0]), set())
+                if fields[1].strip() != '0':
+                    tests.add(current_test)
+            elif key == 'end_of_record':
+                current_file = None
+
+    def file_coverage(self, filename: str, workdir: str) -> Optional[str]:
+        """return the coverage of a file of the project as JSON, or None if the tracefiles do not contain the file"""
+        try:
+            relative_parts = Path(filename).relative_to(workdir).parts
+        except ValueError:
+            relative_parts = Path(filename).parts
+        merged = None  # type: Optional[dict[int, set[str]]]
+        for source_file, lines in self.files.items():
+            source_path = Path(source_file) if Path(source_file).is_absolute() else Path(workdir) / source_file
+            # the tracefile may also stem from a copy of the working directory
+            if source_path.parts[-len(relative_parts):] == relative_parts:
+                merged = merged if merged is not None else {}
+                for line, tests in lines.items():
+                    merged.setdefault(line, set()).update(tests)
+
+        if merged is None:
+            return None
+        return json.dumps({str(line): sorted(tests) for line, tests in sorted(merged.items())})
+
+    @staticmethod
+    def load(coverage: Optional[str]) -> Optional[dict[str, list[str]]]:
+        return json.loads(coverage) if coverage is not None else None
+
+    @staticmethod
+    def tests(coverage: Optional[dict[str, list[str]]], line: int) -> Optional[list[str]]:
+        """return the tests covering a line (empty if the line is reported as not executed), or None if the coverage of
+        the line is unknown"""
+        if coverage is None:
+            return None
+        return coverage.get(str(line))
+
+    @staticmethod
+    def selects_tests(command: Optional[str]) -> bool:
+        """whether a command contains the placeholder for the tests to execute"""
+        return command is not None and Coverage.__placeholder.search(command) is not None
+
+    @staticmethod
+    def select_tests(command: str, tests: Optional[list[str]]) -> str:
+        """replace the placeholder {tests} (or {tests:SEPARATOR}) in a command by the covering tests; if they are not
+        known, the placeholder is removed so all tests are executed"""
+        def replace(match):
+            if not tests or '' in tests:
+                return ''
+            separator = match.group(1) if match.group(1) is not None else ' '
+            return separator.join(tests)
+
+        return Coverage.__placeholder.sub(replace, command)
+
+    @staticmethod
+    def uncovered_run(patch_id: int, project_id: int, line: int):
+        """create the run of a patch on a line that no test executes"""
+        run = Executor._RunRecord()
+        run.command = 'test_command'
+        run.patch_id = patch_id
+        run.project_id = project_id
+        run.timestamp_start = run.timestamp_end = datetime.datetime.now()
+        run.duration = 0.0
+        run.output = 'Line {line} is not executed by any test.'.format(line=line)
+        run.log = 'nocoverage'
+        run.success = True
+        return run
@@ -2,11 +2,14 @@
 
 import shlex
 import subprocess
-from threading import Timer, Thread
-import psutil
-from app.models import Patch, Run
+from threading import Thread
+from app.models import Run
+from app.utils.CommandRunner import CommandRunner
+from app.utils.Counters import Counters
+from app.utils.Leases import Leases
 import datetime
 from abc import ABC, abstractmethod
+from typing import Optional
 
 
 class Executor(ABC):
@@ -14,6 +17,14 @@ class Executor(ABC):
         self.running = False
         self.app = app
 
+        # patches are claimed in small batches and leased to this executor until they are finished
+        self.leases = Leases(Leases.make_owner(),
+                             datetime.timedelta(seconds=app.config.get('LEASE_DURATION', 900)))
+        self.claim_batch_size = app.config.get('CLAIM_BATCH_SIZE', 16)
+
+        # the output of each command is stored up to this many bytes
+        CommandRunner.instance().limit = app.config.get('OUTPUT_LIMIT', 1024 * 1024)
+
     def start(self):
         if self.running is False:
             self.running = True
@@ -24,7 +35,7 @@ class Executor(ABC):
 
     @property
     def count(self):
-        return Patch.query.filter(Patch.state == 'incomplete').count()
+        return Counters.queued()
 
     @abstractmethod
     def main(self):
@@ -35,24 +46,9 @@ class Executor(ABC):
         ...
 
     @staticmethod
-    def _execute_command_timeout(command, timeout=None, cwd=None, stdin=None):
-        proc = subprocess.Popen(shlex.split(command), stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                cwd=cwd)
-
-        def killer(process):
-            parent = psutil.Process(process.pid)
-            for child in parent.children(recursive=True):  # or parent.children() for recursive=False
-                child.kill()
-            parent.kill()
-
-        timer = Timer(timeout, killer, (proc,))
-        try:
-            timer.start()
-            stdout, stderr = proc.communicate()
-            errcode = proc.returncode
-            cancelled = not timer.is_alive()
-        finally:
-            timer.cancel()
+    def _execute_command_timeout(command, timeout=None, cwd=None, stdin=None, env=None):
+        errcode, stdout, cancelled = CommandRunner.instance().run(shlex.split(command), timeout=timeout, cwd=cwd,
+                                                                  stdin=stdin, env=env)
 
         if cancelled:
             raise subprocess.TimeoutExpired(command, timeout, stdout)
@@ -87,6 +83,21 @@ class Executor(ABC):
             m.success = self.success
             return m
 
+        def to_dict(self) -> dict:
+            result = dict(vars(self))
+            result['timestamp_start'] = self.timestamp_start.isoformat()
+            result['timestamp_end'] = self.timestamp_end.isoformat()
+            return result
+
+        @staticmethod
+        def from_dict(data: dict):
+            run = Executor._RunRecord()
+            for key in vars(run):
+                setattr(run, key, data.get(key))
+            run.timestamp_start = datetime.datetime.fromisoformat(data['timestamp_start'])
+            run.timestamp_end = datetime.datetime.fromisoformat(data['timestamp_end'])
+            return run
+
     @staticmethod
     def _apply_patch(patch_file_path, input_file_path):
         Executor._execute_command_timeout(
@@ -104,7 +115,7 @@ class Executor(ABC):
         )
 
     @staticmethod
-    def _get_command_and_timeout(project, step):
+    def _get_command_and_timeout(project, step, timeouts: Optional[dict] = None):
         if step == 'quickcheck_command':
             timeout = project.quickcheck_timeout
             command = project.quickcheck_command
@@ -119,10 +130,14 @@ class Executor(ABC):
             command = project.clean_command
         else:
             raise NotImplementedError
+
+        # adaptive timeouts replace the configured ones
+        if timeouts and step in timeouts:
+            timeout = timeouts[step]
         return command, timeout
 
     @staticmethod
-    def _run_command(patch_id, project_id, step, command, cwd, timeout) -> _RunRecord:
+    def _run_command(patch_id, project_id, step, command, cwd, timeout, env=None) -> _RunRecord:
         run = Executor._RunRecord()
         run.command = step
         run.patch_id = patch_id
@@ -131,7 +146,7 @@ class Executor(ABC):
 
         # execute command
         try:
-            output = Executor._execute_command_timeout(command, cwd=cwd, timeout=timeout)
+            output = Executor._execute_command_timeout(command, cwd=cwd, timeout=timeout, env=env)
             timeout = False
             success = True
             nochange = False
@@ -0,0 +1,93 @@
+# coding=utf-8
+
+import datetime
+from types import SimpleNamespace
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import ExecutorControl, Patch
+from app.utils.Counters import Counters
+
+
+class ExecutorClient:
+    """Controls the executor daemon (see ExecutorDaemon) through the table `executor_control`.
+
+    Commands are stored in the control row and picked up by the daemon within `EXECUTOR_POLL_INTERVAL` seconds; the
+    daemon reports its state in the same row. The client offers the attributes of an Executor that the templates use,
+    so the web app does not need to know in which process the executor runs."""
+
+    ROW_ID = 1
+
+    def __init__(self, app):
+        # a daemon that did not report for this many seconds is considered dead
+        self.timeout = datetime.timedelta(seconds=app.config.get('EXECUTOR_DAEMON_TIMEOUT', 10))
+        self.parallel = app.config['PARALLEL_WORKFLOW']
+
+    @staticmethod
+    def control() -> ExecutorControl:
+        """return the control row, creating it if necessary"""
+        control = ExecutorControl.query.get(ExecutorClient.ROW_ID)
+        if control is None:
+            try:
+                db.session.add(ExecutorControl(id=ExecutorClient.ROW_ID, running=False))
+                db.session.commit()
+            except IntegrityError:
+                # created concurrently
+                db.session.rollback()
+            control = ExecutorControl.query.get(ExecutorClient.ROW_ID)
+        return control
+
+    def start(self):
+        self.__send('start')
+
+    def stop(self):
+        self.__send('stop')
+
+    @staticmethod
+    def __send(command: str):
+        ExecutorClient.control()
+        ExecutorControl.query.filter(ExecutorControl.id == ExecutorClient.ROW_ID).update(
+            {ExecutorControl.command: command}, synchronize_session=False)
+        db.session.commit()
+
+    @property
+    def alive(self) -> bool:
+        control = self.control()
+        return control.heartbeat is not None and datetime.datetime.now() - control.heartbeat <= self.timeout
+
+    @property
+    def owner(self) -> Optional[str]:
+        return self.control().owner if self.alive else None
+
+    @property
+    def pending(self) -> Optional[str]:
+        """the command the daemon did not pick up yet"""
+        return self.control().command
+
+    @property
+    def running(self) -> bool:
+        return self.alive and bool(self.control().running)
+
+    @property
+    def current_patch(self) -> Optional[Patch]:
+        control = self.control()
+        if not self.alive or control.current_patch_id is None:
+            return None
+        return Patch.query.get(control.current_patch_id)
+
+    @property
+    def concurrency(self) -> int:
+        return (self.control().concurrency or 0) if self.running else 0
+
+    @property
+    def controller(self):
+        control = self.control()
+        return SimpleNamespace(max_workers=control.max_workers, adaptive=bool(control.adaptive))
+
+    def is_parallel(self) -> bool:
+        parallel = self.control().parallel
+        return self.parallel if parallel is None else parallel
+
+    @property
+    def count(self) -> int:
+        return Counters.queued()
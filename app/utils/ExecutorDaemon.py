@@ -0,0 +1,109 @@
+# coding=utf-8
+
+import datetime
+import threading
+import traceback
+from sqlalchemy import inspect, or_
+from app import db
+from app.models import ExecutorControl
+from app.utils.ExecutorClient import ExecutorClient
+from app.utils.Leases import Leases
+from app.utils.ParExecutor import ParExecutor
+from app.utils.SeqExecutor import SeqExecutor
+
+
+class ExecutorDaemon:
+    """Runs the executor and carries out the commands sent with ExecutorClient.
+
+    The daemon polls the control row every `EXECUTOR_POLL_INTERVAL` seconds, starts or stops its executor, and reports
+    the executor's state together with a heartbeat. It runs either in a thread of the web app (`EXECUTOR_MODE =
+    'embedded'`) or in its own process started with `cli/executor_daemon.py` (`EXECUTOR_MODE = 'daemon'`), so the web
+    app can be served by several processes. Only the daemon that owns the control row acts on the commands; another
+    daemon takes over once the owner missed its heartbeats for `EXECUTOR_DAEMON_TIMEOUT` seconds, and the former owner
+    then stops its executor."""
+
+    def __init__(self, app):
+        self.app = app
+        self.owner = Leases.make_owner('daemon')
+        self.interval = app.config.get('EXECUTOR_POLL_INTERVAL', 1.0)
+        self.timeout = datetime.timedelta(seconds=app.config.get('EXECUTOR_DAEMON_TIMEOUT', 10))
+        if app.config['PARALLEL_WORKFLOW']:
+            self.executor = ParExecutor(app)
+        else:
+            self.executor = SeqExecutor(app)
+        self.__stopped = threading.Event()
+        self.__owning = False
+
+    def start(self):
+        """run the daemon in a thread of this process"""
+        threading.Thread(target=self.run, name='ExecutorDaemon', daemon=True).start()
+
+    def run(self):
+        """poll the control row until shutdown is called"""
+        with self.app.app_context():
+            while not self.__stopped.is_set():
+                try:
+                    self.poll()
+                except Exception:
+                    db.session.rollback()
+                    traceback.print_exc()
+                self.__stopped.wait(self.interval)
+
+            # stop the executor; its thread finishes the patches in progress
+            self.executor.stop()
+            if self.__owning:
+                self.__report()
+
+    def shutdown(self):
+        self.__stopped.set()
+
+    def poll(self):
+        ExecutorClient.control()
+        now = datetime.datetime.now()
+
+        # claim the control row unless another daemon owns it; the update is atomic, so only one daemon succeeds
+        claimed = ExecutorControl.query.filter(
+            ExecutorControl.id == ExecutorClient.ROW_ID,
+            or_(ExecutorControl.owner.is_(None), ExecutorControl.owner == self.owner,
+                ExecutorControl.heartbeat.is_(None), ExecutorControl.heartbeat < now - self.timeout)
+        ).update({ExecutorControl.owner: self.owner, ExecutorControl.heartbeat: now}, synchronize_session=False)
+        if claimed != 1:
+            # another daemon owns the executor; if it took over from this daemon, only its executor may run
+            db.session.rollback()
+            if self.__owning:
+                self.executor.stop()
+            self.__owning = False
+            return
+        self.__owning = True
+
+        # read the command after claiming the row, so it is not carried out by a daemon that lost the row meanwhile
+        command = db.session.query(ExecutorControl.command).filter(
+            ExecutorControl.id == ExecutorClient.ROW_ID).scalar()
+        if command == 'start':
+            self.executor.start()
+        elif command == 'stop':
+            self.executor.stop()
+
+        if command is not None:
+            # consume the command unless it was replaced in the meantime
+            ExecutorControl.query.filter(ExecutorControl.id == ExecutorClient.ROW_ID,
+                                         ExecutorControl.command == command).update(
+                {ExecutorControl.command: None}, synchronize_session=False)
+        self.__report(now)
+
+    def __report(self, heartbeat: datetime.datetime = None):
+        # without a heartbeat, the control row is released to other daemons
+        parallel = self.executor.is_parallel()
+        current_patch = getattr(self.executor, 'current_patch', None)
+        ExecutorControl.query.filter(ExecutorControl.id == ExecutorClient.ROW_ID).update({
+            ExecutorControl.owner: self.owner,
+            ExecutorControl.heartbeat: heartbeat,
+            ExecutorControl.running: self.executor.running,
+            ExecutorControl.parallel: parallel,
+            ExecutorControl.concurrency: self.executor.concurrency if parallel else 1,
+            ExecutorControl.max_workers: self.executor.controller.max_workers if parallel else 1,
+            ExecutorControl.adaptive: self.executor.controller.adaptive if parallel else False,
+            # the patch belongs to the session of the executor's thread; only read its identity
+            ExecutorControl.current_patch_id: inspect(current_patch).identity[0] if current_patch is not None else None,
+        }, synchronize_session=False)
+        db.session.commit()
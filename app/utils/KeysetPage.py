@@ -0,0 +1,33 @@
+# coding=utf-8
+
+from typing import Optional
+
+
+class KeysetPage:
+    """A page of a query ordered by id, addressed by the id of its neighbor instead of an offset.
+
+    The next page starts after the last id of this page (`after=page.next_cursor`), the previous page ends before its
+    first id (`before=page.prev_cursor`). With an index whose last column is the id (in SQLite, every index ends with
+    the rowid), each page is read with a single index seek, no matter how deep it is."""
+
+    def __init__(self, query, column, per_page: int, after: Optional[int] = None, before: Optional[int] = None):
+        self.per_page = per_page
+
+        if before is not None:
+            # read backwards from the cursor and restore the ascending order
+            items = query.filter(column < before).order_by(column.desc()).limit(per_page + 1).all()
+            self.has_prev = len(items) > per_page
+            self.items = list(reversed(items[:per_page]))
+            self.has_next = True
+        else:
+            if after is not None:
+                query_after = query.filter(column > after)
+            else:
+                query_after = query
+            items = query_after.order_by(column).limit(per_page + 1).all()
+            self.has_next = len(items) > per_page
+            self.items = items[:per_page]
+            self.has_prev = after is not None and query.filter(column <= after).first() is not None
+
+        self.prev_cursor = self.items[0].id if self.items else before
+        self.next_cursor = self.items[-1].id if self.items else after
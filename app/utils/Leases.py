@@ -0,0 +1,142 @@
+# coding=utf-8
+
+import contextlib
+import datetime
+import itertools
+import os
+import socket
+import threading
+import traceback
+import uuid
+from typing import Callable, Optional
+import psutil
+from sqlalchemy.sql import exists
+from app import app, db
+from app.models import File, Patch
+from app.utils.Counters import Counters
+from app.utils.Statistics import Statistics
+
+
+class Leases:
+    """Claims patches from the queue for an owner (an executor or a remote worker).
+
+    Claimed patches have the state 'running' and are leased to their owner until the lease expires. Owners renew the
+    leases of patches they are still working on; expired leases are returned to the queue with the next claim."""
+
+    def __init__(self, owner: str, duration: datetime.timedelta):
+        self.owner = owner
+        self.duration = duration
+
+    @staticmethod
+    def make_owner(token: str = None) -> str:
+        return '{host}:{pid}:{token}'.format(host=socket.gethostname(), pid=os.getpid(),
+                                             token=token or uuid.uuid4().hex[:8])
+
+    @staticmethod
+    def reclaim():
+        """return patches whose lease expired or whose owner died on this host to the queue"""
+        reclaimable = Patch.state == 'running'
+        stale_owners = [owner for owner, in db.session.query(Patch.lease_owner).filter(reclaimable).distinct()
+                        if Leases.__is_dead_local_owner(owner)]
+
+        expired = db.session.query(Patch.id, Patch.project_id).filter(reclaimable).filter(
+            (Patch.lease_expiry < datetime.datetime.now()) | Patch.lease_owner.in_(stale_owners)).all()
+        reclaimed = Leases.__transition(expired, 'running', 'incomplete',
+                                        {Patch.lease_owner: None, Patch.lease_expiry: None})
+        db.session.commit()
+        if reclaimed:
+            Statistics.invalidate()
+
+    @staticmethod
+    def __is_dead_local_owner(owner):
+        try:
+            host, pid, _ = owner.split(':')
+            return host == socket.gethostname() and not psutil.pid_exists(int(pid))
+        except (AttributeError, ValueError):
+            return False
+
+    def claim(self, limit: int, project_id: Optional[int] = None) -> list[Patch]:
+        """lease up to limit incomplete patches (of the given project, if any) to the owner"""
+        Leases.reclaim()
+
+        # claiming in project and file order keeps consecutive patches on the same workspace and translation unit
+        # patches whose file is gone cannot be executed; claiming them again and again would never empty the queue
+        candidates = db.session.query(Patch.id, Patch.project_id).filter(
+            Patch.state == 'incomplete', exists().where(File.id == Patch.file_id))
+        if project_id is not None:
+            candidates = candidates.filter(Patch.project_id == project_id)
+        candidates = candidates.order_by(Patch.project_id, Patch.file_id, Patch.id).limit(limit).all()
+        if not candidates:
+            return []
+
+        # the state check makes sure a patch claimed by someone else in the meantime is not taken over
+        Leases.__transition(candidates, 'incomplete', 'running',
+                            {Patch.lease_owner: self.owner, Patch.lease_expiry: datetime.datetime.now() + self.duration})
+        db.session.commit()
+        Statistics.invalidate()
+
+        return Patch.query.filter(Patch.id.in_([patch_id for patch_id, _ in candidates]), Patch.state == 'running',
+                                  Patch.lease_owner == self.owner).order_by(Patch.project_id, Patch.file_id,
+                                                                            Patch.id).all()
+
+    def renew(self, patch_ids: list[int]) -> int:
+        """extend the leases of the given patches; return the number of patches still leased to the owner"""
+        if not patch_ids:
+            return 0
+        renewed = Patch.query.filter(Patch.id.in_(patch_ids), Patch.state == 'running',
+                                     Patch.lease_owner == self.owner).update(
+            {Patch.lease_expiry: datetime.datetime.now() + self.duration}, synchronize_session=False)
+        db.session.commit()
+        return renewed
+
+    @contextlib.contextmanager
+    def keep_alive(self, patch_ids: Callable[[], list[int]]):
+        """renew the leases of the patches returned by patch_ids from a background thread while the block runs, so
+        a patch that takes longer than the lease duration is not reclaimed"""
+        stopped = threading.Event()
+
+        def renew():
+            with app.app_context():
+                while not stopped.wait(self.duration.total_seconds() / 3):
+                    try:
+                        self.renew(patch_ids())
+                    except Exception:
+                        db.session.rollback()
+                        traceback.print_exc()
+
+        thread = threading.Thread(target=renew, name='LeaseRenewal', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            thread.join()
+
+    def release(self, patch_ids: list[int]):
+        """return claimed, but unprocessed patches to the queue"""
+        if patch_ids:
+            patches = db.session.query(Patch.id, Patch.project_id).filter(Patch.id.in_(patch_ids)).all()
+            Leases.__transition(patches, 'running', 'incomplete', {Patch.lease_owner: None, Patch.lease_expiry: None},
+                                Patch.lease_owner == self.owner)
+            db.session.commit()
+            Statistics.invalidate()
+
+    @staticmethod
+    def __transition(patches: list[tuple[int, int]], old_state: str, new_state: str, values: dict, *criteria) -> int:
+        """move the given (id, project_id) patches that are still in old_state to new_state and update the counters;
+        return the number of moved patches"""
+        moved = 0
+        for project_id, group in itertools.groupby(sorted(patches, key=lambda p: p[1] or 0), key=lambda p: p[1]):
+            count = Patch.query.filter(Patch.id.in_([patch_id for patch_id, _ in group]), Patch.state == old_state,
+                                       *criteria).update({**values, Patch.state: new_state}, synchronize_session=False)
+            if count and project_id is not None:
+                Counters.add(project_id, {old_state: -count, new_state: count})
+            moved += count
+        return moved
+
+    def holds(self, patch_ids: list[int]) -> list[int]:
+        """return those of the given patches that are leased to the owner"""
+        if not patch_ids:
+            return []
+        return [patch_id for patch_id, in db.session.query(Patch.id).filter(
+            Patch.id.in_(patch_ids), Patch.state == 'running', Patch.lease_owner == self.owner)]
@@ -0,0 +1,105 @@
+# coding=utf-8
+
+import collections
+import hashlib
+import re
+import threading
+
+
+class _Token:
+    def __init__(self, kind: str, text: str, start: int):
+        self.kind = kind  # type: str
+        self.text = text  # type: str
+        # offset in the content
+        self.start = start  # type: int
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.text)
+
+    def __repr__(self):
+        return '<Token {kind} {text!r}>'.format(kind=self.kind, text=self.text)
+
+
+class Lexer:
+    """Splits C and C++ source code into tokens.
+
+    Comments (also after code and across lines), string literals (including prefixed and raw strings), character
+    literals, and preprocessor directives (including multi-line macros) are recognized, so mutators only see code: each
+    line is also provided with all characters of these tokens replaced by MASK, keeping the columns of the code. The
+    lexer is lenient; unterminated comments and literals end with the content or line. Lexers are cached by content, so
+    a file is tokenized once even if patches are generated several times."""
+
+    # replaces the characters of comments, literals, and preprocessor directives in the code lines
+    MASK = '\0'
+    # number of cached lexers
+    CACHE_SIZE = 32
+
+    # token kinds that are not code
+    NON_CODE = {'comment', 'string', 'char', 'preprocessor'}
+
+    REGEX = re.compile(r'''
+        (?P<preprocessor>^[ \t]*\#(?:\\\r?\n|[^\n])*)
+        |(?P<comment>//(?:\\\r?\n|[^\n])*|/\*.*?(?:\*/|\Z))
+        |(?P<raw>(?:u8|[uUL])?R"(?P<delimiter>[^()\\\s"]{0,16})\(.*?(?:\)(?P=delimiter)"|\Z))
+        |(?P<string>(?:u8|[uUL])?"(?:\\(?:\r?\n|.)|[^"\\\n])*"?)
+        |(?P<char>(?:u8|[uUL])?'(?:\\(?:\r?\n|.)|[^'\\\n])*'?)
+        |(?P<number>\.?[0-9](?:[eEpP][+-]|'[0-9A-Za-z_]|[0-9A-Za-z_.])*)
+        |(?P<identifier>[A-Za-z_][A-Za-z0-9_]*)
+        |(?P<space>(?:[ \t\r\f\v]|\\\r?\n)+|\n)
+        |(?P<punctuator>\.\.\.|<<=|>>=|<=>|->\*|::|->|\+\+|--|<<|>>|<=|>=|==|!=|&&|\|\||[-+*/%&|^]=|\#\#|\.\*|.)
+    ''', re.VERBOSE | re.MULTILINE | re.DOTALL)
+
+    __cache = collections.OrderedDict()  # type: collections.OrderedDict[str, Lexer]
+    __lock = threading.Lock()
+
+    def __init__(self, content: str):
+        self.content = content
+        self.tokens = []  # type: list[_Token]
+
+        for match in Lexer.REGEX.finditer(content):
+            kind = match.lastgroup
+            if kind == 'space':
+                continue
+            if kind == 'raw':
+                kind = 'string'
+            self.tokens.append(_Token(kind, match.group(), match.start()))
+
+        self.__code_lines = None
+
+    @staticmethod
+    def cached(content: str) -> 'Lexer':
+        """return the lexer of the content, tokenizing it only if it is not cached"""
+        key = hashlib.sha1(content.encode('utf-8', 'surrogatepass')).hexdigest()
+        with Lexer.__lock:
+            lexer = Lexer.__cache.get(key)
+            if lexer is not None:
+                Lexer.__cache.move_to_end(key)
+                return lexer
+
+        lexer = Lexer(content)
+        with Lexer.__lock:
+            Lexer.__cache[key] = lexer
+            while len(Lexer.__cache) > Lexer.CACHE_SIZE:
+                Lexer.__cache.popitem(last=False)
+        return lexer
+
+    @property
+    def code_lines(self) -> list[str]:
+        """the lines of the content with comments, literals, and preprocessor directives masked"""
+        if self.__code_lines is None:
+            parts = []
+            position = 0
+            for token in self.tokens:
+                if token.kind in Lexer.NON_CODE:
+                    parts.append(self.content[position:token.start])
+                    # line breaks are kept so the lines stay aligned with the content
+                    parts.append('\n'.join(Lexer.MASK * len(part) for part in token.text.split('\n')))
+                    position = token.end
+            parts.append(self.content[position:])
+            self.__code_lines = ''.join(parts).split('\n')
+        return self.__code_lines
+
+    @staticmethod
+    def has_code(code_line: str) -> bool:
+        return code_line.replace(Lexer.MASK, '').strip() != ''
@@ -1,24 +1,42 @@
 # coding=utf-8
 
+import bisect
 import json
 import re
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from app.utils.Replacement import Replacement
 
 
 class StringLiteralFinder:
-    def __init__(self, line):
-        self.string_literals = []  # type: List[Tuple[int, int]]
+    """Finds the string and character literals of a line.
 
-        for match in re.finditer(re.compile("\".*?\""), line):
-            self.string_literals.append(match.span())
+    Escaped quotes are part of the literal, and quotes between digits are digit separators (1'000). The spans are sorted,
+    so a position is looked up with a binary search. Use `StringLiteralFinder.of(line)` to share the finder of a line
+    between all mutators."""
 
-    def is_in_string_literal(self, index):
-        for (string_start, string_end) in self.string_literals:
-            if string_start < index < string_end:
-                return True
+    REGEX = re.compile(r"""(?:u8|[uUL])?"(?:\\.|[^"\\])*"|(?<![0-9A-Za-z_])(?:u8|[uUL])?'(?:\\.|[^'\\])+'""")
 
-        return False
+    __last = None  # type: Optional[Tuple[str, StringLiteralFinder]]
+
+    def __init__(self, line):
+        self.string_literals = [match.span() for match in
+                                StringLiteralFinder.REGEX.finditer(line)]  # type: List[Tuple[int, int]]
+        self.__starts = [string_start for string_start, _ in self.string_literals]
+
+    @staticmethod
+    def of(line):
+        """return the finder of the line; the finder of the last line is reused"""
+        last = StringLiteralFinder.__last
+        if last is not None and last[0] == line:
+            return last[1]
+        string_finder = StringLiteralFinder(line)
+        StringLiteralFinder.__last = (line, string_finder)
+        return string_finder
+
+    def is_in_string_literal(self, index):
+        # the last literal starting before the index is the only one that may contain it
+        position = bisect.bisect_left(self.__starts, index) - 1
+        return position >= 0 and index < self.string_literals[position][1]
 
 
 ##############################################################################
@@ -26,18 +44,24 @@ class StringLiteralFinder:
 class SimplePattern:
     def __init__(self, replacement_patterns):
         self.replacement_patterns = replacement_patterns  # type: Dict[str, List[str]]
+        self.regexes = [(re.compile(replacement_pattern), replacement_strs)
+                        for replacement_pattern, replacement_strs in replacement_patterns.items()]
 
-    def mutate(self, line):
+    def mutate(self, line, code=None):
         result = []  # type: List[Replacement]
 
-        string_finder = StringLiteralFinder(line)
+        # the patterns are searched in the code of the line (see Lexer); the columns are the same as in the line
+        if code is None:
+            code = line
+
+        string_finder = StringLiteralFinder.of(code)
 
-        for replacement_pattern in self.replacement_patterns.keys():
-            for occurrence in [match for match in re.finditer(re.compile(replacement_pattern), line)]:
+        for regex, replacement_strs in self.regexes:
+            for occurrence in regex.finditer(code):
                 if string_finder.is_in_string_literal(occurrence.start()):
                     continue
 
-                for replacement_str in self.replacement_patterns[replacement_pattern]:
+                for replacement_str in replacement_strs:
                     result.append(Replacement(start_col=occurrence.start(),
                                               end_col=occurrence.end(),
                                               old_val=line[occurrence.start():occurrence.end()],
@@ -56,7 +80,9 @@ class Mutator:
     description: str
     tags: list[str]
 
-    def find_mutations(self, line: str) -> list[Replacement]: ...
+    def find_mutations(self, line: str, code: Optional[str] = None) -> list[Replacement]:
+        """return the mutations of the line; if given, code is the line with comments and literals masked"""
+        ...
 
 
 class LineDeletionMutator(Mutator):
@@ -68,7 +94,7 @@ class LineDeletionMutator(Mutator):
         pass
 
     # noinspection PyMethodMayBeStatic
-    def find_mutations(self, line):
+    def find_mutations(self, line, code=None):
         return [Replacement(start_col=0,
                             end_col=len(line) - 1,
                             old_val=line,
@@ -90,8 +116,8 @@ class LogicalOperatorMutator(Mutator):
             'not': ['']
         })
 
-    def find_mutations(self, line):
-        return self.pattern.mutate(line)
+    def find_mutations(self, line, code=None):
+        return self.pattern.mutate(line, code)
 
 
 class ComparisonOperatorMutator(Mutator):
@@ -109,8 +135,8 @@ class ComparisonOperatorMutator(Mutator):
             ' >= ': [' == ', ' != ', ' < ', ' > ' ' <= ']
         })
 
-    def find_mutations(self, line):
-        return self.pattern.mutate(line)
+    def find_mutations(self, line, code=None):
+        return self.pattern.mutate(line, code)
 
 
 class IncDecOperatorMutator(Mutator):
@@ -124,8 +150,8 @@ class IncDecOperatorMutator(Mutator):
             '--': ['++'],
         })
 
-    def find_mutations(self, line):
-        return self.pattern.mutate(line)
+    def find_mutations(self, line, code=None):
+        return self.pattern.mutate(line, code)
 
 
 class AssignmentOperatorMutator(Mutator):
@@ -143,8 +169,8 @@ class AssignmentOperatorMutator(Mutator):
             ' %= ': [' = ', ' += ', ' -= ', ' *= ', ' /= ']
         })
 
-    def find_mutations(self, line):
-        return self.pattern.mutate(line)
+    def find_mutations(self, line, code=None):
+        return self.pattern.mutate(line, code)
 
 
 class BooleanAssignmentOperatorMutator(Mutator):
@@ -162,8 +188,8 @@ class BooleanAssignmentOperatorMutator(Mutator):
             ' >>= ': [' = ', ' &= ', ' |= ', ' ^= ', ' <<= ']
         })
 
-    def find_mutations(self, line):
-        return self.pattern.mutate(line)
+    def find_mutations(self, line, code=None):
+        return self.pattern.mutate(line, code)
 
 
 class ArithmeticOperatorMutator(Mutator):
@@ -180,8 +206,8 @@ class ArithmeticOperatorMutator(Mutator):
             ' % ': [' + ', ' - ', ' * ', ' / ']
         })
 
-    def find_mutations(self, line):
-        return self.pattern.mutate(line)
+    def find_mutations(self, line, code=None):
+        return self.pattern.mutate(line, code)
 
 
 class BooleanArithmeticOperatorMutator(Mutator):
@@ -198,8 +224,8 @@ class BooleanArithmeticOperatorMutator(Mutator):
             ' >> ': [' & ', ' | ', ' ^ ', ' << ']
         })
 
-    def find_mutations(self, line):
-        return self.pattern.mutate(line)
+    def find_mutations(self, line, code=None):
+        return self.pattern.mutate(line, code)
 
 
 class BooleanLiteralMutator(Mutator):
@@ -213,8 +239,8 @@ class BooleanLiteralMutator(Mutator):
             'false': ['true']
         })
 
-    def find_mutations(self, line):
-        return self.pattern.mutate(line)
+    def find_mutations(self, line, code=None):
+        return self.pattern.mutate(line, code)
 
 
 class StdInserterMutator(Mutator):
@@ -228,8 +254,8 @@ class StdInserterMutator(Mutator):
             's#td::back_inserter': ['std::front_inserter']
         })
 
-    def find_mutations(self, line):
-        return self.pattern.mutate(line)
+    def find_mutations(self, line, code=None):
+        return self.pattern.mutate(line, code)
 
 
 class StdRangePredicateMutator(Mutator):
@@ -244,8 +270,8 @@ class StdRangePredicateMutator(Mutator):
             'std::none_of': ['std::all_of', 'std::any_of']
         })
 
-    def find_mutations(self, line):
-        return self.pattern.mutate(line)
+    def find_mutations(self, line, code=None):
+        return self.pattern.mutate(line, code)
 
 
 class StdMinMaxMutator(Mutator):
@@ -259,8 +285,8 @@ class StdMinMaxMutator(Mutator):
             'std::max': ['std::min']
         })
 
-    def find_mutations(self, line):
-        return self.pattern.mutate(line)
+    def find_mutations(self, line, code=None):
+        return self.pattern.mutate(line, code)
 
 
 class DecimalNumberLiteralMutator(Mutator):
@@ -269,14 +295,17 @@ class DecimalNumberLiteralMutator(Mutator):
     tags = ['numerical', 'literal']
 
     def __init__(self):
-        self.regex = r'''[^'"a-zA-Z_\\](-?[0-9]+\.?[0-9]*)[^'"a-zA-Z_]?'''
+        self.regex = re.compile(r'''[^'"a-zA-Z_\\](-?[0-9]+\.?[0-9]*)[^'"a-zA-Z_]?''')
 
-    def find_mutations(self, line):
+    def find_mutations(self, line, code=None):
         result = []  # type: List[Replacement]
 
-        string_finder = StringLiteralFinder(line)
+        if code is None:
+            code = line
 
-        for occurrence in [match for match in re.finditer(re.compile(self.regex), line)]:
+        string_finder = StringLiteralFinder.of(code)
+
+        for occurrence in self.regex.finditer(code):
             if string_finder.is_in_string_literal(occurrence.start()):
                 continue
 
@@ -304,14 +333,17 @@ class HexNumberLiteralMutator(Mutator):
     tags = ['numerical', 'literal']
 
     def __init__(self):
-        self.regex = r'''0[xX][0-9A-Fa-f]+'''
+        self.regex = re.compile(r'''0[xX][0-9A-Fa-f]+''')
 
-    def find_mutations(self, line):
+    def find_mutations(self, line, code=None):
         result = []  # type: List[Replacement]
 
-        string_finder = StringLiteralFinder(line)
+        if code is None:
+            code = line
+
+        string_finder = StringLiteralFinder.of(code)
 
-        for occurrence in [match for match in re.finditer(re.compile(self.regex), line)]:
+        for occurrence in self.regex.finditer(code):
             if string_finder.is_in_string_literal(occurrence.start()):
                 continue
 
@@ -343,8 +375,8 @@ class IteratorRangeMutator(Mutator):
             'std::end': ['std::begin']
         })
 
-    def find_mutations(self, line):
-        return self.pattern.mutate(line)
+    def find_mutations(self, line, code=None):
+        return self.pattern.mutate(line, code)
 
 
 def get_mutators():
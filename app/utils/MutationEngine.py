@@ -0,0 +1,100 @@
+# coding=utf-8
+
+import re
+from typing import Optional
+from app.utils.Mutation import Mutator, SimplePattern, StringLiteralFinder
+from app.utils.Replacement import Replacement
+
+
+class MutationEngine:
+    """Finds the mutations of several mutators in a line, scanning the line once for all pattern-based mutators.
+
+    The patterns of all SimplePattern mutators are compiled into a single regular expression that matches (with zero
+    width) at each position where at least one pattern matches; an optional lookahead with a named group per pattern
+    tells which patterns match there. As the patterns are only tried in lookaheads, matches of different patterns may
+    overlap, just like when each pattern is searched on its own, while matches of the same pattern are skipped if they
+    overlap the previous one, like with `re.finditer`. The mutations are returned in the same order as when calling the
+    mutators one after another; other mutators are called as before."""
+
+    __engines = {}  # type: dict[tuple[str, ...], MutationEngine]
+
+    def __init__(self, mutators: dict[str, Mutator]):
+        # the mutators in their order; pattern-based mutators refer to the indices of their patterns
+        self.__slots = []  # type: list[tuple[str, Optional[Mutator], range]]
+        # the replacement strings of each pattern
+        self.__replacements = []  # type: list[list[str]]
+
+        patterns = []
+        for mutator_id, mutator in mutators.items():
+            pattern = getattr(mutator, 'pattern', None)
+            if isinstance(pattern, SimplePattern):
+                first = len(patterns)
+                for replacement_pattern, replacement_strs in pattern.replacement_patterns.items():
+                    patterns.append(replacement_pattern)
+                    self.__replacements.append(replacement_strs)
+                self.__slots.append((mutator_id, None, range(first, len(patterns))))
+            else:
+                self.__slots.append((mutator_id, mutator, range(0)))
+
+        self.__regex = None  # type: Optional[re.Pattern]
+        self.__groups = []  # type: list[int]
+        if patterns:
+            self.__regex = re.compile(
+                '(?=' + '|'.join('(?:{pattern})'.format(pattern=pattern) for pattern in patterns) + ')' +
+                ''.join('(?:(?=(?P<p{index}>{pattern})))?'.format(index=index, pattern=pattern)
+                        for index, pattern in enumerate(patterns)))
+            self.__groups = [self.__regex.groupindex['p{index}'.format(index=index)] for index in range(len(patterns))]
+
+    @staticmethod
+    def compile(mutators: dict[str, Mutator]) -> 'MutationEngine':
+        """return the engine for the given mutators; engines are compiled once per selection of mutators"""
+        key = tuple(mutators.keys())
+        engine = MutationEngine.__engines.get(key)
+        if engine is None:
+            engine = MutationEngine(mutators)
+            MutationEngine.__engines[key] = engine
+        return engine
+
+    def find_mutations(self, line: str, code: Optional[str] = None) -> list[tuple[str, Replacement]]:
+        """return the mutations of the line as (mutator id, replacement); if given, the patterns are searched in code,
+        the line with comments and literals masked (see Lexer)"""
+        if code is None:
+            code = line
+        found = self.__find_patterns(line, code) if self.__regex is not None else {}
+
+        result = []  # type: list[tuple[str, Replacement]]
+        for mutator_id, mutator, indices in self.__slots:
+            if mutator is not None:
+                result += [(mutator_id, replacement) for replacement in mutator.find_mutations(line, code)]
+                continue
+
+            for index in indices:
+                result += [(mutator_id, replacement) for replacement in found.get(index, [])]
+
+        return result
+
+    def __find_patterns(self, line: str, code: str) -> dict[int, list[Replacement]]:
+        found = {}  # type: dict[int, list[Replacement]]
+        # the position from which each pattern may match again
+        next_start = [0] * len(self.__groups)
+        string_finder = None  # type: Optional[StringLiteralFinder]
+
+        for match in self.__regex.finditer(code):
+            regs = match.regs
+            for index, group in enumerate(self.__groups):
+                start, end = regs[group]
+                if start == -1 or start < next_start[index]:
+                    continue
+                next_start[index] = end if end > start else start + 1
+
+                if string_finder is None:
+                    string_finder = StringLiteralFinder.of(code)
+                if string_finder.is_in_string_literal(start):
+                    continue
+
+                old_val = line[start:end]
+                found.setdefault(index, []).extend(
+                    Replacement(start_col=start, end_col=end, old_val=old_val, new_val=replacement_str)
+                    for replacement_str in self.__replacements[index])
+
+        return found
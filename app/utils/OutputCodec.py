@@ -0,0 +1,54 @@
+# coding=utf-8
+
+import zlib
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class OutputCodec:
+    """Compresses the outputs of runs for storage.
+
+    The codec is `zlib`, `zstd` (requires the package `zstandard` and falls back to `zlib` without it), or None to
+    store outputs uncompressed. The codec is stored with each output, so changing it does not affect stored outputs."""
+
+    def __init__(self, codec: Optional[str] = 'zlib'):
+        if codec == 'zstd' and zstandard is None:
+            print('zstandard is not installed, compressing outputs with zlib')
+            codec = 'zlib'
+        if codec not in (None, 'zlib', 'zstd'):
+            raise ValueError('unknown codec {codec}'.format(codec=codec))
+        self.codec = codec
+
+    def compress(self, text: str) -> tuple[bytes, Optional[str]]:
+        """return the compressed text and the codec used"""
+        data = text.encode('utf-8')
+        if self.codec == 'zlib':
+            return zlib.compress(data), 'zlib'
+        if self.codec == 'zstd':
+            return zstandard.ZstdCompressor().compress(data), 'zstd'
+        return data, None
+
+    @staticmethod
+    def decompress(data: bytes, codec: Optional[str]) -> str:
+        if codec == 'zlib':
+            data = zlib.decompress(data)
+        elif codec == 'zstd':
+            if zstandard is None:
+                return 'The output is compressed with zstd; install the package zstandard to read it.'
+            data = zstandard.ZstdDecompressor().decompress(data)
+        return str(data, encoding='utf-8', errors='ignore')
+
+    @staticmethod
+    def truncate(text: str, limit: int) -> str:
+        """keep the first and the last limit / 2 bytes of a text"""
+        data = text.encode('utf-8')
+        if len(data) <= limit:
+            return text
+        head, tail = data[:limit // 2], data[len(data) - (limit - limit // 2):]
+        return str(head, encoding='utf-8', errors='ignore') + \
+            '\n[... {omitted} bytes omitted ...]\n'.format(omitted=len(data) - len(head) - len(tail)) + \
+            str(tail, encoding='utf-8', errors='ignore')
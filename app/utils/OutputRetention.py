@@ -0,0 +1,52 @@
+# coding=utf-8
+
+from typing import Optional
+from sqlalchemy.sql import func
+from app import db
+from app.models import Run, blob_store
+from .OutputCodec import OutputCodec
+
+
+class OutputRetention:
+    """Decides how much of the output of a run is stored and compresses it.
+
+    The full output (up to `OUTPUT_LIMIT` bytes) is kept for the runs of survived patches (if `OUTPUT_KEEP_SURVIVED`)
+    and for the first `OUTPUT_KEEP_FIRST` runs of each project, command, and outcome; the outputs of other runs are
+    truncated to their first and last `OUTPUT_TRUNCATED_LIMIT / 2` bytes. If `OUTPUT_KEEP_FIRST` is None, all
+    outputs are kept in full. The compressed outputs are put into the blob store if one is configured."""
+
+    def __init__(self, app):
+        self.codec = OutputCodec(app.config.get('OUTPUT_CODEC', 'zlib'))
+        self.keep_survived = app.config.get('OUTPUT_KEEP_SURVIVED', True)
+        self.keep_first = app.config.get('OUTPUT_KEEP_FIRST', 10)  # type: Optional[int]
+        self.truncated_limit = app.config.get('OUTPUT_TRUNCATED_LIMIT', 16 * 1024)
+
+        # number of stored runs by project, command, and outcome; read from the database once per project
+        self.__counts = {}  # type: dict[int, dict[tuple[str, str], int]]
+
+    def store(self, run: Run, state: str):
+        """move the output of a run that is about to be stored into its compressed column"""
+        if run.output is None:
+            return
+
+        output = run.output
+        if not self.__keep(run, state):
+            output = OutputCodec.truncate(output, self.truncated_limit)
+
+        run.output_blob, run.output_codec = self.codec.compress(output)
+        run.output = None
+        if blob_store is not None:
+            run.output_digest, run.output_blob = blob_store.put(run.output_blob), None
+
+    def __keep(self, run: Run, state: str) -> bool:
+        if self.keep_first is None or (self.keep_survived and state == 'survived'):
+            return True
+
+        if run.project_id not in self.__counts:
+            self.__counts[run.project_id] = {(command, log): count for command, log, count in db.session.query(
+                Run.command, Run.log, func.count(Run.id)
+            ).filter(Run.project_id == run.project_id).group_by(Run.command, Run.log)}
+
+        counts = self.__counts[run.project_id]
+        counts[(run.command, run.log)] = counts.get((run.command, run.log), 0) + 1
+        return counts[(run.command, run.log)] <= self.keep_first
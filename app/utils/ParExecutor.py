@@ -1,90 +1,261 @@
 # coding=utf-8
 
-import shutil
 import threading
-from concurrent.futures import ThreadPoolExecutor
-from typing import Optional, Union
-from app.models import Patch, Project
-import tempfile
-import os
+import time
+from types import SimpleNamespace
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Optional, Union
+from app.models import Patch, Project, File
 from app import db
 from pathlib import Path
 from .Executor import Executor
-
-
-class _RaiiTempDir:
-    def __init__(self, prefix="mutate_cpp"):
-        self.path = Path(tempfile.mkdtemp(prefix=prefix))
-
-    def __del__(self):
-        shutil.rmtree(self.path)
+from .AffinityScheduler import AffinityScheduler
+from .Calibration import Calibration
+from .ArtifactHasher import ArtifactHasher
+from .ResultWriter import ResultWriter
+from .ConcurrencyController import ConcurrencyController
+from .Coverage import Coverage
+from .PatchApplier import PatchApplier
+from .Schemata import Schemata
+from .TestReport import TestReport
+from .Workspace import Workspace
 
 
 class _ThreadLocal:
-    workspace: _RaiiTempDir
-    last_project_id: Optional[int]
+    workspace: Workspace
+    # instrumented files of the workspace by file id, and whether the build outputs match the workspace
+    schemata: dict[int, Schemata]
+    built: bool
+    # hash of the artifacts of the unmutated workspace; empty if it could not be determined
+    baseline: Optional[str]
 
 
 _thread_local: Union[_ThreadLocal, threading.local] = threading.local()
 
 
-def _thread_initializer():
-    _thread_local.workspace = _RaiiTempDir()
-    _thread_local.last_project_id = None
+def _thread_initializer(workspace_root: Optional[str] = None):
+    _thread_local.workspace = Workspace(workspace_root)
+    _thread_local.schemata = {}
+    _thread_local.built = False
+    _thread_local.baseline = None
 
 
 class _ProjectRecord:
-    def __init__(self, project: Project):
+    def __init__(self, project: Project, verdicts: Optional[dict] = None, timeouts: Optional[dict] = None,
+                 source_files: Optional[list[str]] = None):
+        self.id = project.id
         self.workdir = project.workdir
+        # the files of the project, which the hardlink strategy links into the workspaces
+        self.source_files = source_files or []  # type: list[str]
         self.quickcheck_timeout = project.quickcheck_timeout
         self.quickcheck_command = project.quickcheck_command
         self.test_timeout = project.test_timeout
         self.test_command = project.test_command
         self.build_command = project.build_command
         self.clean_command = project.clean_command
+        self.workspace_strategy = project.workspace_strategy
+        self.schemata = project.schemata
+        self.artifact_patterns = project.artifact_patterns
+        self.test_report = project.test_report
+        self.adaptive_timeouts = project.adaptive_timeouts
+        # timeouts derived from the durations of the stages; replaced while the executor runs
+        self.timeouts = timeouts or {}  # type: dict[str, float]
+        # verdicts of evaluated patches by artifact hash; shared between all threads
+        self.verdicts = verdicts if verdicts is not None else {}  # type: dict[str, tuple[int, str]]
 
 
 class _PatchRecord:
-    def __init__(self, patch: Patch):
+    def __init__(self, patch: Patch, project: _ProjectRecord, file_filename: Optional[str],
+                 schema: Optional[list] = None, tests: Optional[list[str]] = None,
+                 priority_tests: Optional[list[str]] = None):
         self.id = patch.id
         self.state = patch.state
         self.file_id = patch.file_id
-        # noinspection PyUnresolvedReferences
-        self.file_filename = patch.file.filename
+        self.file_filename = file_filename
         self.project_id = patch.project_id
-        # noinspection PyUnresolvedReferences
-        self.project = _ProjectRecord(patch.project)
-        self.patch = patch.patch
+        # project records are shared between all patches of a project
+        self.project = project
+        self.patch = patch.patch_text
+        self.line = patch.line
+        self.column_start = patch.column_start
+        self.column_end = patch.column_end
+        self.code_original = patch.code_original
+        self.code_replacement = patch.code_replacement
+        # the mutants of the file for the schemata mode; shared between all patches of a file
+        self.schema = schema
+        # the tests covering the patched line; None if the coverage is unknown
+        self.tests = tests
+        # the tests that killed the most patches of the file
+        self.priority_tests = priority_tests or []
+
+    @property
+    def patch_text(self):
+        return self.patch
+
+    def to_dict(self) -> dict:
+        result = dict(vars(self))
+        del result['project']
+        del result['schema']
+        return result
+
+
+class _RecordCache:
+    """creates patch records that share the records of their project"""
+
+    def __init__(self, priority_tests: int = 0):
+        self.priority_tests = priority_tests
+        self.projects = {}  # type: dict[int, _ProjectRecord]
+        self.filenames = {}  # type: dict[int, Optional[str]]
+        self.coverage = {}  # type: dict[int, Optional[dict[str, list[str]]]]
+        self.schemata = {}  # type: dict[int, list]
+        # the ranking changes as patches are killed, so it is cleared by refresh()
+        self.killers = {}  # type: dict[int, list[str]]
+
+    def record(self, patch: Patch) -> _PatchRecord:
+        if patch.project_id not in self.projects:
+            # noinspection PyUnresolvedReferences
+            project = patch.project
+            self.projects[patch.project_id] = _ProjectRecord(
+                project, ArtifactHasher.verdicts(project.id),
+                Calibration.timeouts(project.id) if project.adaptive_timeouts else None,
+                [filename for filename, in db.session.query(File.filename).filter(File.project_id == project.id)])
+        if patch.file_id not in self.filenames:
+            filename, coverage = db.session.query(File.filename, File.coverage).filter(
+                File.id == patch.file_id).first() or (None, None)
+            self.filenames[patch.file_id] = filename
+            self.coverage[patch.file_id] = Coverage.load(coverage)
+        if self.projects[patch.project_id].schemata and patch.file_id not in self.schemata:
+            self.schemata[patch.file_id] = _RecordCache.schema(patch.file_id)
+        if self.projects[patch.project_id].test_report and patch.file_id not in self.killers:
+            self.killers[patch.file_id] = TestReport.killers(patch.file_id, self.priority_tests)
+        return _PatchRecord(patch, self.projects[patch.project_id], self.filenames[patch.file_id],
+                            self.schemata.get(patch.file_id), Coverage.tests(self.coverage[patch.file_id], patch.line),
+                            self.killers.get(patch.file_id))
+
+    def refresh(self):
+        """update the data that changes while patches are executed"""
+        self.killers.clear()
+        for project in self.projects.values():
+            if project.adaptive_timeouts:
+                project.timeouts = Calibration.timeouts(project.id)
+
+    @staticmethod
+    def schema(file_id: int) -> list:
+        """the mutants of a file that are not executed yet"""
+        return [SimpleNamespace(**row._asdict()) for row in db.session.query(
+            Patch.id, Patch.line, Patch.column_start, Patch.column_end, Patch.code_original, Patch.code_replacement
+        ).filter(Patch.file_id == file_id, Patch.state.in_(['incomplete', 'running']))]
 
 
 class ParExecutor(Executor):
-    def __init__(self, app):
+    def __init__(self, app, max_workers: Optional[int] = None, project_id: Optional[int] = None,
+                 on_result: Optional[Callable[['ParExecutor._ExecutionResult'], None]] = None):
         super().__init__(app)
+        # a given number of workers overrides the configuration and disables the adaptive mode
+        self.controller = ConcurrencyController(max_workers=max_workers or app.config.get('PARALLEL_WORKERS'),
+                                                adaptive=not max_workers and app.config.get('PARALLEL_ADAPTIVE', False),
+                                                memory_reserve=app.config.get('PARALLEL_MEMORY_RESERVE', 0.1))
+        # only patches of this project are claimed, if given
+        self.project_id = project_id
+        # called with the result of each patch once it is handed to the writer
+        self.on_result = on_result
+
+    @property
+    def concurrency(self):
+        return self.controller.concurrency
 
     def main(self):
         with self.app.app_context():
-            while self.running:
-                with ThreadPoolExecutor(initializer=_thread_initializer) as executor:
-                    patches = Patch.query.filter(Patch.state == 'incomplete').all()
-                    patches = map(_PatchRecord, patches)
-                    for result in executor.map(ParExecutor.workflow, patches):
-                        for run_record in result.run_records:
-                            db.session.add(run_record.model())
-                        Patch.query.get(result.patch_id).state = result.state
-                        db.session.commit()
-                        if not self.running:
+            records = _RecordCache(self.app.config.get('PRIORITY_TESTS', 3))
+
+            with ThreadPoolExecutor(max_workers=self.controller.max_workers,
+                                    initializer=_thread_initializer,
+                                    initargs=(self.app.config.get('WORKSPACE_ROOT'),)) as executor:
+                scheduler = AffinityScheduler()
+                writer = ResultWriter(self.app, self.leases)
+                writer.start()
+                pending = set()  # type: set[Future]
+                exhausted = False
+                last_renewal = time.monotonic()
+
+                try:
+                    while True:
+                        # keep enough patches claimed so that every worker can stick to its shard
+                        if self.running and not exhausted and scheduler.available < 2 * self.controller.concurrency:
+                            batch_size = max(self.claim_batch_size, 4 * self.controller.concurrency)
+                            records.refresh()
+                            claimed = self.leases.claim(batch_size, self.project_id)
+                            exhausted = scheduler.extend(map(records.record, claimed)) == 0
+
+                        # only submit as many patches as the controller currently allows
+                        while self.running and len(pending) < self.controller.concurrency and scheduler.reserve():
+                            pending.add(executor.submit(ParExecutor.workflow_next, scheduler))
+
+                        if not pending:
                             break
-                    executor.shutdown(cancel_futures=True)
-                self.stop()
+
+                        done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            result = future.result()
+                            writer.add(result.patch_id, result.state, result.run_records, result.attributes)
+                            scheduler.finish(result.patch_id)
+                            self.controller.record(result.stage_durations)
+                            if self.on_result is not None:
+                                self.on_result(result)
+
+                        # keep the leases of claimed patches alive
+                        if time.monotonic() - last_renewal > self.leases.duration.total_seconds() / 3:
+                            self.leases.renew(scheduler.patch_ids())
+                            last_renewal = time.monotonic()
+
+                        self.controller.update()
+                finally:
+                    # also on errors, write the results so far and return the patches that were not started
+                    writer.close()
+                    self.leases.release(scheduler.queued_ids())
+                    self.stop()
 
     def is_parallel(self):
         return True
 
+    @staticmethod
+    def encode_patches(patches: list[Patch], priority_tests: int = 0) -> dict:
+        """serialize claimed patches for a remote worker"""
+        records = _RecordCache(priority_tests)
+        patch_records = [records.record(patch) for patch in patches]
+        return {
+            'projects': {project_id: vars(project) for project_id, project in records.projects.items()},
+            'schemata': {file_id: [vars(mutant) for mutant in schema] for file_id, schema in records.schemata.items()},
+            'patches': [patch_record.to_dict() for patch_record in patch_records]
+        }
+
+    @staticmethod
+    def decode_patches(data: dict) -> list[_PatchRecord]:
+        """deserialize patches encoded by encode_patches"""
+        projects = {int(project_id): _ProjectRecord(SimpleNamespace(**project), project['verdicts'],
+                                                    project['timeouts'], project.get('source_files'))
+                    for project_id, project in data['projects'].items()}
+        schemata = {int(file_id): [SimpleNamespace(**mutant) for mutant in schema]
+                    for file_id, schema in data.get('schemata', {}).items()}
+        return [_PatchRecord(SimpleNamespace(patch_text=patch['patch'], **patch), projects[patch['project_id']],
+                             patch['file_filename'], schemata.get(patch['file_id']), patch['tests'],
+                             patch['priority_tests'])
+                for patch in data['patches']]
+
     class _ExecutionResult:
         def __init__(self, patch_id: int):
             self.patch_id: int = patch_id
             self.run_records: list[Executor._RunRecord] = []
             self.state: str = "incomplete"
+            self.attributes: dict = {}
+
+        @property
+        def stage_durations(self) -> dict[str, float]:
+            return {run_record.command: run_record.duration for run_record in self.run_records}
+
+    @staticmethod
+    def workflow_next(scheduler: AffinityScheduler) -> _ExecutionResult:
+        return ParExecutor.workflow(scheduler.next(threading.get_ident()))
 
     @staticmethod
     def workflow(patch: _PatchRecord) -> _ExecutionResult:
@@ -92,54 +263,183 @@ class ParExecutor(Executor):
         if patch.file_filename is None:
             return result
 
+        # mutants on lines no test executes survive without being built
+        if patch.tests == []:
+            result.run_records.append(Coverage.uncovered_run(patch.id, patch.project_id, patch.line))
+            result.state = 'survived'
+            return result
+
         # step 0: prepare workspace and file path
-        if patch.project_id != _thread_local.last_project_id:
-            shutil.rmtree(_thread_local.workspace.path)
-            shutil.copytree(patch.project.workdir, _thread_local.workspace.path)
-            _thread_local.last_project_id = patch.project_id
+        workspace = _thread_local.workspace
+        if patch.project_id != workspace.project_id:
+            workspace.provision(patch.project_id, patch.project.workdir, patch.project.workspace_strategy,
+                                patch.project.source_files)
+            _thread_local.schemata = {}
+            _thread_local.built = False
+            _thread_local.baseline = None
         relative_path = Path(patch.file_filename).relative_to(Path(patch.project.workdir))
-        file_path = _thread_local.workspace.path / relative_path
+        file_path = workspace.path / relative_path
+        Workspace.prepare_file(file_path)
 
-        # step 1: write patch to temp file
-        patchfile = tempfile.NamedTemporaryFile(delete=False, mode='w')
-        patchfile.write(patch.patch)
-        patchfile.close()
+        # schemata mode: the file is built once with all its mutants, and the mutant is selected at runtime
+        if ParExecutor.__prepare_schemata(result, patch, file_path):
+            environment = Schemata.environment(patch.id)
+            success = (ParExecutor.__apply_command(result, patch, 'quickcheck_command', environment) and
+                       ParExecutor.__apply_tests(result, patch, environment))
 
-        # step 2: apply patch
-        Executor._apply_patch(patchfile.name, file_path)
+            # the clean command may remove the build outputs, so the schemata are built again for the next mutant
+            if patch.project.clean_command:
+                ParExecutor.__apply_command(result, patch, 'clean_command', environment)
+                _thread_local.built = False
 
-        # step 3: command pipeline
-        success = (ParExecutor.__apply_command(result, patch, 'build_command') and
-                   ParExecutor.__apply_command(result, patch, 'quickcheck_command') and
-                   ParExecutor.__apply_command(result, patch, 'test_command'))
+            result.state = 'survived' if success else 'killed'
+            return result
 
-        ParExecutor.__apply_command(result, patch, 'clean_command')
+        # the artifacts of the mutant are compared to those of the unmutated workspace
+        if patch.project.artifact_patterns and _thread_local.baseline is None:
+            _thread_local.baseline = ParExecutor.__hash_baseline(patch)
+
+        # step 1: apply patch
+        applier = PatchApplier(patch, file_path)
+        applier.apply()
+
+        try:
+            # step 2: command pipeline; tests are skipped if the artifacts show an equivalent or duplicate mutant
+            success = ParExecutor.__apply_command(result, patch, 'build_command')
+            verdict = ParExecutor.__artifact_verdict(result, patch) if success else None
+            if verdict is not None:
+                success = verdict == 'survived'
+            else:
+                success = (success and
+                           ParExecutor.__apply_command(result, patch, 'quickcheck_command') and
+                           ParExecutor.__apply_tests(result, patch))
+
+                if 'artifact_hash' in result.attributes:
+                    patch.project.verdicts[result.attributes['artifact_hash']] = (patch.id, 'survived' if success
+                                                                                  else 'killed')
+
+            ParExecutor.__apply_command(result, patch, 'clean_command')
+
+            if success:
+                result.state = 'survived'
+            else:
+                result.state = 'killed'
+        finally:
+            # step 3: revert patch, also if a step raised an exception
+            applier.revert()
+            _thread_local.built = False
 
-        if success:
-            result.state = 'survived'
-        else:
+        return result
+
+    @staticmethod
+    def __hash_baseline(patch: _PatchRecord) -> str:
+        """build the unmutated workspace and hash its artifacts"""
+        command, timeout = Executor._get_command_and_timeout(patch.project, 'build_command',
+                                                             patch.project.timeouts)
+        run = Executor._run_command(patch.id, patch.project_id, 'build_command', command,
+                                    _thread_local.workspace.path, timeout)
+        if not run.success:
+            return ''
+        return ArtifactHasher(patch.project.artifact_patterns).hash(_thread_local.workspace.path) or ''
+
+    @staticmethod
+    def __artifact_verdict(result: _ExecutionResult, patch: _PatchRecord) -> Optional[str]:
+        """return the state of the patch if its artifacts are identical to the original or another patch"""
+        if not patch.project.artifact_patterns:
+            return None
+
+        artifact_hash = ArtifactHasher(patch.project.artifact_patterns).hash(_thread_local.workspace.path)
+        if artifact_hash is None:
+            return None
+        result.attributes['artifact_hash'] = artifact_hash
+
+        if artifact_hash == _thread_local.baseline:
+            result.attributes['equivalence'] = 'equivalent'
+            ArtifactHasher.mark_equivalent(result.run_records[-1])
             result.state = 'killed'
+            return 'killed'
 
-        # step 4: revert patch
-        Executor._revert_patch(patchfile.name, file_path)
+        verdict = patch.project.verdicts.get(artifact_hash)
+        if verdict is not None:
+            duplicate_of, state = verdict
+            result.attributes.update(equivalence='duplicate', duplicate_of=duplicate_of)
+            return state
 
-        # step 6: delete patch file
-        os.remove(patchfile.name)
+        return None
 
-        return result
+    @staticmethod
+    def __prepare_schemata(result: _ExecutionResult, patch: _PatchRecord, file_path: Path) -> bool:
+        """make sure the workspace is built with the mutant schemata of the patch's file; return False if the
+        patch must be applied instead"""
+        if not patch.project.schemata or patch.schema is None:
+            return False
+
+        schemata = _thread_local.schemata.get(patch.file_id)
+        if schemata is None:
+            schemata = _thread_local.schemata[patch.file_id] = Schemata(file_path, patch.schema)
+
+        if schemata.failed:
+            return False
+
+        if not schemata.instrumented or not _thread_local.built:
+            command, timeout = Executor._get_command_and_timeout(patch.project, 'build_command',
+                                                                 patch.project.timeouts)
+            run = schemata.build(lambda: Executor._run_command(patch.id, patch.project_id, 'build_command', command,
+                                                               _thread_local.workspace.path, timeout))
+            if run is None:
+                return False
+
+            # the build is accounted to the patch that triggered it
+            result.run_records.append(run)
+            _thread_local.built = True
+
+        if patch.id in schemata.patch_ids:
+            return True
+
+        # the mutant is not part of the schemata: restore the original file to apply the patch
+        schemata.revert()
+        return False
 
     @staticmethod
-    def __apply_command(result: _ExecutionResult, patch: _PatchRecord, step: str) -> bool:
+    def __apply_tests(result: _ExecutionResult, patch: _PatchRecord, environment: Optional[dict] = None) -> bool:
+        """run the tests that killed the most patches of the file first, and the whole test suite only if they pass"""
+        project = patch.project
+        report = TestReport(project.test_report) if project.test_report else None
+        workdir = _thread_local.workspace.path
+
+        priority_tests = [test for test in patch.priority_tests
+                          if not patch.tests or '' in patch.tests or test in patch.tests]
+        if report is not None and priority_tests and Coverage.selects_tests(project.test_command):
+            report.remove(workdir)
+            if not ParExecutor.__apply_command(result, patch, 'test_command', environment, priority_tests):
+                result.attributes['killing_tests'] = report.failed_tests(workdir, result.run_records[-1].output) or []
+                return False
+
+        if report is not None:
+            report.remove(workdir)
+        if not ParExecutor.__apply_command(result, patch, 'test_command', environment):
+            if report is not None:
+                result.attributes['killing_tests'] = report.failed_tests(workdir, result.run_records[-1].output) or []
+            return False
+        return True
+
+    @staticmethod
+    def __apply_command(result: _ExecutionResult, patch: _PatchRecord, step: str,
+                        environment: Optional[dict] = None, tests: Optional[list[str]] = None) -> bool:
         print(patch.id, step)
         project = patch.project
 
-        command, timeout = Executor._get_command_and_timeout(project, step)
+        command, timeout = Executor._get_command_and_timeout(project, step, project.timeouts)
 
         # if no command is provided, return without creating a run; True means: next command must be executed
         if not command:
             return True
 
-        run = Executor._run_command(patch.id, patch.project_id, step, command, _thread_local.workspace.path, timeout)
+        # only execute the given tests, or the tests that cover the patched line
+        command = Coverage.select_tests(command, tests if tests is not None else patch.tests)
+
+        run = Executor._run_command(patch.id, patch.project_id, step, command, _thread_local.workspace.path, timeout,
+                                    environment)
 
         result.run_records.append(run)
 
@@ -0,0 +1,92 @@
+# coding=utf-8
+
+import os
+import tempfile
+from typing import Optional
+from app.utils.Replacement import Replacement
+from .Executor import Executor
+
+
+class PatchApplier:
+    """Applies a patch to a file and restores the original file afterwards.
+
+    Patches created by SourceFile only ever replace or delete a single line, so the line, column, and replacement
+    information stored with the patch suffices to rewrite the file in-process. Only if the file does not match that
+    information, the external `patch` tool is used with the stored patch text."""
+
+    def __init__(self, patch, file_path):
+        self.patch = patch
+        self.file_path = str(file_path)
+        self.__original = None  # type: Optional[bytes]
+        self.__patch_file_path = None  # type: Optional[str]
+
+    def apply(self):
+        with open(self.file_path, 'rb') as f:
+            original = f.read()
+
+        patched = self.__patch_content(original)
+
+        if patched is not None:
+            self.__original = original
+            PatchApplier.write_atomically(self.file_path, patched)
+        else:
+            patchfile = tempfile.NamedTemporaryFile(delete=False, mode='w')
+            patchfile.write(self.patch.patch_text)
+            patchfile.close()
+            self.__patch_file_path = patchfile.name
+            Executor._apply_patch(self.__patch_file_path, self.file_path)
+
+    def revert(self):
+        if self.__original is not None:
+            PatchApplier.write_atomically(self.file_path, self.__original)
+            self.__original = None
+        elif self.__patch_file_path is not None:
+            Executor._revert_patch(self.__patch_file_path, self.file_path)
+            os.remove(self.__patch_file_path)
+            self.__patch_file_path = None
+
+    def __patch_content(self, content: bytes) -> Optional[bytes]:
+        """return the patched content, or None if the content does not match the patch"""
+        lines = content.splitlines(keepends=True)
+        index = self.patch.line - 1
+        if not 0 <= index < len(lines):
+            return None
+
+        line_raw = lines[index]
+        line_content = line_raw.rstrip(b'\r\n')
+        line_ending = line_raw[len(line_content):]
+
+        try:
+            # SourceFile computes the columns on the line without trailing whitespace
+            old_line = line_content.decode('utf-8').rstrip()
+        except UnicodeDecodeError:
+            return None
+
+        replacement = Replacement(start_col=self.patch.column_start,
+                                  end_col=self.patch.column_end,
+                                  old_val=self.patch.code_original,
+                                  new_val=self.patch.code_replacement)
+
+        if replacement.new_val is None:
+            if old_line != replacement.old_val:
+                return None
+            new_lines = []
+        else:
+            if old_line[replacement.start_col:replacement.end_col] != replacement.old_val:
+                return None
+            new_lines = [replacement.apply(old_line).encode('utf-8') + line_ending]
+
+        return b''.join(lines[:index] + new_lines + lines[index + 1:])
+
+    @staticmethod
+    def write_atomically(file_path: str, content: bytes):
+        directory, filename = os.path.split(file_path)
+        fd, temp_path = tempfile.mkstemp(prefix='.' + filename + '.', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.chmod(temp_path, os.stat(file_path).st_mode & 0o7777)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
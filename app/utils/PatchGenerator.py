@@ -0,0 +1,52 @@
+# coding=utf-8
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Optional
+from app import db
+from app.models import File
+from app.utils.SourceFile import SourceFile
+from app.utils.Statistics import Statistics
+
+
+class PatchGenerator:
+    """Generates the patches of many files in parallel.
+
+    The files are mutated with SourceFile.mutate in a pool of `jobs` processes; only the mutation records are sent back.
+    This process is the single writer: it inserts the patches of each file in bulk and commits once per file, so a
+    file's patches are either all stored or not at all."""
+
+    def __init__(self, jobs: Optional[int] = None):
+        # None uses the default of ProcessPoolExecutor (the number of processors)
+        self.jobs = jobs
+
+    def generate(self, files: list[File], first_line: int = 1, last_line: int = -1,
+                 mutator_ids: Optional[list[str]] = None,
+                 on_file: Optional[Callable[[File, int], None]] = None) -> int:
+        """generate the patches of the files and return their number; on_file is called with each file and the number
+        of its patches once they are stored"""
+        count = 0
+        project_ids = {file.project_id for file in files}
+
+        if self.jobs == 1:
+            # no processes are needed to mutate the files one after another
+            for file in files:
+                count += self.__store(file, SourceFile.mutate(file.filename, file.content, first_line, last_line,
+                                                              mutator_ids), on_file)
+        else:
+            with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+                futures = {pool.submit(SourceFile.mutate, file.filename, file.content, first_line, last_line,
+                                       mutator_ids): file for file in files}
+                for future in as_completed(futures):
+                    count += self.__store(futures[future], future.result(), on_file)
+
+        for project_id in project_ids:
+            Statistics.invalidate(project_id)
+        return count
+
+    @staticmethod
+    def __store(file: File, records: list[tuple], on_file: Optional[Callable[[File, int], None]]) -> int:
+        count = SourceFile.insert_patches(file.id, file.project_id, records)
+        db.session.commit()
+        if on_file is not None:
+            on_file(file, count)
+        return count
@@ -0,0 +1,43 @@
+# coding=utf-8
+
+from typing import Optional
+from sqlalchemy.orm import joinedload
+from sqlalchemy.sql import and_, exists, text
+from app.models import File, Patch, Project, Run, QUEUED_CONDITION
+
+
+class PatchListings:
+    """Queries of the patch listings of the web app.
+
+    Each query is backed by an index on its filter columns, and filters on the runs use EXISTS instead of a join so
+    every patch is listed once. The names of the files and projects shown in the listings are loaded with the patches
+    in the same query. The listings are paginated with KeysetPage; `cli/check_query_plans.py` verifies that SQLite
+    uses the indexes."""
+
+    @staticmethod
+    def project(project_id: int, patch_state: Optional[str] = None, confirmation_state: Optional[str] = None,
+                run_state: Optional[str] = None):
+        """patches of a project, optionally filtered by state, confirmation, and the log of one of their runs"""
+        patches = Patch.query.options(joinedload(Patch.file).load_only(File.filename)).filter(
+            Patch.project_id == project_id)
+
+        if patch_state:
+            patches = patches.filter(Patch.state == patch_state)
+        if confirmation_state:
+            patches = patches.filter(Patch.confirmation == confirmation_state)
+        if run_state:
+            patches = patches.filter(exists().where(and_(Run.patch_id == Patch.id, Run.log == run_state)))
+
+        return patches
+
+    @staticmethod
+    def queue():
+        """patches that are not yet finished"""
+        # the pages are read from the partial index ix_patch_queue
+        return Patch.query.options(joinedload(Patch.file).load_only(File.filename),
+                                   joinedload(Patch.project).load_only(Project.name)).filter(text(QUEUED_CONDITION))
+
+    @staticmethod
+    def mutator(kind: str):
+        """patches created by a mutator"""
+        return Patch.query.filter(Patch.kind == kind)
@@ -0,0 +1,120 @@
+# coding=utf-8
+
+import json
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Optional
+from urllib import request
+from urllib.error import URLError
+from .AffinityScheduler import AffinityScheduler
+from .Leases import Leases
+from .ParExecutor import ParExecutor, _thread_initializer
+
+
+class RemoteWorker:
+    """Executes patches leased from a coordinator (a running Mutate++ web app) over its JSON API.
+
+    The worker builds and tests the patches in local workspaces, renews its leases with regular heartbeats, and
+    posts the run records back to the coordinator. Patches whose lease expired (e.g., because the worker crashed)
+    are handed out to other workers by the coordinator."""
+
+    def __init__(self, coordinator: str, jobs: int, name: Optional[str] = None, workspace_root: Optional[str] = None,
+                 poll_interval: float = 10.0, exit_when_empty: bool = False):
+        self.coordinator = coordinator.rstrip('/')
+        self.jobs = jobs
+        self.owner = Leases.make_owner(name)
+        self.workspace_root = workspace_root
+        self.poll_interval = poll_interval
+        self.exit_when_empty = exit_when_empty
+        self.running = False
+        self.__scheduler = AffinityScheduler()
+        self.__lease_duration = 60.0
+
+    def main(self):
+        self.running = True
+        heartbeat = threading.Thread(target=self.__heartbeat, name='Heartbeat', daemon=True)
+        heartbeat.start()
+
+        with ThreadPoolExecutor(max_workers=self.jobs, initializer=_thread_initializer,
+                                initargs=(self.workspace_root,)) as executor:
+            pending = set()  # type: set[Future]
+            results = []
+            next_lease = 0.0
+
+            try:
+                while True:
+                    # report finished patches; if the coordinator is unreachable, try again later
+                    if results and self.__post('/api/workers/results', {'results': results}) is not None:
+                        for result in results:
+                            self.__scheduler.finish(result['patch_id'])
+                        results = []
+
+                    if self.running and self.__scheduler.available < 2 * self.jobs and \
+                            time.monotonic() >= next_lease:
+                        if self.__lease(4 * self.jobs) == 0:
+                            # the queue is empty: ask again later
+                            next_lease = time.monotonic() + self.poll_interval
+                            if self.exit_when_empty:
+                                self.running = False
+
+                    while self.running and len(pending) < self.jobs and self.__scheduler.reserve():
+                        pending.add(executor.submit(ParExecutor.workflow_next, self.__scheduler))
+
+                    if not pending:
+                        if not results and (not self.running or self.__scheduler.available == 0 and
+                                            self.exit_when_empty):
+                            break
+                        time.sleep(1.0)
+                        continue
+
+                    done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        result = future.result()
+                        print(self.owner, result.patch_id, result.state)
+                        results.append({'patch_id': result.patch_id,
+                                        'state': result.state,
+                                        'runs': [run_record.to_dict() for run_record in result.run_records],
+                                        'attributes': result.attributes})
+            except KeyboardInterrupt:
+                self.running = False
+                print('Waiting for running patches to finish...')
+                for future in wait(pending).done:
+                    result = future.result()
+                    results.append({'patch_id': result.patch_id,
+                                    'state': result.state,
+                                    'runs': [run_record.to_dict() for run_record in result.run_records],
+                                    'attributes': result.attributes})
+            finally:
+                self.running = False
+                if results:
+                    self.__post('/api/workers/results', {'results': results})
+                self.__post('/api/workers/release', {'patches': self.__scheduler.queued_ids()})
+
+    def __lease(self, count: int) -> int:
+        response = self.__post('/api/workers/lease', {'count': count})
+        if response is None:
+            return 0
+        self.__lease_duration = response['lease_duration']
+        return self.__scheduler.extend(ParExecutor.decode_patches(response))
+
+    def __heartbeat(self):
+        while self.running:
+            time.sleep(self.__lease_duration / 3)
+            response = self.__post('/api/workers/heartbeat', {'patches': self.__scheduler.patch_ids()})
+            if response is not None:
+                lost = set(self.__scheduler.patch_ids()) - set(response['leased'])
+                if lost:
+                    print('Lost the leases of patches', sorted(lost))
+
+    def __post(self, path: str, data: dict) -> Optional[dict]:
+        data['worker'] = self.owner
+        req = request.Request(self.coordinator + path, data=json.dumps(data).encode('utf-8'),
+                              headers={'Content-Type': 'application/json'})
+        try:
+            with request.urlopen(req, timeout=60) as response:
+                return json.load(response)
+        except (URLError, OSError, ValueError):
+            traceback.print_exc()
+            return None
@@ -0,0 +1,153 @@
+# coding=utf-8
+
+import queue
+import time
+import traceback
+from threading import Thread
+from app import db
+from app.models import Kill, Patch
+from .Counters import Counters
+from .Leases import Leases
+from .OutputRetention import OutputRetention
+from .Statistics import Statistics
+
+_STOP = object()
+
+
+class ResultWriter:
+    """Persists the results of the executors on a dedicated thread.
+
+    Run records and patch states are buffered and written in one transaction once `batch_size` results are buffered
+    or the oldest buffered result is `interval` seconds old. Only results of patches still leased to the owner of
+    `leases` are written; the others may have been reclaimed and executed by another owner. Closing the writer flushes
+    all buffered results; after `close_retries` failed attempts, the results are dropped and their patches returned to
+    the queue. The outputs of the runs are truncated and compressed according to the retention policy."""
+
+    # patch attributes that may be written along with the state; the attribute 'killing_tests' adds the failed tests
+    # to the kill matrix
+    ATTRIBUTES = ('artifact_hash', 'equivalence', 'duplicate_of')
+
+    def __init__(self, app, leases: Leases, batch_size: int = None, interval: float = None,
+                 close_retries: int = None):
+        self.app = app
+        self.leases = leases
+        self.batch_size = batch_size or app.config.get('RESULT_BATCH_SIZE', 32)
+        self.interval = interval if interval is not None else app.config.get('RESULT_FLUSH_INTERVAL', 0.5)
+        self.close_retries = close_retries or app.config.get('RESULT_CLOSE_RETRIES', 5)
+        self.__queue = queue.Queue()
+        self.__retention = OutputRetention(app)
+        self.__thread = None  # type: Thread
+
+    def start(self):
+        self.__thread = Thread(target=self.__main, name='ResultWriter')
+        self.__thread.start()
+
+    def add(self, patch_id: int, state: str, run_records: list, attributes: dict = None):
+        self.__queue.put((patch_id, state, run_records, attributes))
+
+    def close(self):
+        """write all buffered results and stop the writer thread"""
+        if self.__thread is not None:
+            self.__queue.put(_STOP)
+            self.__thread.join()
+            self.__thread = None
+
+    def __main(self):
+        with self.app.app_context():
+            buffer = []
+            deadline = None
+
+            while True:
+                try:
+                    timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                    item = self.__queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if item is _STOP:
+                    # on shutdown, retry a few times to write the buffered results; the patches of dropped results
+                    # are returned to the queue, as their owner may live on and keep renewing its leases
+                    attempts = 0
+                    while buffer and not self.__flush(buffer):
+                        attempts += 1
+                        if attempts >= self.close_retries:
+                            self.__drop(buffer)
+                            break
+                        time.sleep(self.interval)
+                    return
+
+                if item is not None:
+                    buffer.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.interval
+
+                if len(buffer) >= self.batch_size or (buffer and time.monotonic() >= deadline):
+                    if self.__flush(buffer):
+                        buffer = []
+                        deadline = None
+                    else:
+                        deadline = time.monotonic() + self.interval
+
+    @staticmethod
+    def write(results, retention: OutputRetention, owner: str) -> list[int]:
+        """write a list of (patch_id, state, run_records, attributes) tuples in one transaction; only the results of
+        patches that are running and leased to owner are written, and their ids are returned"""
+        patch_projects = dict(db.session.query(Patch.id, Patch.project_id).filter(
+            Patch.id.in_([patch_id for patch_id, _, _, _ in results])))
+
+        # the lease is checked by the update itself, so a patch reclaimed in the meantime is not overwritten
+        accepted = []
+        for patch_id, state, _, attributes in results:
+            values = {getattr(Patch, key): value for key, value in (attributes or {}).items()
+                      if key in ResultWriter.ATTRIBUTES}
+            updated = Patch.query.filter(Patch.id == patch_id, Patch.state == 'running',
+                                         Patch.lease_owner == owner).update(
+                {**values, Patch.state: state, Patch.lease_owner: None, Patch.lease_expiry: None},
+                synchronize_session=False)
+            if updated == 1:
+                accepted.append(patch_id)
+        accepted_results = [result for result in results if result[0] in accepted]
+        Counters.transitions([(patch_projects[patch_id], 'running', state)
+                              for patch_id, state, _, _ in accepted_results])
+
+        runs = []
+        for _, state, run_records, _ in accepted_results:
+            for run_record in run_records:
+                run = run_record.model()
+                retention.store(run, state)
+                runs.append(run)
+        db.session.bulk_save_objects(runs)
+        db.session.bulk_save_objects([Kill(patch_id=patch_id, test=test)
+                                      for patch_id, _, _, attributes in accepted_results
+                                      for test in (attributes or {}).get('killing_tests', [])])
+        db.session.commit()
+
+        project_ids = {run.project_id for run in runs}
+        if not project_ids:
+            Statistics.invalidate()
+        for project_id in project_ids:
+            Statistics.invalidate(project_id)
+        return accepted
+
+    def __flush(self, buffer) -> bool:
+        try:
+            accepted = ResultWriter.write(buffer, self.__retention, self.leases.owner)
+            if len(accepted) < len(buffer):
+                print('dropped the results of patches that are no longer leased: {patch_ids}'.format(
+                    patch_ids=[patch_id for patch_id, _, _, _ in buffer if patch_id not in accepted]))
+            return True
+        except Exception:
+            db.session.rollback()
+            traceback.print_exc()
+            return False
+
+    def __drop(self, buffer):
+        patch_ids = [patch_id for patch_id, _, _, _ in buffer]
+        print('dropping {count} results that could not be written: {patch_ids}'.format(count=len(buffer),
+                                                                                      patch_ids=patch_ids))
+        try:
+            self.leases.release(patch_ids)
+        except Exception:
+            # the leases expire eventually
+            db.session.rollback()
+            traceback.print_exc()
@@ -0,0 +1,192 @@
+# coding=utf-8
+
+import os
+import re
+from typing import Callable, Iterable, Optional
+from app.utils.Replacement import Replacement
+from .PatchApplier import PatchApplier
+
+
+class Schemata:
+    """Instruments a source file with all its mutants ("mutant schemata"), so the file is compiled only once.
+
+    Each line with mutants is replaced by a switch on the id of the mutant to activate, which is read from the
+    environment variable MUTATE_CPP_ID at runtime:
+
+        if (mutate_cpp_id() == 12) { a - b; } else if (mutate_cpp_id() == 13) { a * b; } else { a + b; }
+
+    The generated helper that reads the variable is valid C and C++. The switch is written on a single line, and a
+    #line directive follows the helper, so compiler messages refer to the lines of the original file. Only lines that
+    are complete statements can be guarded this way; mutants on other lines (declarations, control structures, ...)
+    and mutants that break the build of the instrumented file are not part of the schemata and must be executed by
+    applying their patch."""
+
+    ENVIRONMENT_VARIABLE = 'MUTATE_CPP_ID'
+
+    # C does not allow static variables with a non-constant initializer, so the id is read on the first call
+    HELPER = ('#ifndef MUTATE_CPP_SCHEMATA\n'
+              '#define MUTATE_CPP_SCHEMATA\n'
+              '#include <stdlib.h>\n'
+              'static long mutate_cpp_id(void) { '
+              'static int known = 0; static long id = 0L; '
+              'if (!known) { const char* value = getenv("' + ENVIRONMENT_VARIABLE + '"); '
+              'id = value ? atol(value) : 0L; known = 1; } '
+              'return id; }\n'
+              '#endif\n'
+              '#line 1\n')
+
+    # number of builds after which mutants that break the instrumented build are no longer excluded one by one
+    MAX_ATTEMPTS = 3
+
+    __statement_keywords = ('return', 'throw', 'break', 'continue', 'delete')
+    __control_keywords = ('if', 'else', 'for', 'while', 'do', 'switch', 'case', 'default', 'goto', 'try', 'catch',
+                          'public', 'private', 'protected', 'template', 'typedef', 'using', 'namespace', 'static',
+                          'const', 'constexpr', 'extern', 'friend', 'virtual', 'struct', 'class', 'union', 'enum')
+    __declaration = re.compile(r'^[\w:<>,*&\s]*?(\w|>|\*|&)\s+[*&]*\w+\s*(=|\(|\{|\[|;)')
+    __error = re.compile(r'^(?P<filename>[^\s:(]+)(:(?P<line>\d+):(\d+:)?|\((?P<msline>\d+)(,\d+)?\)\s*:)'
+                         r'\s*(fatal )?error', re.MULTILINE)
+
+    def __init__(self, file_path, mutants: Iterable):
+        self.file_path = str(file_path)
+        self.mutants = list(mutants)
+        self.patch_ids = set()  # type: set[int]
+        self.excluded = set()  # type: set[int]
+        self.failed = False
+        self.__original = None  # type: Optional[bytes]
+
+    @property
+    def instrumented(self) -> bool:
+        return self.__original is not None
+
+    def build(self, run_build: Callable) -> Optional[object]:
+        """instrument the file (unless it is instrumented already) and build it with the given function, which returns
+        a run record; mutants that break the build are excluded and the build is repeated; return the successful run
+        or None if the build failed"""
+        for _ in range(Schemata.MAX_ATTEMPTS):
+            if not self.instrumented:
+                self.instrument()
+                if not self.patch_ids:
+                    break
+
+            run = run_build()
+            if run.success:
+                return run
+
+            # exclude the mutants on the lines the compiler complains about
+            failing = self.__failing_patch_ids(run.output)
+            print('schemata build failed for', self.file_path, '- excluding', sorted(failing))
+            if not failing:
+                break
+            self.excluded |= failing
+            self.revert()
+
+        self.revert()
+        self.failed = True
+        return None
+
+    def instrument(self):
+        """write the instrumented file; patch_ids contains the ids of all mutants in the schemata"""
+        self.revert()
+
+        with open(self.file_path, 'rb') as f:
+            original = f.read()
+
+        instrumented = self.__instrument_content(original)
+        if instrumented is not None:
+            self.__original = original
+            PatchApplier.write_atomically(self.file_path, instrumented)
+
+    def revert(self):
+        if self.__original is not None:
+            PatchApplier.write_atomically(self.file_path, self.__original)
+            self.__original = None
+        self.patch_ids = set()
+
+    @staticmethod
+    def environment(patch_id: int) -> dict:
+        return dict(os.environ, **{Schemata.ENVIRONMENT_VARIABLE: str(patch_id)})
+
+    @staticmethod
+    def expressible(line: str) -> bool:
+        """whether a line is a complete statement that can be wrapped in a block"""
+        stripped = line.strip()
+        if not stripped.endswith(';'):
+            return False
+
+        first_word = re.match(r'\w*', stripped).group(0)
+        if first_word in Schemata.__control_keywords:
+            return False
+
+        # the block would end the scope of declared variables
+        if first_word not in Schemata.__statement_keywords and Schemata.__declaration.match(stripped):
+            return False
+
+        # the statement must not start or end a block or span several lines
+        return all(stripped.count(opening) == stripped.count(closing)
+                   for opening, closing in ['()', '[]', '{}']) and stripped.count('"') % 2 == 0
+
+    def __instrument_content(self, content: bytes) -> Optional[bytes]:
+        try:
+            text = content.decode('utf-8')
+        except UnicodeDecodeError:
+            return None
+
+        lines = text.splitlines(keepends=True)
+
+        # a line preceded by a line continuation belongs to a macro definition
+        mutants_by_line = {}
+        for mutant in self.mutants:
+            index = mutant.line - 1
+            if mutant.id not in self.excluded and 0 <= index < len(lines) and \
+                    not (index > 0 and lines[index - 1].rstrip('\r\n').endswith('\\')):
+                mutants_by_line.setdefault(index, []).append(mutant)
+
+        for index, mutants in mutants_by_line.items():
+            line_raw = lines[index]
+            line_content = line_raw.rstrip('\r\n')
+            line_ending = line_raw[len(line_content):]
+
+            # SourceFile computes the columns on the line without trailing whitespace
+            old_line = line_content.rstrip()
+            if not Schemata.expressible(old_line):
+                continue
+
+            branches = []
+            for mutant in mutants:
+                replacement = Replacement(start_col=mutant.column_start, end_col=mutant.column_end,
+                                          old_val=mutant.code_original, new_val=mutant.code_replacement)
+                if replacement.new_val is None:
+                    # the mutant deletes the line
+                    if old_line != replacement.old_val:
+                        continue
+                    new_line = ''
+                else:
+                    if old_line[replacement.start_col:replacement.end_col] != replacement.old_val:
+                        continue
+                    new_line = replacement.apply(old_line).strip()
+                    if not Schemata.expressible(new_line):
+                        continue
+
+                branches.append('if (mutate_cpp_id() == {id}) {{ {line} }}'.format(id=mutant.id, line=new_line))
+                self.patch_ids.add(mutant.id)
+
+            if branches:
+                indentation = old_line[:len(old_line) - len(old_line.lstrip())]
+                lines[index] = '{indentation}{branches} else {{ {line} }}{line_ending}'.format(
+                    indentation=indentation, branches=' else '.join(branches), line=old_line.strip(),
+                    line_ending=line_ending)
+
+        if not self.patch_ids:
+            return None
+
+        return (Schemata.HELPER + ''.join(lines)).encode('utf-8')
+
+    def __failing_patch_ids(self, output: str) -> set[int]:
+        filename = os.path.basename(self.file_path)
+        failing_lines = set()
+        for match in Schemata.__error.finditer(output or ''):
+            if os.path.basename(match.group('filename')) == filename:
+                failing_lines.add(int(match.group('line') or match.group('msline')))
+
+        return {mutant.id for mutant in self.mutants
+                if mutant.line in failing_lines and mutant.id in self.patch_ids}
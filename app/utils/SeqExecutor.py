@@ -1,17 +1,31 @@
 # coding=utf-8
 
 from threading import Thread
+from typing import Optional
 from app.models import Patch, Project, File
-import tempfile
-import os
-from app import db
+from .ArtifactHasher import ArtifactHasher
+from .Calibration import Calibration
+from .Coverage import Coverage
 from .Executor import Executor
+from .PatchApplier import PatchApplier
+from .ResultWriter import ResultWriter
+from .Schemata import Schemata
+from .TestReport import TestReport
 
 
 class SeqExecutor(Executor):
     def __init__(self, app):
         super().__init__(app)
         self.__current_patch = None
+        self.__writer = None  # type: Optional[ResultWriter]
+        # the instrumented file of the schemata mode, and whether the build outputs match the working directory
+        self.__schemata = None  # type: Optional[Schemata]
+        self.__built = False
+        # artifact hashes of the unmutated projects, and the verdicts of evaluated patches by artifact hash
+        self.__baselines = {}  # type: dict[int, str]
+        self.__verdicts = {}  # type: dict[int, dict[str, tuple[int, str]]]
+        # adaptive timeouts of the projects; updated with every claimed batch
+        self.__timeouts = {}  # type: dict[int, dict[str, float]]
 
     def start(self):
         if self.__current_patch is None:
@@ -24,69 +38,238 @@ class SeqExecutor(Executor):
 
     def main(self):
         with self.app.app_context():
-            while self.running:
-                for patch in Patch.query.filter(Patch.state == 'incomplete').all():
-                    if self.running:
-                        self.workflow(patch)
+            self.__writer = ResultWriter(self.app, self.leases)
+            self.__writer.start()
+            self.__baselines = {}
+            self.__verdicts = {}
+
+            try:
+                while self.running:
+                    patches = self.leases.claim(self.claim_batch_size)
+                    if not patches:
+                        break
+
+                    # noinspection PyUnresolvedReferences
+                    self.__timeouts = {project.id: Calibration.timeouts(project.id)
+                                       for project in {patch.project for patch in patches} if project.adaptive_timeouts}
+
+                    unprocessed = [patch.id for patch in patches]
+                    # the leases are renewed while a patch runs, also if it takes longer than the lease duration
+                    try:
+                        with self.leases.keep_alive(lambda: list(unprocessed)):
+                            for patch in patches:
+                                if not self.running:
+                                    break
+                                if self.workflow(patch):
+                                    unprocessed.remove(patch.id)
+                    finally:
+                        # return patches that were skipped or could not be processed
+                        self.leases.release(unprocessed)
+            finally:
+                # also on errors, write the results so far and leave the working directory as it was
+                self.__writer.close()
+                if self.__schemata is not None:
+                    self.__schemata.revert()
+                    self.__schemata = None
                 self.stop()
 
     def is_parallel(self):
         return False
 
-    def workflow(self, patch: Patch):
+    def workflow(self, patch: Patch) -> bool:
         assert self.__current_patch is None, 'no auto-concurrency!'
 
         file: File = File.query.get(patch.file_id)
 
         if file is not None:
             self.__current_patch = patch
+            run_records = []
+
+            # mutants on lines no test executes survive without being built
+            tests = Coverage.tests(Coverage.load(file.coverage), patch.line)
+            if tests == []:
+                run_records.append(Coverage.uncovered_run(patch.id, patch.project_id, patch.line))
+                self.__writer.add(patch.id, 'survived', run_records)
+                self.__current_patch = None
+                return True
+
+            attributes = {}
+
+            # schemata mode: the file is built once with all its mutants, and the mutant is selected at runtime
+            if self.__prepare_schemata(patch, file, run_records):
+                environment = Schemata.environment(patch.id)
+                success = (
+                    self.__apply_command(patch, 'quickcheck_command', run_records, tests, environment) and
+                    self.__apply_tests(patch, file, run_records, tests, attributes, environment)
+                )
+
+                # the clean command may remove the build outputs, so the schemata are built again for the next mutant
+                # noinspection PyUnresolvedReferences
+                if patch.project.clean_command:
+                    self.__apply_command(patch, 'clean_command', run_records, tests, environment)
+                    self.__built = False
+
+                self.__writer.add(patch.id, 'survived' if success else 'killed', run_records, attributes)
+
+                self.__current_patch = None
+                return True
+
+            # the artifacts of the mutant are compared to those of the unmutated project
+            # noinspection PyUnresolvedReferences
+            project: Project = patch.project
+            if project.artifact_patterns and project.id not in self.__baselines:
+                self.__baselines[project.id] = self.__hash_baseline(patch)
+                self.__verdicts[project.id] = ArtifactHasher.verdicts(project.id)
+
+            # step 1: apply patch
+            applier = PatchApplier(patch, file.filename)
+            applier.apply()
+
+            try:
+                # step 2: command pipeline; tests are skipped if the artifacts show an equivalent or duplicate mutant
+                success = self.__apply_command(patch, 'build_command', run_records, tests)
+                verdict = self.__artifact_verdict(patch, run_records, attributes) if success else None
+                if verdict is not None:
+                    success = verdict == 'survived'
+                else:
+                    success = (success and
+                               self.__apply_command(patch, 'quickcheck_command', run_records, tests) and
+                               self.__apply_tests(patch, file, run_records, tests, attributes))
+
+                    if 'artifact_hash' in attributes:
+                        self.__verdicts[project.id][attributes['artifact_hash']] = (patch.id, 'survived' if success
+                                                                                    else 'killed')
+
+                self.__apply_command(patch, 'clean_command', run_records, tests)
+
+                self.__writer.add(patch.id, 'survived' if success else 'killed', run_records, attributes)
+            finally:
+                # step 3: revert patch, also if a step raised an exception
+                applier.revert()
+                self.__built = False
+                self.__current_patch = None
+
+            return True
+
+        return False
+
+    def __apply_tests(self, patch: Patch, file: File, run_records: list[Executor._RunRecord],
+                      tests: Optional[list[str]], attributes: dict, environment: Optional[dict] = None) -> bool:
+        """run the tests that killed the most patches of the file first, and the whole test suite only if they pass"""
+        # noinspection PyUnresolvedReferences
+        project: Project = patch.project
+        report = TestReport(project.test_report) if project.test_report else None
+
+        if report is not None and Coverage.selects_tests(project.test_command):
+            priority_tests = [test for test in TestReport.killers(file.id, self.app.config.get('PRIORITY_TESTS', 3))
+                              if not tests or '' in tests or test in tests]
+            if priority_tests:
+                report.remove(project.workdir)
+                if not self.__apply_command(patch, 'test_command', run_records, priority_tests, environment):
+                    attributes['killing_tests'] = report.failed_tests(project.workdir, run_records[-1].output) or []
+                    return False
+
+        if report is not None:
+            report.remove(project.workdir)
+        if not self.__apply_command(patch, 'test_command', run_records, tests, environment):
+            if report is not None:
+                attributes['killing_tests'] = report.failed_tests(project.workdir, run_records[-1].output) or []
+            return False
+        return True
+
+    def __hash_baseline(self, patch: Patch) -> str:
+        """build the unmutated project and hash its artifacts"""
+        # noinspection PyUnresolvedReferences
+        project: Project = patch.project
+        command, timeout = Executor._get_command_and_timeout(project, 'build_command', self.__timeouts.get(project.id))
+        run = Executor._run_command(patch.id, patch.project_id, 'build_command', command, project.workdir, timeout)
+        if not run.success:
+            return ''
+        return ArtifactHasher(project.artifact_patterns).hash(project.workdir) or ''
+
+    def __artifact_verdict(self, patch: Patch, run_records: list[Executor._RunRecord],
+                           attributes: dict) -> Optional[str]:
+        """return the state of the patch if its artifacts are identical to the original or another patch"""
+        # noinspection PyUnresolvedReferences
+        project: Project = patch.project
+        if not project.artifact_patterns:
+            return None
+
+        artifact_hash = ArtifactHasher(project.artifact_patterns).hash(project.workdir)
+        if artifact_hash is None:
+            return None
+        attributes['artifact_hash'] = artifact_hash
+
+        if artifact_hash == self.__baselines[project.id]:
+            attributes['equivalence'] = 'equivalent'
+            ArtifactHasher.mark_equivalent(run_records[-1])
+            return 'killed'
 
-            # step 1: write patch to temp file
-            patchfile = tempfile.NamedTemporaryFile(delete=False, mode='w')
-            patchfile.write(patch.patch)
-            patchfile.close()
+        verdict = self.__verdicts[project.id].get(artifact_hash)
+        if verdict is not None:
+            duplicate_of, state = verdict
+            attributes.update(equivalence='duplicate', duplicate_of=duplicate_of)
+            return state
 
-            # step 2: apply patch
-            Executor._apply_patch(patchfile.name, file.filename)
+        return None
+
+    def __prepare_schemata(self, patch: Patch, file: File, run_records: list[Executor._RunRecord]) -> bool:
+        """make sure the working directory is built with the mutant schemata of the patch's file; return False if
+        the patch must be applied instead"""
+        # noinspection PyUnresolvedReferences
+        project: Project = patch.project
+        if not project.schemata:
+            return False
 
-            # step 3: command pipeline
-            success = (SeqExecutor.__apply_command(patch, 'build_command') and
-                       SeqExecutor.__apply_command(patch, 'quickcheck_command') and
-                       SeqExecutor.__apply_command(patch, 'test_command'))
+        # only one file is instrumented at a time, as the original working directory is changed
+        if self.__schemata is None or self.__schemata.file_path != file.filename:
+            if self.__schemata is not None:
+                self.__schemata.revert()
+            mutants = Patch.query.with_entities(Patch.id, Patch.line, Patch.column_start, Patch.column_end,
+                                                Patch.code_original, Patch.code_replacement).filter(
+                Patch.file_id == file.id, Patch.state.in_(['incomplete', 'running'])).all()
+            self.__schemata = Schemata(file.filename, mutants)
+            self.__built = False
 
-            SeqExecutor.__apply_command(patch, 'clean_command')
+        if self.__schemata.failed:
+            return False
 
-            if success:
-                patch.state = 'survived'
-                db.session.commit()
+        if not self.__schemata.instrumented or not self.__built:
+            command, timeout = Executor._get_command_and_timeout(project, 'build_command',
+                                                                 self.__timeouts.get(project.id))
+            run = self.__schemata.build(lambda: Executor._run_command(patch.id, patch.project_id, 'build_command',
+                                                                      command, project.workdir, timeout))
+            if run is None:
+                return False
 
-            # step 4: revert patch
-            Executor._revert_patch(patchfile.name, file.filename)
+            # the build is accounted to the patch that triggered it
+            run_records.append(run)
+            self.__built = True
 
-            # step 6: delete patch file
-            os.remove(patchfile.name)
+        if patch.id in self.__schemata.patch_ids:
+            return True
 
-            self.__current_patch = None
+        # the mutant is not part of the schemata: restore the original file to apply the patch
+        self.__schemata.revert()
+        return False
 
-    @staticmethod
-    def __apply_command(patch: Patch, step: str):
+    def __apply_command(self, patch: Patch, step: str, run_records: list[Executor._RunRecord],
+                        tests: Optional[list[str]] = None, environment: Optional[dict] = None) -> bool:
         print(patch, step)
         # noinspection PyUnresolvedReferences
         project: Project = patch.project
 
-        command, timeout = Executor._get_command_and_timeout(project, step)
+        command, timeout = Executor._get_command_and_timeout(project, step, self.__timeouts.get(project.id))
 
         # if no command is provided, return without creating a run; True means: next command must be executed
         if not command:
             return True
 
-        run = Executor._run_command(patch.id, patch.project_id, step, command, project.workdir, timeout)
+        # only execute the tests that cover the patched line
+        command = Coverage.select_tests(command, tests)
 
-        db.session.add(run.model())
-
-        if not run.success:
-            patch.state = 'killed'
+        run = Executor._run_command(patch.id, patch.project_id, step, command, project.workdir, timeout, environment)
 
-        db.session.commit()
+        run_records.append(run)
 
         return run.success
@@ -1,12 +1,17 @@
 # coding=utf-8
 
-from app import db
+from app import app, db
 import os
 from datetime import datetime
+from types import SimpleNamespace
 from typing import Optional
+from app.utils.Lexer import Lexer
 from app.utils.Mutation import get_mutators, Mutator
+from app.utils.MutationEngine import MutationEngine
 from app.utils.Replacement import Replacement
-from app.models import File, Patch
+from app.models import File, Patch, blob_store
+from app.utils.Counters import Counters
+from app.utils.Statistics import Statistics
 
 
 class SourceFile:
@@ -20,7 +25,8 @@ class SourceFile:
         self.first_line = first_line
         self.last_line = last_line
 
-        if self.last_line == -1:
+        # the last line is included; -1 (or a number past the end) stands for the last line of the file
+        if self.last_line == -1 or self.last_line > len(self.full_content):
             self.last_line = len(self.full_content)
 
         # read the relevant content
@@ -30,65 +36,90 @@ class SourceFile:
         if mutators is None:
             mutators = get_mutators()
 
-        for line_number, line_raw in self.__get_lines():
-            for mutator_name, mutator in mutators.items():
-                for mutation in mutator.find_mutations(line_raw):
-                    patch_text = self.__create_patch(line_number, mutation)
-
-                    patch = Patch(kind=mutator_name,
-                                  line=line_number,
-                                  column_start=mutation.start_col,
-                                  column_end=mutation.end_col,
-                                  code_original=mutation.old_val,
-                                  code_replacement=mutation.new_val,
-                                  patch=patch_text,
-                                  state='incomplete',
-                                  confirmation='unknown',
-                                  file_id=self.file.id,
-                                  project_id=self.file.project_id)
-
-                    db.session.add(patch)
-
+        SourceFile.insert_patches(self.file.id, self.file.project_id, self.mutation_records(mutators))
         db.session.commit()
+        Statistics.invalidate(self.file.project_id)
+
+    def mutation_records(self, mutators: dict[str, Mutator]) -> list[tuple]:
+        """return the mutations of the selected lines as (kind, line, column_start, column_end, code_original,
+        code_replacement, patch)"""
+        # the lines are scanned once for all pattern-based mutators
+        engine = MutationEngine.compile(mutators)
+
+        return [(mutator_name, line_number, mutation.start_col, mutation.end_col, mutation.old_val, mutation.new_val,
+                 self.__create_patch(line_number, mutation))
+                for line_number, line_raw, code in self.__get_lines()
+                for mutator_name, mutation in engine.find_mutations(line_raw, code)]
+
+    @staticmethod
+    def mutate(filename: str, content: str, first_line: int, last_line: int,
+               mutator_ids: Optional[list[str]] = None) -> list[tuple]:
+        """return the mutation records of a file's content (see mutation_records); the database is not accessed, so
+        files can be mutated in other processes"""
+        mutators = get_mutators()
+        if mutator_ids is not None:
+            mutators = {mutator_id: mutator for mutator_id, mutator in mutators.items() if mutator_id in mutator_ids}
+
+        source_file = SourceFile(SimpleNamespace(filename=filename, content=content), first_line, last_line)
+        return source_file.mutation_records(mutators)
+
+    @staticmethod
+    def insert_patches(file_id: int, project_id: int, records: list[tuple]) -> int:
+        """insert the patches of the mutation records of a file and return their number; the caller commits"""
+        store_patches = blob_store is not None and app.config.get('BLOB_STORE_PATCHES', False)
+
+        patches = []
+        for kind, line, column_start, column_end, code_original, code_replacement, patch_text in records:
+            patch_digest = None
+            if store_patches:
+                patch_text, patch_digest = None, blob_store.put(patch_text.encode('utf-8'))
+
+            patches.append({'kind': kind,
+                            'line': line,
+                            'column_start': column_start,
+                            'column_end': column_end,
+                            'code_original': code_original,
+                            'code_replacement': code_replacement,
+                            'patch': patch_text,
+                            'patch_digest': patch_digest,
+                            'state': 'incomplete',
+                            'confirmation': 'unknown',
+                            'file_id': file_id,
+                            'project_id': project_id})
+
+        db.session.bulk_insert_mappings(Patch, patches)
+        Counters.add(project_id, {'incomplete': len(patches)})
+        return len(patches)
 
     def __get_lines(self):
-        in_comment = False
+        # comments, literals, and preprocessor directives are masked in the code lines
+        code_lines = Lexer.cached(self.file.content).code_lines
 
-        for line_number in range(self.first_line, self.last_line):
+        for line_number in range(self.first_line, self.last_line + 1):
             line_raw = self.full_content[line_number - 1]
-            line_stripped = line_raw.strip()
+            # the code line has the columns of the raw line; trailing whitespace was stripped from the raw line
+            code = code_lines[line_number - 1][:len(line_raw)]
 
-            # skip line comments and preprocessor directives
-            if line_stripped.startswith('//') or line_stripped.startswith('#'):
+            # skip lines without code, e.g., comments and preprocessor directives
+            if not Lexer.has_code(code):
                 continue
 
-            # skip empty lines or "bracket onlys"
-            if line_stripped in ['', '{', '}', '};', '});', ')']:
-                continue
+            code_stripped = code.replace(Lexer.MASK, '').strip()
 
-            # recognize the beginning of a line comment
-            if line_stripped.startswith('/*'):
-                in_comment = True
-                if line_stripped.endswith('*/'):
-                    in_comment = False
+            # skip "bracket onlys"
+            if code_stripped in ['{', '}', '};', '});', ')']:
                 continue
 
             # skip assertions
-            if line_stripped.startswith('assert(') or line_stripped.startswith('static_assert('):
+            if code_stripped.startswith('assert(') or code_stripped.startswith('static_assert('):
                 continue
 
             # skip "private" or "protected" declaration
-            if line_stripped.startswith('private:') or line_stripped.startswith('protected:'):
-                continue
-
-            # recognize the end of a line comment
-            if line_stripped.endswith('*/'):
-                in_comment = False
+            if code_stripped.startswith('private:') or code_stripped.startswith('protected:'):
                 continue
 
             # return line to mutate
-            if not in_comment:
-                yield line_number, line_raw
+            yield line_number, line_raw, code
 
     def __create_patch(self, line_number: int, replacement: Replacement) -> str:
         # get file date in the format we need to write it to the patch
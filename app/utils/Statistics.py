@@ -1,14 +1,116 @@
 # coding=utf-8
 
-from app.models import Patch, Run
-from sqlalchemy.sql import func, and_
+from app import app, db
+from app.models import File, Patch, Run
+from app.utils.Counters import Counters
+from sqlalchemy.sql import func
+from typing import Optional
 import datetime
+import threading
+import time
 
 
 class Statistics:
+    """Counts and runtimes of the patches and runs of a project (or of all projects).
+
+    The statistics are computed with one query grouped by state and confirmation of the patches and one query grouped
+    by command and log of the runs. They are cached per project until results are written, patches are claimed or
+    changed, or at most `STATISTICS_CACHE_TTL` seconds (for changes by other processes)."""
+
+    __cache = {}  # type: dict[Optional[int], tuple[float, dict]]
+    __lock = threading.Lock()
+
+    @staticmethod
+    def invalidate(project_id: Optional[int] = None):
+        """discard the cached statistics of a project (and of all projects); None discards all statistics"""
+        with Statistics.__lock:
+            if project_id is None:
+                Statistics.__cache.clear()
+            else:
+                Statistics.__cache.pop(project_id, None)
+                Statistics.__cache.pop(None, None)
+
     @staticmethod
     def run_stats(project_id=None):
-        patch_states = ['incomplete', 'killed', 'survived']
+        with Statistics.__lock:
+            timestamp, result = Statistics.__cache.get(project_id, (None, None))
+        if result is None or time.monotonic() - timestamp > app.config.get('STATISTICS_CACHE_TTL', 60):
+            timestamp = time.monotonic()
+            result = Statistics.__compute(project_id)
+            with Statistics.__lock:
+                Statistics.__cache[project_id] = (timestamp, result)
+
+        # the estimate depends on the current time
+        result = dict(result)
+        queued = result['patch']['count']['incomplete'] + result['patch']['count']['running']
+        result['eta'] = datetime.datetime.now() + datetime.timedelta(seconds=queued * result['run']['runtime']['avg']['_all_']['_all_'])
+
+        return result
+
+    @staticmethod
+    def project_summaries(project_ids: list[int]) -> dict[int, dict]:
+        """return the number of files, patches, and findings and the time of the last finding of the given projects"""
+        counters = Counters.projects()
+        files = dict(db.session.query(File.project_id, func.count(File.id)).filter(
+            File.project_id.in_(project_ids)).group_by(File.project_id))
+
+        # the last finding is the end of the last run of the latest survived patch
+        latest = db.session.query(Patch.project_id, func.max(Patch.id).label('patch_id')).filter(
+            Patch.project_id.in_(project_ids), Patch.state == 'survived').group_by(Patch.project_id).subquery()
+        last_findings = dict(db.session.query(latest.c.project_id, func.max(Run.timestamp_end)).join(
+            Run, Run.patch_id == latest.c.patch_id).group_by(latest.c.project_id))
+
+        result = {}
+        for project_id in project_ids:
+            project_counters = counters.get(project_id, {})
+            result[project_id] = {
+                'files': files.get(project_id, 0),
+                'patches': sum(project_counters.get(state, 0) for state in Counters.STATES),
+                'findings': project_counters.get('survived', 0),
+                'last_finding': last_findings.get(project_id)
+            }
+        return result
+
+    @staticmethod
+    def patch_summaries(patch_ids: list[int]) -> dict[int, dict]:
+        """return the command of the first unsuccessful run and the summed duration of the runs of the given patches"""
+        # noinspection PyPep8
+        first_failures = db.session.query(func.min(Run.id)).filter(
+            Run.patch_id.in_(patch_ids), Run.success == False).group_by(Run.patch_id)
+        killed_stages = dict(db.session.query(Run.patch_id, Run.command).filter(Run.id.in_(first_failures)))
+        runtimes = dict(db.session.query(Run.patch_id, func.sum(Run.duration)).filter(
+            Run.patch_id.in_(patch_ids)).group_by(Run.patch_id))
+
+        return {patch_id: {'killed_stage': killed_stages.get(patch_id), 'runtime': runtimes.get(patch_id)}
+                for patch_id in patch_ids}
+
+    @staticmethod
+    def equivalent_count(project_id: Optional[int] = None) -> int:
+        """return the number of killed patches whose build artifacts are identical to those of the unmutated project"""
+        query = db.session.query(func.count(Patch.id)).filter(Patch.state == 'killed',
+                                                              Patch.equivalence == 'equivalent')
+        if project_id is not None:
+            query = query.filter(Patch.project_id == project_id)
+        return query.scalar()
+
+    @staticmethod
+    def score(killed: int, survived: int, equivalent: int = 0) -> Optional[float]:
+        """return the mutation score, the killed patches in percent of the finished patches, or None if no patch is
+        finished; equivalent patches are stored as killed, but cannot be detected by any test, so they are not
+        counted"""
+        detected = killed - equivalent
+        total = detected + survived
+        return 100.0 * detected / total if total else None
+
+    @staticmethod
+    def file_patch_counts(project_id: int) -> dict[int, int]:
+        """return the number of patches of each file of a project"""
+        return dict(db.session.query(Patch.file_id, func.count(Patch.id)).filter(
+            Patch.project_id == project_id).group_by(Patch.file_id))
+
+    @staticmethod
+    def __compute(project_id=None):
+        patch_states = ['incomplete', 'running', 'killed', 'survived']
         confirmation_states = ['confirmed', 'ignored', 'unknown']
         run_commands = ['build_command', 'quickcheck_command', 'test_command']
         run_logs = ['success', 'failure', 'timeout', 'nochange']
@@ -17,19 +119,20 @@ class Statistics:
         result = {
             'patch': {
                 'count': {
-                    patch_state: 0 for patch_state in patch_states + confirmation_states + ['_all_']
-                }
+                    patch_state: 0 for patch_state in patch_states + confirmation_states + ['equivalent', '_all_']
+                },
+                'score': None
             },
             'run': {
                 'count': {
                     command: {
-                        log: None for log in run_logs + ['_all_']
+                        log: 0 for log in run_logs + ['_all_']
                     } for command in run_commands + ['_all_']
                 },
                 'runtime': {
                     aggregate: {
                         command: {
-                            log: None for log in run_logs + ['_all_']
+                            log: 0 for log in run_logs + ['_all_']
                         } for command in run_commands + ['_all_']
                     } for aggregate in ['sum', 'avg']
                 }
@@ -38,50 +141,45 @@ class Statistics:
         }
 
         #############################################################################################
-        patch_base_query = Patch.query
+        patch_query = Patch.query.with_entities(Patch.state, Patch.confirmation, Patch.equivalence,
+                                                func.count(Patch.id))
 
         if project_id is not None:
-            patch_base_query = patch_base_query.filter(Patch.project_id == project_id)
-
-        for patch_state in patch_states:
-            q = patch_base_query.filter(Patch.state == patch_state)
-            result['patch']['count'][patch_state] = q.count()
-        result['patch']['count']['_all_'] = patch_base_query.count()
-
-        for confirmation_state in confirmation_states:
-            q = patch_base_query.filter(and_(Patch.state == 'survived', Patch.confirmation == confirmation_state))
-            result['patch']['count'][confirmation_state] = q.count()
+            patch_query = patch_query.filter(Patch.project_id == project_id)
+
+        patch_counts = result['patch']['count']
+        for state, confirmation, equivalence, count in patch_query.group_by(Patch.state, Patch.confirmation,
+                                                                            Patch.equivalence):
+            if state in patch_states:
+                patch_counts[state] += count
+            if state == 'survived' and confirmation in confirmation_states:
+                patch_counts[confirmation] += count
+            if state == 'killed' and equivalence == 'equivalent':
+                patch_counts['equivalent'] += count
+            patch_counts['_all_'] += count
+        result['patch']['score'] = Statistics.score(patch_counts['killed'], patch_counts['survived'],
+                                                    patch_counts['equivalent'])
 
         #############################################################################################
-        run_base_query = Run.query
+        run_query = Run.query.with_entities(Run.command, Run.log, func.count(Run.id), func.sum(Run.duration))
 
         if project_id is not None:
-            run_base_query = run_base_query.filter(Run.project_id == project_id)
-
-        for run_command in run_commands:
-            for run_log in run_logs:
-                q = run_base_query.filter(Run.command == run_command).filter(Run.log == run_log)
-                result['run']['count'][run_command][run_log] = q.count()
-                result['run']['runtime']['sum'][run_command][run_log] = q.with_entities(func.sum(Run.duration)).scalar() or 0
-                result['run']['runtime']['avg'][run_command][run_log] = q.with_entities(func.avg(Run.duration)).scalar() or 0
-
-            q = run_base_query.filter(Run.command == run_command)
-            result['run']['count'][run_command]['_all_'] = q.count()
-            result['run']['runtime']['sum'][run_command]['_all_'] = q.with_entities(func.sum(Run.duration)).scalar() or 0
-            result['run']['runtime']['avg'][run_command]['_all_'] = q.with_entities(func.avg(Run.duration)).scalar() or 0
-
-        for run_log in run_logs:
-            q = run_base_query.filter(Run.log == run_log)
-            result['run']['count']['_all_'][run_log] = q.count()
-            result['run']['runtime']['sum']['_all_'][run_log] = q.with_entities(func.sum(Run.duration)).scalar() or 0
-            result['run']['runtime']['avg']['_all_'][run_log] = q.with_entities(func.avg(Run.duration)).scalar() or 0
-
-        result['run']['count']['_all_']['_all_'] = run_base_query.count()
-        result['run']['runtime']['sum']['_all_']['_all_'] = run_base_query.with_entities(func.sum(Run.duration)).scalar() or 0
-        result['run']['runtime']['avg']['_all_']['_all_'] = run_base_query.with_entities(func.avg(Run.duration)).scalar() or 0
-
-        #############################################################################################
-
-        result['eta'] = datetime.datetime.now() + datetime.timedelta(seconds=result['patch']['count']['incomplete'] * result['run']['runtime']['avg']['_all_']['_all_'])
+            run_query = run_query.filter(Run.project_id == project_id)
+
+        # the rows and columns '_all_' also contain commands and logs without own rows and columns
+        run_counts = result['run']['count']
+        run_sums = result['run']['runtime']['sum']
+        for command, log, count, duration in run_query.group_by(Run.command, Run.log):
+            rows = ['_all_'] + ([command] if command in run_commands else [])
+            columns = ['_all_'] + ([log] if log in run_logs else [])
+            for row in rows:
+                for column in columns:
+                    run_counts[row][column] += count
+                    run_sums[row][column] += duration or 0
+
+        for row in run_counts:
+            for column in run_counts[row]:
+                count = run_counts[row][column]
+                result['run']['runtime']['avg'][row][column] = run_sums[row][column] / count if count else 0
 
         return result
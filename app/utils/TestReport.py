@@ -0,0 +1,61 @@
+# coding=utf-8
+
+import os
+import re
+import xml.etree.ElementTree as ElementTree
+from pathlib import Path
+from typing import Optional
+from sqlalchemy.sql import func
+from app import db
+from app.models import Kill, Patch
+
+
+class TestReport:
+    """Determines which test cases failed in a run of the test command.
+
+    The report is either the path of an XML file the test command writes, relative to the working directory (JUnit XML
+    as written by most test frameworks, or Google Test's `--gtest_output=xml:...`), or `ctest` to read the summary of
+    failed tests from CTest's output. Test cases are named `classname.name`, which matches Google Test filters."""
+
+    # e.g. "  2 - parser_test (Failed)" in the summary of CTest
+    __ctest_failed = re.compile(r'^\s*\d+\s+-\s+(?P<name>.+?)\s+\([^)]*\)\s*$', re.MULTILINE)
+
+    def __init__(self, report: str):
+        self.report = report
+
+    def remove(self, workdir):
+        """remove the report of a previous run so it is not mistaken for the report of the next run"""
+        if self.report != 'ctest':
+            try:
+                os.remove(Path(workdir) / self.report)
+            except FileNotFoundError:
+                pass
+
+    def failed_tests(self, workdir, output: Optional[str]) -> Optional[list[str]]:
+        """return the names of the failed test cases, or None if the report is missing or cannot be read"""
+        if self.report == 'ctest':
+            if not output or 'tests passed' not in output:
+                return None
+            _, _, summary = output.partition('The following tests FAILED:')
+            return [match.group('name') for match in TestReport.__ctest_failed.finditer(summary)]
+
+        try:
+            root = ElementTree.parse(Path(workdir) / self.report).getroot()
+        except (OSError, ElementTree.ParseError):
+            return None
+
+        failed = []
+        for testcase in root.iter('testcase'):
+            if any(child.tag in ('failure', 'error') for child in testcase):
+                classname = testcase.get('classname')
+                name = testcase.get('name', '')
+                failed.append('{classname}.{name}'.format(classname=classname, name=name) if classname else name)
+        return failed
+
+    @staticmethod
+    def killers(file_id: int, limit: int) -> list[str]:
+        """return the tests that killed the most patches of a file"""
+        if limit <= 0:
+            return []
+        return [test for test, in db.session.query(Kill.test).join(Patch, Kill.patch_id == Patch.id).filter(
+            Patch.file_id == file_id).group_by(Kill.test).order_by(func.count(Kill.id).desc(), Kill.test).limit(limit)]
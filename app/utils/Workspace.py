@@ -0,0 +1,218 @@
+# coding=utf-8
+
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Iterable, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+# ioctl request to clone a file on Linux (Btrfs, XFS, ...)
+_FICLONE = 0x40049409
+
+
+class Workspace:
+    """A private copy of a project's working directory in which a worker thread builds and tests patches.
+
+    The copy is provisioned with one of the following strategies:
+
+    - copytree: copy every file (default)
+    - reflink: clone every file copy-on-write where the file system supports it, and copy it otherwise
+    - hardlink: hard link the given source files and copy all other files; the source files are only broken out
+      into private copies when they are mutated, while build outputs, which compilers and linkers may rewrite in
+      place, are never shared
+    - sync: keep one persistent workspace per project and worker slot, and only copy files whose size or
+      modification time changed since the last synchronization; a slot is held with a lock file in the root, so
+      executors and workers of different processes never share a workspace
+    """
+
+    STRATEGIES = ['copytree', 'reflink', 'hardlink', 'sync']
+
+    __slots_lock = threading.Lock()
+    __slots_taken = set()  # type: set[int]
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = Path(root or tempfile.gettempdir())
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.__temp_path = Path(tempfile.mkdtemp(prefix='mutate_cpp', dir=self.root))
+        self.__slot = None  # type: Optional[int]
+        self.__slot_lock = None  # type: Optional[int]
+        self.path = self.__temp_path
+        self.project_id = None  # type: Optional[int]
+
+    def __del__(self):
+        shutil.rmtree(self.__temp_path, ignore_errors=True)
+        if self.__slot is not None:
+            with Workspace.__slots_lock:
+                Workspace.__slots_taken.discard(self.__slot)
+                if self.__slot_lock is not None and self.__slot_lock >= 0:
+                    # closing the file releases the lock
+                    os.close(self.__slot_lock)
+                    self.__slot_lock = None
+
+    def provision(self, project_id: int, workdir: str, strategy: Optional[str] = None,
+                  source_files: Optional[Iterable[str]] = None):
+        """make the workspace a copy of the given working directory; source_files are the files that the hardlink
+        strategy may link"""
+        strategy = strategy or 'copytree'
+
+        if strategy == 'sync':
+            self.path = self.root / 'mutate_cpp_project_{project_id}'.format(project_id=project_id) / \
+                'worker_{slot}'.format(slot=self.__acquire_slot())
+            Workspace.sync_tree(Path(workdir), self.path)
+        else:
+            self.path = self.__temp_path
+            shutil.rmtree(self.path)
+            Workspace.copy_tree(Path(workdir), self.path, strategy, source_files)
+
+        self.project_id = project_id
+
+    @staticmethod
+    def prepare_file(file_path: Path):
+        """make sure a file can be mutated without affecting the original working directory"""
+        if os.stat(file_path).st_nlink > 1:
+            temp_path = file_path.with_name('.' + file_path.name + '.mutate_cpp')
+            shutil.copy2(file_path, temp_path)
+            os.replace(temp_path, file_path)
+
+    @staticmethod
+    def copy_tree(source: Path, target: Path, strategy: str, source_files: Optional[Iterable[str]] = None):
+        if strategy == 'reflink' and Workspace.__supports_reflink(source, target.parent):
+            copy_function = Workspace.__copy_reflink
+        elif strategy == 'hardlink':
+            linked = {os.path.abspath(path) for path in source_files or []}
+
+            def copy_function(source_path, target_path):
+                if os.path.abspath(source_path) in linked:
+                    Workspace.__copy_hardlink(source_path, target_path)
+                else:
+                    shutil.copy2(source_path, target_path)
+        else:
+            copy_function = shutil.copy2
+
+        shutil.copytree(source, target, symlinks=True, copy_function=copy_function)
+
+    @staticmethod
+    def sync_tree(source: Path, target: Path):
+        """update target to mirror source, copying only files whose size or modification time differ"""
+        if target.is_symlink() or (target.exists() and not target.is_dir()):
+            target.unlink()
+        target.mkdir(parents=True, exist_ok=True)
+
+        with os.scandir(source) as it:
+            entries = {entry.name: entry for entry in it}
+
+        # remove everything that no longer exists in the source
+        with os.scandir(target) as it:
+            for entry in it:
+                if entry.name not in entries:
+                    Workspace.__remove(Path(entry.path), entry)
+
+        for name, entry in entries.items():
+            target_path = target / name
+
+            if entry.is_symlink():
+                link = os.readlink(entry.path)
+                if not target_path.is_symlink() or os.readlink(target_path) != link:
+                    if target_path.exists() or target_path.is_symlink():
+                        Workspace.__remove(target_path)
+                    os.symlink(link, target_path)
+            elif entry.is_dir():
+                Workspace.sync_tree(Path(entry.path), target_path)
+            else:
+                source_stat = entry.stat()
+                try:
+                    target_stat = os.stat(target_path, follow_symlinks=False)
+                    unchanged = (target_stat.st_size == source_stat.st_size and
+                                 target_stat.st_mtime_ns == source_stat.st_mtime_ns and
+                                 os.path.isfile(target_path) and not os.path.islink(target_path))
+                except FileNotFoundError:
+                    unchanged = False
+
+                if not unchanged:
+                    if target_path.exists() or target_path.is_symlink():
+                        Workspace.__remove(target_path)
+                    shutil.copy2(entry.path, target_path)
+
+    def __acquire_slot(self) -> str:
+        if self.__slot is None:
+            with Workspace.__slots_lock:
+                slot = 0
+                while True:
+                    if slot not in Workspace.__slots_taken:
+                        self.__slot_lock = self.__lock_slot(slot)
+                        if self.__slot_lock is not None:
+                            break
+                    slot += 1
+                Workspace.__slots_taken.add(slot)
+                self.__slot = slot
+
+        if fcntl is None:
+            # without file locks, slots are only unique within this process
+            return '{pid}_{slot}'.format(pid=os.getpid(), slot=self.__slot)
+        return str(self.__slot)
+
+    def __lock_slot(self, slot: int) -> Optional[int]:
+        """return the descriptor of the slot's lock file if no other process holds the slot, and None otherwise; -1
+        if file locks are not supported"""
+        if fcntl is None:
+            return -1
+
+        fd = os.open(self.root / 'mutate_cpp_slot_{slot}.lock'.format(slot=slot), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+        return fd
+
+    @staticmethod
+    def __remove(path: Path, entry: Optional[os.DirEntry] = None):
+        is_dir = entry.is_dir(follow_symlinks=False) if entry is not None else \
+            (path.is_dir() and not path.is_symlink())
+        if is_dir:
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+
+    @staticmethod
+    def __supports_reflink(source: Path, target_directory: Path) -> bool:
+        if fcntl is None:
+            return False
+
+        probe_source = next((path for path in source.rglob('*') if path.is_file() and not path.is_symlink()), None)
+        if probe_source is None:
+            return False
+
+        fd, probe_target = tempfile.mkstemp(prefix='.mutate_cpp_reflink', dir=target_directory)
+        try:
+            with open(probe_source, 'rb') as src:
+                fcntl.ioctl(fd, _FICLONE, src.fileno())
+            return True
+        except OSError:
+            return False
+        finally:
+            os.close(fd)
+            os.remove(probe_target)
+
+    @staticmethod
+    def __copy_reflink(source, target):
+        try:
+            with open(source, 'rb') as src, open(target, 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+            shutil.copystat(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+
+    @staticmethod
+    def __copy_hardlink(source, target):
+        try:
+            os.link(source, target)
+        except OSError:
+            # e.g., the workspace is located on a different file system
+            shutil.copy2(source, target)
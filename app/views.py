@@ -1,27 +1,44 @@
 # coding=utf-8
 from typing import Optional
-from flask import render_template, abort, redirect, url_for, flash, request
+from flask import render_template, abort, redirect, url_for, flash, request, jsonify
 from app import app, db
 from app.forms import CreateProjectForm, CreateFileForm, SetConfirmationForm
-from app.models import Project, File, Patch, Run
+from app.models import Project, File, Patch, Run, blob_store
 from app.utils.SourceFile import SourceFile
 from app.utils.Mutation import get_mutators
 from app.utils.Statistics import Statistics
+from app.utils.Counters import Counters
+from app.utils.KeysetPage import KeysetPage
+from app.utils.PatchListings import PatchListings
 import os
 from app.utils.Executor import Executor
+from app.utils.ExecutorClient import ExecutorClient
+from app.utils.ExecutorDaemon import ExecutorDaemon
 from app.utils.ParExecutor import ParExecutor
-from app.utils.SeqExecutor import SeqExecutor
+from app.utils.Leases import Leases
+from app.utils.ResultWriter import ResultWriter
+from app.utils.OutputRetention import OutputRetention
+from app.utils.Calibration import Calibration
+import datetime
 
-executor: Optional[Executor] = None
+executor: Optional[ExecutorClient] = None
+# retention policy for the outputs of remote workers
+worker_retention = OutputRetention(app)
+
+
+def collect_blobs():
+    # the outputs and patch texts of deleted runs and patches are no longer referenced
+    if blob_store is not None:
+        blob_store.collect_garbage()
 
 
 @app.before_first_request
 def init_executor():
     global executor
-    if app.config['PARALLEL_WORKFLOW']:
-        executor = ParExecutor(app)
-    else:
-        executor = SeqExecutor(app)
+    # in daemon mode, the executor runs in the process of cli/executor_daemon.py
+    if app.config.get('EXECUTOR_MODE', 'embedded') == 'embedded':
+        ExecutorDaemon(app).start()
+    executor = ExecutorClient(app)
 
 
 ##############################################################################
@@ -73,25 +90,35 @@ def route_v2_root():
 @app.route('/projects')
 def route_v2_projects():
     projects = Project.query.all()
-    return render_template('v2_projects.html', projects=projects)
+    return render_template('v2_projects.html', projects=projects,
+                           summaries=Statistics.project_summaries([project.id for project in projects]))
 
 
 @app.route('/queue')
 def route_v2_queue():
     # retrieve parameters
-    page = int(request.args.get('page', 1))
-
-    # initial patch query
-    patches = Patch.query.filter(Patch.state == 'incomplete')
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
 
     # add pagination
-    patches = patches.paginate(page, app.config['ITEMS_PER_PAGE'], False)
+    patches = KeysetPage(PatchListings.queue(), Patch.id, app.config['ITEMS_PER_PAGE'], after, before)
 
-    return render_template('v2_queue.html', patches=patches)
+    return render_template('v2_queue.html', patches=patches, counters=Counters.totals())
 
 
 @app.route('/queue/start')
 def route_v2_queue_start():
+    # warn about projects whose unmutated pipeline does not reliably succeed
+    for project_id, in db.session.query(Patch.project_id).filter(Patch.state.in_(['incomplete', 'running'])).distinct():
+        flaky_stages = Calibration.flaky(project_id)
+        if flaky_stages:
+            flash('The calibration of project {name} failed in some runs of {stages}; results may be unreliable.'
+                  .format(name=Project.query.get(project_id).name, stages=', '.join(flaky_stages)), category='warning')
+
+    if app.config.get('EXECUTOR_MODE', 'embedded') == 'daemon' and not executor.alive:
+        flash('The executor daemon is not running; the queue starts once cli/executor_daemon.py is started.',
+              category='warning')
+
     executor.start()
     return redirect(url_for('route_v2_queue'))
 
@@ -114,7 +141,12 @@ def route_v2_projects_create():
                           quickcheck_timeout=form.quickcheck_timeout.data,
                           test_command=form.test_command.data,
                           test_timeout=form.test_timeout.data,
-                          clean_command=form.clean_command.data)
+                          clean_command=form.clean_command.data,
+                          workspace_strategy=form.workspace_strategy.data,
+                          schemata=form.schemata.data,
+                          artifact_patterns=form.artifact_patterns.data,
+                          test_report=form.test_report.data,
+                          adaptive_timeouts=form.adaptive_timeouts.data)
         db.session.add(project)
         db.session.commit()
         return redirect(url_for('route_v2_project_project_id', project_id=project.id))
@@ -134,7 +166,9 @@ def route_v2_project_project_id(project_id):
     if project is None:
         abort(404)
     else:
-        return render_template('v2_project.html', project=project)
+        return render_template('v2_project.html', project=project, calibration=Calibration.summary(project.id),
+                               flaky_stages=Calibration.flaky(project.id),
+                               file_patch_counts=Statistics.file_patch_counts(project.id))
 
 
 @app.route('/projects/<int:project_id>/delete')
@@ -145,6 +179,8 @@ def route_v2_project_project_id_delete(project_id):
     else:
         db.session.delete(project)
         db.session.commit()
+        Statistics.invalidate(project.id)
+        collect_blobs()
 
         flash('Project {name} successfully delete.'.format(name=project.name),
               category='message')
@@ -212,7 +248,10 @@ def route_v2_project_project_id_files_file_id_delete(project_id, file_id):
         abort(404)
 
     db.session.delete(file)
+    Counters.rebuild(project.id)
     db.session.commit()
+    Statistics.invalidate(project.id)
+    collect_blobs()
 
     flash('File <samp>{filename}</samp> successfully removed from project.'.format(filename=file.filename),
           category='message')
@@ -228,24 +267,17 @@ def route_v2_project_project_id_patches(project_id):
         abort(404)
 
     # retrieve parameters
-    page = int(request.args.get('page', 1))
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
     patch_state = request.args.get('patch_state')
     confirmation_state = request.args.get('confirmation_state')
     run_state = request.args.get('run_state')
 
-    # initial patch query
-    patches = Patch.query.filter(Patch.project_id == project_id)
-
-    # filter patch state and confirmation state
-    if patch_state:
-        patches = patches.filter(Patch.state == patch_state)
-    if confirmation_state:
-        patches = patches.filter(Patch.confirmation == confirmation_state)
-    if run_state:
-        patches = patches.join(Run).filter(Run.log == run_state)
+    # filter patch state, confirmation state, and run state
+    patches = PatchListings.project(project_id, patch_state, confirmation_state, run_state)
 
     # add pagination
-    patches = patches.paginate(page, app.config['ITEMS_PER_PAGE'], False)
+    patches = KeysetPage(patches, Patch.id, app.config['ITEMS_PER_PAGE'], after, before)
 
     return render_template('v2_patches.html', project=project, patches=patches, filter_patch_state=patch_state,
                            filter_confirmation_state=confirmation_state, filter_run_state=run_state)
@@ -275,15 +307,11 @@ def route_v2_project_project_id_patches_patch_id(project_id, patch_id):
     else:
         patch.confirmation = form.confirmation.data
         db.session.commit()
+        Statistics.invalidate(project.id)
 
     # retrieve previous and next patch id
-    filtered_patches = Patch.query
-    if filter_patch_state:
-        filtered_patches = filtered_patches.where(Patch.state == filter_patch_state)
-    if filter_confirmation_state:
-        filtered_patches = filtered_patches.where(Patch.confirmation == filter_confirmation_state)
-    if filter_run_state:
-        filtered_patches = filtered_patches.join(Run).filter(Run.log == filter_run_state)
+    filtered_patches = PatchListings.project(project.id, filter_patch_state, filter_confirmation_state,
+                                             filter_run_state)
 
     previous_patch = filtered_patches.where(Patch.id < patch.id).order_by(Patch.id.desc()).first()
 
@@ -354,17 +382,62 @@ def route_v2_mutators():
 @app.route('/mutators/<mutator_id>')
 def route_v2_mutators_mutator_id(mutator_id):
     mutator = get_mutators().get(mutator_id)
+    if mutator is None:
+        abort(404)
 
     # retrieve parameters
-    page = int(request.args.get('page', 1))
-
-    # initial query
-    patches = Patch.query.filter(Patch.kind == mutator_id)
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
 
     # add pagination
-    patches = patches.paginate(page, app.config['ITEMS_PER_PAGE'], False)
+    patches = KeysetPage(PatchListings.mutator(mutator_id), Patch.id, app.config['ITEMS_PER_PAGE'], after, before)
+
+    return render_template('v2_mutator.html', mutator=mutator, patches=patches,
+                           summaries=Statistics.patch_summaries([patch.id for patch in patches.items]))
+
+
+##############################################################################
+# Worker API
+##############################################################################
+
+def worker_leases(data) -> Leases:
+    if not data or not data.get('worker'):
+        abort(400)
+    return Leases(data['worker'], datetime.timedelta(seconds=app.config.get('LEASE_DURATION', 900)))
+
+
+@app.route('/api/workers/lease', methods=['POST'])
+def route_api_workers_lease():
+    data = request.get_json()
+    leases = worker_leases(data)
+    patches = leases.claim(int(data.get('count', app.config.get('CLAIM_BATCH_SIZE', 16))))
+    return jsonify(lease_duration=leases.duration.total_seconds(),
+                   **ParExecutor.encode_patches(patches, app.config.get('PRIORITY_TESTS', 3)))
+
+
+@app.route('/api/workers/heartbeat', methods=['POST'])
+def route_api_workers_heartbeat():
+    data = request.get_json()
+    leases = worker_leases(data)
+    leases.renew(data.get('patches', []))
+    return jsonify(leased=leases.holds(data.get('patches', [])))
+
+
+@app.route('/api/workers/results', methods=['POST'])
+def route_api_workers_results():
+    data = request.get_json()
+    leases = worker_leases(data)
+
+    # results of patches whose lease expired in the meantime are dropped, as the patches may be re-executed elsewhere
+    accepted = ResultWriter.write([(result['patch_id'], result['state'],
+                                    [Executor._RunRecord.from_dict(run) for run in result['runs']],
+                                    result.get('attributes'))
+                                   for result in data.get('results', [])], worker_retention, leases.owner)
+    return jsonify(accepted=accepted)
 
-    if mutator is None:
-        abort(404)
 
-    return render_template('v2_mutator.html', mutator=mutator, patches=patches)
+@app.route('/api/workers/release', methods=['POST'])
+def route_api_workers_release():
+    data = request.get_json()
+    worker_leases(data).release(data.get('patches', []))
+    return jsonify(released=True)
@@ -0,0 +1,13 @@
+# coding=utf-8
+
+from flask_compress import Compress
+from flask_humanize import Humanize
+from app import app
+
+# the web interface is only set up when it is served; the command-line tools just use the app and its database
+Compress(app)
+
+humanize = Humanize(app)
+
+# noinspection PyPep8
+from app import views
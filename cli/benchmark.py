@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# coding=utf-8
+# PYTHON_ARGCOMPLETE_OK
+
+import os
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+# Allow this script to be used from the parent directory
+sys.path.append(".")
+
+from app.models import Project
+from app.utils.Lexer import Lexer
+from app.utils.Mutation import get_mutators, StringLiteralFinder
+from app.utils.MutationEngine import MutationEngine
+from app.utils.Workspace import Workspace
+
+SOURCE_EXTENSIONS = ('.c', '.cc', '.cpp', '.cxx', '.h', '.hh', '.hpp', '.hxx')
+
+
+def benchmark_workspace(arguments):
+    # Verify that the project exists
+    project = Project.query.filter(Project.name == arguments.project).first()
+    if project is None:
+        print(f"Project '{arguments.project}' doesn't exist.", file=sys.stderr)
+        exit(1)
+
+    with tempfile.TemporaryDirectory(prefix='mutate_cpp_benchmark', dir=arguments.root) as root:
+        for strategy in arguments.strategies:
+            workspace = Workspace(root)
+
+            durations = []
+            for _ in range(arguments.repeat):
+                start = time.perf_counter()
+                workspace.provision(project.id, project.workdir, strategy,
+                                    [file.filename for file in project.files])
+                durations.append(time.perf_counter() - start)
+
+            # the first provisioning is cold; later ones profit from an existing workspace (only relevant for sync)
+            print(f"{strategy:10} first {durations[0]:8.3f} s, "
+                  f"following {min(durations[1:], default=durations[0]):8.3f} s")
+            del workspace
+
+    exit(0)
+
+
+def read_sources(paths: list[str]) -> list[str]:
+    # files are read as given, directories are searched for C and C++ sources
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, files in os.walk(path):
+                filenames += [os.path.join(directory, file) for file in sorted(files)
+                              if file.endswith(SOURCE_EXTENSIONS)]
+        else:
+            filenames.append(path)
+
+    sources = []
+    for filename in filenames:
+        with open(filename, errors='replace') as file:
+            sources.append(file.read())
+    return sources
+
+
+def benchmark_mutations(arguments):
+    mutators = get_mutators()
+    if arguments.mutators:
+        unknown = set(arguments.mutators) - set(mutators)
+        if unknown:
+            print(f"Unknown mutators: {', '.join(sorted(unknown))}.", file=sys.stderr)
+            exit(1)
+        mutators = {mutator_id: mutator for mutator_id, mutator in mutators.items() if mutator_id in arguments.mutators}
+
+    sources = read_sources(arguments.paths)
+    lines = [line.rstrip() for source in sources for line in source.split('\n') if line.strip()]
+    if not lines:
+        print("No lines to mutate.", file=sys.stderr)
+        exit(1)
+
+    # each mutator scans each line on its own
+    start = time.perf_counter()
+    separate = [(mutator_id, mutation) for line in lines
+                for mutator_id, mutator in mutators.items() for mutation in mutator.find_mutations(line)]
+    separate_duration = time.perf_counter() - start
+
+    # the engine scans each line once for all pattern-based mutators
+    start = time.perf_counter()
+    engine = MutationEngine.compile(mutators)
+    combined = [mutation for line in lines for mutation in engine.find_mutations(line)]
+    combined_duration = time.perf_counter() - start
+
+    # the lexer masks comments, literals, and preprocessor directives; lines without code are skipped
+    start = time.perf_counter()
+    lexed = []
+    for source in sources:
+        code_lines = Lexer(source).code_lines
+        for line, code in zip(source.split('\n'), code_lines):
+            line = line.rstrip()
+            code = code[:len(line)]
+            if Lexer.has_code(code):
+                lexed += engine.find_mutations(line, code)
+    lexed_duration = time.perf_counter() - start
+
+    for name, duration, mutations in [('separate', separate_duration, separate),
+                                      ('combined', combined_duration, combined),
+                                      ('lexed', lexed_duration, lexed)]:
+        print(f"{name:10} {duration:8.3f} s, {len(lines) / duration:10.0f} lines/s, "
+              f"{len(mutations) / duration:10.0f} mutations/s, {len(mutations)} mutations")
+    print(f"{len(lines)} lines, speedup {separate_duration / combined_duration:.2f} (combined), "
+          f"{separate_duration / lexed_duration:.2f} (lexed); "
+          f"the lexer avoids {len(combined) - len(lexed)} mutations in comments, literals, and directives")
+
+    # both must find the same mutations in the same order
+    def key(mutation):
+        mutator_id, replacement = mutation
+        return mutator_id, replacement.start_col, replacement.end_col, replacement.old_val, replacement.new_val
+
+    if list(map(key, separate)) != list(map(key, combined)):
+        print("The engine found different mutations.", file=sys.stderr)
+        exit(1)
+
+    exit(0)
+
+
+def benchmark_literals(arguments):
+    # a row of a generated string table, e.g., {"key0", "value \\"0\\""}, {"key1", ...
+    line = ', '.join(f'{{"key{index}", "value \\"{index}\\""}}' for index in range(arguments.literals))
+    string_finder = StringLiteralFinder(line)
+    spans = string_finder.string_literals
+
+    # the previous implementation scanned all spans for each position
+    def is_in_string_literal_linear(index):
+        for (string_start, string_end) in spans:
+            if string_start < index < string_end:
+                return True
+        return False
+
+    results = {}
+    durations = {}
+    for name, lookup in [('linear', is_in_string_literal_linear), ('bisect', string_finder.is_in_string_literal)]:
+        start = time.perf_counter()
+        for _ in range(arguments.repeat):
+            results[name] = [lookup(index) for index in range(len(line))]
+        durations[name] = (time.perf_counter() - start) / arguments.repeat
+
+    for name, duration in durations.items():
+        print(f"{name:10} {duration * 1000:8.3f} ms per line, {len(line) / duration:12.0f} lookups/s")
+    print(f"{len(spans)} literals, {len(line)} characters, speedup {durations['linear'] / durations['bisect']:.2f}")
+
+    if results['linear'] != results['bisect']:
+        print("The lookups differ.", file=sys.stderr)
+        exit(1)
+
+    exit(0)
+
+
+def main():
+    # Parse arguments
+    argument_parser = ArgumentParser(description="Benchmark parts of Mutate++.")
+    subparsers = argument_parser.add_subparsers(dest='benchmark', required=True)
+
+    workspace_parser = subparsers.add_parser(
+        'workspace', help="Compare the strategies to provision a workspace for a project."
+    )
+    workspace_parser.add_argument(
+        "--project", type=str, required=True,
+        help="The name of the project."
+    )
+    workspace_parser.add_argument(
+        "--strategies", type=str, nargs='+', default=Workspace.STRATEGIES, choices=Workspace.STRATEGIES,
+        help="The strategies to compare."
+    )
+    workspace_parser.add_argument(
+        "--repeat", type=int, default=3,
+        help="How often each workspace is provisioned."
+    )
+    workspace_parser.add_argument(
+        "--root", type=str, required=False,
+        help="The directory in which the workspaces are created."
+    )
+    workspace_parser.set_defaults(function=benchmark_workspace)
+
+    mutations_parser = subparsers.add_parser(
+        'mutations', help="Compare finding mutations with each mutator on its own and with the mutation engine."
+    )
+    mutations_parser.add_argument(
+        "paths", type=str, nargs='+',
+        help="The source files or directories with C and C++ sources to mutate."
+    )
+    mutations_parser.add_argument(
+        "--mutators", type=str, nargs='+', required=False,
+        help="The mutators to use; all mutators if omitted."
+    )
+    mutations_parser.set_defaults(function=benchmark_mutations)
+
+    literals_parser = subparsers.add_parser(
+        'literals', help="Compare looking up string literals by scanning all literals and by binary search."
+    )
+    literals_parser.add_argument(
+        "--literals", type=int, default=500,
+        help="The number of entries of the generated string table; each entry has two literals."
+    )
+    literals_parser.add_argument(
+        "--repeat", type=int, default=10,
+        help="How often each position of the line is looked up."
+    )
+    literals_parser.set_defaults(function=benchmark_literals)
+
+    arguments = argument_parser.parse_args()
+    arguments.function(arguments)
+
+
+if __name__ == "__main__":
+    main()
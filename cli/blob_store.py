@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# coding=utf-8
+# PYTHON_ARGCOMPLETE_OK
+
+import sys
+from argparse import ArgumentParser
+
+# Allow this script to be used from the parent directory
+sys.path.append(".")
+
+from app import app, db
+from app.models import Patch, Run, blob_store
+from app.utils.OutputCodec import OutputCodec
+
+
+def move_outputs(batch_size: int) -> int:
+    moved = 0
+    codec = OutputCodec(app.config.get('OUTPUT_CODEC', 'zlib'))
+    while True:
+        # noinspection PyPep8
+        runs = Run.query.filter(Run.output_digest == None, db.or_(Run.output_blob != None, Run.output != None)) \
+            .limit(batch_size).all()
+        if not runs:
+            return moved
+
+        for run in runs:
+            if run.output_blob is None:
+                run.output_blob, run.output_codec = codec.compress(run.output)
+            run.output_digest = blob_store.put(run.output_blob)
+            run.output_blob = None
+            run.output = None
+        db.session.commit()
+        moved += len(runs)
+
+
+def move_patches(batch_size: int) -> int:
+    moved = 0
+    while True:
+        # noinspection PyPep8
+        patches = Patch.query.filter(Patch.patch_digest == None, Patch.patch != None).limit(batch_size).all()
+        if not patches:
+            return moved
+
+        for patch in patches:
+            patch.patch_digest = blob_store.put(patch.patch.encode('utf-8'))
+            patch.patch = None
+        db.session.commit()
+        moved += len(patches)
+
+
+def main():
+    # Parse arguments
+    argument_parser = ArgumentParser(description="Manage the store of run outputs and patch texts.")
+    argument_parser.add_argument(
+        "action", choices=['move', 'gc'],
+        help="Move the outputs (and patch texts) stored in the database to the blob store, or remove unreferenced "
+             "blobs."
+    )
+    argument_parser.add_argument(
+        "--patches", action='store_true',
+        help="Move the patch texts as well."
+    )
+    argument_parser.add_argument(
+        "--batch-size", type=int, default=1000,
+        help="The number of rows moved per transaction."
+    )
+    arguments = argument_parser.parse_args()
+
+    if blob_store is None:
+        print("No blob store is configured (BLOB_STORE in app/config.py).", file=sys.stderr)
+        exit(1)
+
+    if arguments.action == 'move':
+        print(f"{move_outputs(arguments.batch_size)} outputs moved.")
+        if arguments.patches:
+            print(f"{move_patches(arguments.batch_size)} patches moved.")
+    elif arguments.action == 'gc':
+        print(f"{blob_store.collect_garbage()} blobs removed.")
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# coding=utf-8
+# PYTHON_ARGCOMPLETE_OK
+
+import sys
+from argparse import ArgumentParser
+
+# Allow this script to be used from the parent directory
+sys.path.append(".")
+
+from app import db
+from app.models import Project
+from app.utils.Calibration import Calibration
+
+
+def main():
+    # Parse arguments
+    argument_parser = ArgumentParser(description="Run the unmutated pipeline of a project to calibrate the timeouts.")
+    argument_parser.add_argument(
+        "--project", type=str, required=True,
+        help="The name of the project."
+    )
+    argument_parser.add_argument(
+        "--repeat", type=int, default=5,
+        help="How often the pipeline is executed."
+    )
+    argument_parser.add_argument(
+        "--adaptive-timeouts", action='store_true',
+        help="Use the calibrated timeouts for the project from now on."
+    )
+    arguments = argument_parser.parse_args()
+
+    # Verify that the project exists
+    project = Project.query.filter(Project.name == arguments.project).first()
+    if project is None:
+        print(f"Project '{arguments.project}' doesn't exist.", file=sys.stderr)
+        exit(1)
+
+    if arguments.repeat < 1:
+        print("The pipeline must be executed at least once.", file=sys.stderr)
+        exit(1)
+
+    Calibration(project).run(arguments.repeat)
+
+    if arguments.adaptive_timeouts:
+        project.adaptive_timeouts = True
+        db.session.commit()
+
+    for stage, summary in Calibration.summary(project.id).items():
+        print(f"{stage:20} {summary['count']} runs, {summary['failures']} failed, "
+              f"timeout {summary['timeout'] or 0:.2f} s")
+
+    flaky_stages = Calibration.flaky(project.id)
+    if flaky_stages:
+        print(f"Warning: the unmutated pipeline did not always succeed in {', '.join(flaky_stages)}.",
+              file=sys.stderr)
+        exit(3)
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# coding=utf-8
+# PYTHON_ARGCOMPLETE_OK
+
+import re
+import sys
+from argparse import ArgumentParser
+
+# Allow this script to be used from the parent directory
+sys.path.append(".")
+
+from app import app, db
+from app.models import Patch
+from app.utils.PatchListings import PatchListings
+
+
+def listings(project_id: int, kind: str) -> dict:
+    queries = {
+        'queue': PatchListings.queue(),
+        'mutator': PatchListings.mutator(kind),
+        'project': PatchListings.project(project_id),
+        'project, state': PatchListings.project(project_id, 'survived'),
+        'project, state, confirmation': PatchListings.project(project_id, 'survived', 'unknown'),
+        'project, state, run': PatchListings.project(project_id, 'killed', run_state='failure'),
+    }
+
+    # the queries of a page after a cursor and of the previous and next patch of a patch page
+    result = {}
+    for name, query in queries.items():
+        result[name + ' (next page)'] = query.filter(Patch.id > 0).order_by(Patch.id).limit(
+            app.config['ITEMS_PER_PAGE'] + 1)
+        result[name + ' (previous patch)'] = query.filter(Patch.id < 1).order_by(Patch.id.desc()).limit(1)
+    return result
+
+
+def main():
+    # Parse arguments
+    argument_parser = ArgumentParser(description="Check that the patch listings are read in the order of indexes.")
+    argument_parser.add_argument(
+        "--project-id", type=int, default=1,
+        help="The project id used in the queries."
+    )
+    argument_parser.add_argument(
+        "--kind", type=str, default='lineDeletion',
+        help="The mutator used in the queries."
+    )
+    argument_parser.add_argument(
+        "--verbose", action='store_true',
+        help="Print the query plans."
+    )
+    arguments = argument_parser.parse_args()
+
+    failures = 0
+    for name, query in listings(arguments.project_id, arguments.kind).items():
+        # the plan is made with bound parameters like when the query is executed, as SQLite may choose another
+        # index (e.g., a partial index) for literal values
+        compiled = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+        parameters = tuple(compiled.params[name] for name in compiled.positiontup)
+        plan = [row[-1] for row in db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled),
+                                                                            parameters)]
+
+        # "SCAN patch" without an index reads the whole table
+        full_scans = [step for step in plan if re.match(r'^SCAN (TABLE )?(patch|run)\b(?!.*\bINDEX\b)', step)]
+        # a page that is not read in the order of an index sorts all matching rows first, however deep it is
+        sorts = [step for step in plan if 'TEMP B-TREE' in step]
+        if full_scans:
+            failures += 1
+            print(f"{name}: full table scan", file=sys.stderr)
+        elif sorts:
+            failures += 1
+            print(f"{name}: sorts the matching rows", file=sys.stderr)
+        else:
+            print(f"{name}: ok")
+
+        if arguments.verbose or full_scans or sorts:
+            for step in plan:
+                print(f"    {step}")
+
+    exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
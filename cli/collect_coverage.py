@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# coding=utf-8
+# PYTHON_ARGCOMPLETE_OK
+
+import subprocess
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+
+# Allow this script to be used from the parent directory
+sys.path.append(".")
+
+from app import db
+from app.models import Project, File
+from app.utils.Coverage import Coverage
+from app.utils.Executor import Executor
+
+
+def reset_counters(workdir: Path, lcov_path: Path):
+    # gcov adds to the counters of previous runs, which would credit a test with the coverage of the tests before it
+    for gcda_path in workdir.rglob('*.gcda'):
+        gcda_path.unlink()
+    if lcov_path.exists():
+        lcov_path.unlink()
+
+
+def main():
+    # Parse arguments
+    argument_parser = ArgumentParser(description="Collect the line coverage of the files of a project.")
+    argument_parser.add_argument(
+        "--project", type=str, required=True,
+        help="The name of the project."
+    )
+    argument_parser.add_argument(
+        "--lcov", type=str, required=True,
+        help="The lcov tracefile to read, relative to the working directory of the project."
+    )
+    argument_parser.add_argument(
+        "--command", type=str, required=False,
+        help="A command that runs the tests and writes the tracefile; it is executed in the working directory. "
+             "The placeholder {test} is replaced by the test to run."
+    )
+    argument_parser.add_argument(
+        "--tests", type=str, nargs='+', required=False,
+        help="The names of the tests; the command is executed once per test to collect per-test coverage. Before "
+             "each run, the gcov counters (.gcda files) in the working directory and the tracefile are deleted."
+    )
+    arguments = argument_parser.parse_args()
+
+    # Verify that the project exists
+    project = Project.query.filter(Project.name == arguments.project).first()
+    if project is None:
+        print(f"Project '{arguments.project}' doesn't exist.", file=sys.stderr)
+        exit(1)
+
+    if arguments.tests and not arguments.command:
+        print("Per-test coverage requires a command.", file=sys.stderr)
+        exit(1)
+
+    coverage = Coverage()
+    lcov_path = Path(project.workdir) / arguments.lcov
+
+    for test in arguments.tests or ['']:
+        if arguments.command:
+            print(f"Collecting coverage{' of ' + test if test else ''}...")
+            if arguments.tests:
+                reset_counters(Path(project.workdir), lcov_path)
+            try:
+                Executor._execute_command_timeout(arguments.command.replace('{test}', test), cwd=project.workdir)
+            except subprocess.CalledProcessError as e:
+                # failing tests still yield coverage
+                print(f"Command returned exit code {e.returncode}.", file=sys.stderr)
+
+        if not lcov_path.exists():
+            print(f"Tracefile '{lcov_path}' doesn't exist.", file=sys.stderr)
+            exit(2)
+
+        coverage.read_lcov(lcov_path.read_text(errors='ignore'), test_name=test)
+
+    # Store the coverage of every file found in the tracefile
+    for file in File.query.filter(File.project_id == project.id).all():
+        file.coverage = coverage.file_coverage(file.filename, project.workdir)
+        if file.coverage is None:
+            print(f"File '{file.filename}' is not contained in the tracefile.")
+        else:
+            print(f"Coverage of '{Path(file.filename).name}' stored.")
+    db.session.commit()
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -47,6 +47,27 @@ def main():
         "--clean-command", type=str, required=False, default='',
         help="The clean command to use."
     )
+    argument_parser.add_argument(
+        "--workspace-strategy", type=str, required=False, default='copytree',
+        choices=['copytree', 'reflink', 'hardlink', 'sync'],
+        help="How the working directory is copied for each parallel worker."
+    )
+    argument_parser.add_argument(
+        "--schemata", action='store_true',
+        help="Compile all mutants of a file into one build and select them at runtime."
+    )
+    argument_parser.add_argument(
+        "--artifact-patterns", type=str, required=False,
+        help="Glob patterns of the build artifacts to compare to detect equivalent mutants."
+    )
+    argument_parser.add_argument(
+        "--test-report", type=str, required=False,
+        help="The XML test report written by the test command, or 'ctest' to read CTest's output."
+    )
+    argument_parser.add_argument(
+        "--adaptive-timeouts", action='store_true',
+        help="Derive the timeouts from the durations of the calibration runs and the executed patches."
+    )
     arguments = argument_parser.parse_args()
 
     # Verify that a project with the same name doesn't exist yet
@@ -63,7 +84,12 @@ def main():
         quickcheck_timeout=arguments.quickcheck_timeout,
         test_command=arguments.test_command,
         test_timeout=arguments.test_timeout,
-        clean_command=arguments.clean_command
+        clean_command=arguments.clean_command,
+        workspace_strategy=arguments.workspace_strategy,
+        schemata=arguments.schemata,
+        artifact_patterns=arguments.artifact_patterns,
+        test_report=arguments.test_report,
+        adaptive_timeouts=arguments.adaptive_timeouts
     )
     db.session.add(project)
     db.session.commit()
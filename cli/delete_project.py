@@ -9,7 +9,7 @@ from argparse import ArgumentParser
 sys.path.append(".")
 
 from app import db
-from app.models import Project
+from app.models import Project, blob_store
 
 
 def main():
@@ -31,6 +31,10 @@ def main():
     db.session.delete(project_query.first())
     db.session.commit()
 
+    # Remove the outputs and patch texts of the project from the blob store
+    if blob_store is not None:
+        blob_store.collect_garbage()
+
     print(f"Project '{arguments.project}' deleted successfully.")
     exit(0)
 
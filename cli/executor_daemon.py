@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# coding=utf-8
+# PYTHON_ARGCOMPLETE_OK
+
+import signal
+import sys
+from argparse import ArgumentParser
+
+# Allow this script to be used from the parent directory
+sys.path.append(".")
+
+from app import app
+from app.utils.ExecutorClient import ExecutorClient
+from app.utils.ExecutorDaemon import ExecutorDaemon
+
+
+def main():
+    # Parse arguments
+    argument_parser = ArgumentParser(description="Run the Mutate++ executor outside of the web app.")
+    argument_parser.add_argument(
+        "--start", action='store_true',
+        help="Start the queue right away instead of waiting for a start command."
+    )
+    arguments = argument_parser.parse_args()
+
+    if app.config.get('EXECUTOR_MODE', 'embedded') != 'daemon':
+        print("Warning: EXECUTOR_MODE is not 'daemon', so the web app runs its own executor as well.", file=sys.stderr)
+
+    daemon = ExecutorDaemon(app)
+
+    # stop gracefully: the patches in progress are finished and written
+    signal.signal(signal.SIGTERM, lambda *_: daemon.shutdown())
+    signal.signal(signal.SIGINT, lambda *_: daemon.shutdown())
+
+    if arguments.start:
+        ExecutorClient(app).start()
+
+    daemon.run()
+    exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 # coding=utf-8
 # PYTHON_ARGCOMPLETE_OK
 
+import multiprocessing
 import sys
 from argparse import ArgumentParser
 
@@ -9,7 +10,8 @@ from argparse import ArgumentParser
 sys.path.append(".")
 
 from app.models import Project, File
-from app.utils.SourceFile import SourceFile
+from app.utils.Mutation import get_mutators
+from app.utils.PatchGenerator import PatchGenerator
 
 
 def main():
@@ -19,9 +21,36 @@ def main():
         "--project", type=str, required=True,
         help="The name of the project. If not provided, all projects will be processed."
     )
-    # TODO allow selection of first/last line + which patches to generate
+    argument_parser.add_argument(
+        "--jobs", type=int, default=multiprocessing.cpu_count(),
+        help="The number of processes that mutate files in parallel."
+    )
+    argument_parser.add_argument(
+        "--first-line", type=int, default=1,
+        help="The first line of each file to mutate."
+    )
+    argument_parser.add_argument(
+        "--last-line", type=int, default=-1,
+        help="The last line of each file to mutate (inclusive); -1 for the end of the file."
+    )
+    argument_parser.add_argument(
+        "--mutators", type=str, nargs='+', choices=list(get_mutators().keys()), required=False,
+        help="The mutators to use; all mutators if omitted."
+    )
     arguments = argument_parser.parse_args()
 
+    if arguments.jobs < 1:
+        print("The number of jobs must be positive.", file=sys.stderr)
+        exit(1)
+
+    if arguments.first_line < 1:
+        print("The first line must be positive.", file=sys.stderr)
+        exit(1)
+
+    if arguments.last_line != -1 and arguments.last_line < arguments.first_line:
+        print("The last line must not be before the first line.", file=sys.stderr)
+        exit(1)
+
     # Verify that the project exists
     project_query = Project.query.filter(Project.name == arguments.project)
     if project_query.count() == 0:
@@ -35,12 +64,13 @@ def main():
         print("No files found to process.")
         exit(2)
 
-    for file in files:
-        print(f"Generating patches for '{file.filename}'...")
-        source_file = SourceFile(file, 1, -1)
-        source_file.generate_patches()
+    def on_file(file, count):
+        print(f"Generated {count} patches for '{file.filename}'")
+
+    count = PatchGenerator(arguments.jobs).generate(files, arguments.first_line, arguments.last_line,
+                                                    arguments.mutators, on_file)
 
-    print("Done")
+    print(f"Done, generated {count} patches")
     exit(0)
 
 
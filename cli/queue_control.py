@@ -4,16 +4,15 @@
 
 import sys
 from argparse import ArgumentParser
-from urllib import request
 
 # Allow this script to be used from the parent directory
 sys.path.append(".")
 
-from app.models import Patch
+from app import app
+from app.utils.Counters import Counters
+from app.utils.ExecutorClient import ExecutorClient
 
 
-# TODO retrieve the actual server and port from the application
-
 def main():
     # Parse argument
     argument_parser = ArgumentParser(description="Control the Mutate++ queue.")
@@ -23,19 +22,31 @@ def main():
     )
     arguments = argument_parser.parse_args()
 
+    # the commands are stored in the database and carried out by the executor daemon
+    executor = ExecutorClient(app)
+
     if arguments.action == 'start':
-        request.urlopen("http://127.0.0.1:5000/queue/start")
+        executor.start()
+        if not executor.alive:
+            print("The executor daemon is not running; the queue starts once it is started.", file=sys.stderr)
     elif arguments.action == 'stop':
-        request.urlopen("http://127.0.0.1:5000/queue/stop")
+        executor.stop()
     elif arguments.action == 'status':
-        incomplete_patches = Patch.query.filter(Patch.state == 'incomplete').count()
-        all_patches = Patch.query.count()
+        if executor.alive:
+            print(f"Executor {executor.owner}: {'running' if executor.running else 'paused'}")
+        else:
+            print("Executor daemon not running")
+        counters = Counters.totals()
+        incomplete_patches = counters['incomplete'] + counters['running']
+        all_patches = counters['_all_']
         if all_patches == 0:
             print("No patches generated.")
             exit(0)
         finished_patches = all_patches - incomplete_patches
         percentage = 100 * ((all_patches - incomplete_patches) / all_patches)
         print(f"Patch {finished_patches} / {all_patches} ({percentage:.0f}%)")
+        if counters['throughput']:
+            print(f"{counters['throughput']:.1f} patches per minute, finished at {counters['eta']:%Y-%m-%d %H:%M}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# coding=utf-8
+# PYTHON_ARGCOMPLETE_OK
+
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+
+# Allow this script to be used from the parent directory
+sys.path.append(".")
+
+from app import app
+from app.models import Patch, Project
+from app.utils.Calibration import Calibration
+from app.utils.Counters import Counters
+from app.utils.ParExecutor import ParExecutor
+from app.utils.Statistics import Statistics
+
+
+# the stream of the events; see redirect_output
+events = sys.stdout
+
+
+def emit(event: str, **values):
+    # one JSON object per line
+    print(json.dumps({'event': event, **values}), file=events, flush=True)
+
+
+def redirect_output():
+    """keep stdout for the events and send everything else written to it (e.g., the log of the executor) to stderr"""
+    global events
+    sys.stdout.flush()
+    events = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+
+def main():
+    # Parse arguments
+    argument_parser = ArgumentParser(description="Execute the queue without the web app and report the progress as "
+                                                 "JSON lines.")
+    argument_parser.add_argument(
+        "--project", type=str, required=False,
+        help="The name of the project whose patches are executed; all projects if omitted."
+    )
+    argument_parser.add_argument(
+        "--jobs", type=int, default=multiprocessing.cpu_count(),
+        help="The number of patches to execute in parallel."
+    )
+    argument_parser.add_argument(
+        "--max-time", type=float, required=False,
+        help="The number of seconds after which no further patches are started; patches in progress are finished."
+    )
+    argument_parser.add_argument(
+        "--min-score", type=float, required=False,
+        help="The minimal mutation score (killed patches in percent of the finished patches, not counting equivalent "
+             "patches); exit with code 3 if the score is lower."
+    )
+    arguments = argument_parser.parse_args()
+    redirect_output()
+
+    if arguments.jobs < 1:
+        print("The number of jobs must be positive.", file=sys.stderr)
+        exit(1)
+
+    project_id = None
+    if arguments.project is not None:
+        # Verify that the project exists
+        project = Project.query.filter(Project.name == arguments.project).first()
+        if project is None:
+            print(f"Project '{arguments.project}' doesn't exist.", file=sys.stderr)
+            exit(1)
+        project_id = project.id
+
+    # warn about projects whose unmutated pipeline does not reliably succeed
+    queued = Patch.query.filter(Patch.state.in_(['incomplete', 'running']))
+    if project_id is not None:
+        queued = queued.filter(Patch.project_id == project_id)
+    for queued_project_id, in queued.with_entities(Patch.project_id).distinct():
+        flaky_stages = Calibration.flaky(queued_project_id)
+        if flaky_stages:
+            print(f"Warning: the calibration of project {queued_project_id} failed in some runs of "
+                  f"{', '.join(flaky_stages)}; results may be unreliable.", file=sys.stderr)
+
+    start = time.monotonic()
+    finished = {'killed': 0, 'survived': 0, 'incomplete': 0}
+
+    def on_result(result):
+        finished[result.state] = finished.get(result.state, 0) + 1
+        emit('patch', patch=result.patch_id, verdict=result.state,
+             equivalence=result.attributes.get('equivalence'), stages=result.stage_durations,
+             elapsed=round(time.monotonic() - start, 3))
+
+    executor = ParExecutor(app, max_workers=arguments.jobs, project_id=project_id, on_result=on_result)
+
+    # stop gracefully: no further patches are started, and the results of the patches in progress are written
+    timed_out = threading.Event()
+    if arguments.max_time is not None:
+        def stop_on_timeout():
+            timed_out.set()
+            executor.stop()
+
+        timer = threading.Timer(arguments.max_time, stop_on_timeout)
+        timer.daemon = True
+        timer.start()
+    signal.signal(signal.SIGTERM, lambda *_: executor.stop())
+    signal.signal(signal.SIGINT, lambda *_: executor.stop())
+
+    emit('start', project=arguments.project, jobs=arguments.jobs, queued=queued.count())
+
+    executor.running = True
+    executor.main()
+
+    Counters.invalidate()
+    counters = Counters.totals(project_id)
+    equivalent = Statistics.equivalent_count(project_id)
+    score = Statistics.score(counters['killed'], counters['survived'], equivalent)
+    emit('summary', finished=finished, killed=counters['killed'], survived=counters['survived'], equivalent=equivalent,
+         queued=counters['incomplete'] + counters['running'], score=score, timed_out=timed_out.is_set(),
+         elapsed=round(time.monotonic() - start, 3))
+
+    if arguments.min_score is not None and score is not None and score < arguments.min_score:
+        print(f"The mutation score {score:.1f}% is below {arguments.min_score:.1f}%.", file=sys.stderr)
+        exit(3)
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# coding=utf-8
+# PYTHON_ARGCOMPLETE_OK
+
+import multiprocessing
+import sys
+from argparse import ArgumentParser
+
+# Allow this script to be used from the parent directory
+sys.path.append(".")
+
+from app.utils.RemoteWorker import RemoteWorker
+
+
+def main():
+    # Parse arguments
+    argument_parser = ArgumentParser(description="Execute patches leased from a Mutate++ coordinator.")
+    argument_parser.add_argument(
+        "--coordinator", type=str, default="http://127.0.0.1:5000",
+        help="The URL of the Mutate++ web app that hands out the patches."
+    )
+    argument_parser.add_argument(
+        "--jobs", type=int, default=multiprocessing.cpu_count(),
+        help="The number of patches to execute in parallel."
+    )
+    argument_parser.add_argument(
+        "--name", type=str, required=False,
+        help="A name to identify this worker in the leases (host name and process id are added)."
+    )
+    argument_parser.add_argument(
+        "--workspace-root", type=str, required=False,
+        help="The directory in which the workspaces are created."
+    )
+    argument_parser.add_argument(
+        "--poll-interval", type=float, default=10.0,
+        help="The number of seconds to wait before asking an empty queue again."
+    )
+    argument_parser.add_argument(
+        "--exit-when-empty", action='store_true',
+        help="Exit once the queue is empty instead of waiting for new patches."
+    )
+    arguments = argument_parser.parse_args()
+
+    if arguments.jobs < 1:
+        print("The number of jobs must be positive.", file=sys.stderr)
+        exit(1)
+
+    RemoteWorker(coordinator=arguments.coordinator, jobs=arguments.jobs, name=arguments.name,
+                 workspace_root=arguments.workspace_root, poll_interval=arguments.poll_interval,
+                 exit_when_empty=arguments.exit_when_empty).main()
+    exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 #!/usr/bin/env python
 # coding=utf-8
 
-from app import app
+from app.web import app
 app.run(debug=True)